@@ -12,12 +12,14 @@ from pydantic import BaseModel
 from datetime import datetime, timedelta
 import jwt
 import os
-import json
 from dotenv import load_dotenv
 import logging
-import requests
+import httpx
 import shutil
 from alert_system import AlertSystem
+from http_client import UpstreamClient, UpstreamUnavailableError
+from user_store import UserStore
+from token_cache import TokenCache, token_digest
 
 # On charge les variables d'environnement
 load_dotenv()
@@ -72,14 +74,41 @@ SECRET_KEY = os.getenv("JWT_SECRET_KEY")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
+# Clients HTTP partagés vers les containers d'entraînement et d'inférence,
+# avec un délai propre à chacun (les résultats de l'entraînement interrogent MLflow)
+training_client = UpstreamClient(
+    "training", "http://training:5500", timeout=float(os.getenv("ADMIN_API_TRAINING_TIMEOUT", "30"))
+)
+inference_client = UpstreamClient(
+    "inference", "http://inference:5500", timeout=float(os.getenv("ADMIN_API_INFERENCE_TIMEOUT", "30"))
+)
 
-# On charge les utilisateurs autorisés depuis le fichier JSON
-def load_authorized_users():
-    with open(users_path, "r") as f:
-        return json.load(f)
 
+# On ferme les connexions vers les autres containers à l'arrêt du container
+@app.on_event("shutdown")
+async def shutdown():
+    await training_client.close()
+    await inference_client.close()
 
-AUTHORIZED_USERS = load_authorized_users()
+
+def upstream_error(e, container):
+    """
+    Convertit une erreur de communication avec un autre container en réponse HTTP :
+    503 (avec le délai conseillé) s'il est indisponible, 504 s'il n'a pas répondu à temps
+    """
+    logging.error(f"Communication avec le conteneur {container} impossible: {e}")
+    if isinstance(e, UpstreamUnavailableError):
+        return HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    return HTTPException(
+        status_code=504, detail=f"Le conteneur {container} n'a pas répondu à temps"
+    )
+
+
+# Les utilisateurs autorisés sont gardés en mémoire et le fichier JSON est relu dès qu'il change
+# (vérification au plus toutes les USERS_CHECK_INTERVAL secondes), y compris lorsque user_api le modifie
+user_store = UserStore(users_path, check_interval=float(os.getenv("USERS_CHECK_INTERVAL", "1")))
+# Les tokens déjà vérifiés ne sont pas redécodés tant qu'ils ne sont pas expirés
+token_cache = TokenCache(max_size=int(os.getenv("TOKEN_CACHE_SIZE", "1024")))
 
 
 # ----------------------------------------------------------------------------------------- #
@@ -112,25 +141,49 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     return encoded_jwt
 
 
+def has_admin_rights(username):
+    """
+    Indique si l'utilisateur existe et a les droits d'administration
+    """
+    user = user_store.get(username)
+    return user is not None and user[0]
+
+
 def verify_token(token: str = Depends(OAuth2PasswordBearer(tokenUrl="/token"))):
     """
     Permet de vérifier le token JWT
     """
+    # Le token n'est jamais écrit dans les logs, seul le début de son empreinte permet de le suivre
+    digest = token_digest(token)
+    users_version = user_store.current_version()
+    # Si la liste des utilisateurs a changé depuis la vérification du token, on vérifie seulement
+    # que l'utilisateur est toujours autorisé
+    cached = token_cache.lookup(digest, users_version, has_admin_rights)
+    if cached is not None:
+        username, authorized = cached
+        if authorized:
+            return username
+        logging.warning(f"Token révoqué pour l'utilisateur: {username}")
+        raise HTTPException(
+            status_code=401, detail="Impossible de valider les identifiants..."
+        )
     try:
         # On tente de décoder le token
-        logging.info(f"Tentative de décodage du token: {token}")
+        logging.info(f"Tentative de décodage du token: {digest[:12]}")
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         # On récupère le nom d'utilisateur dans le payload du token
         username: str = payload.get("sub")
         # On vérifie que l'utilisateur est bien autorisé
-        user = AUTHORIZED_USERS.get(username)
+        user = user_store.get(username)
         # On renvoie une erreur si l'utilisateur n'est pas valide
         if user is None or not user[0]:
             logging.warning("Le token ne contient pas de 'sub' valide")
             raise HTTPException(
                 status_code=401, detail="Impossible de valider les identifiants..."
             )
-        # Sinon, on retourne le nom d'utilisateur et il n'y a pas d'erreur
+        # Sinon, on garde le token vérifié jusqu'à son expiration et on retourne le nom d'utilisateur
+        # (un token sans expiration n'est pas gardé)
+        token_cache.put(digest, username, payload.get("exp", 0), users_version)
         logging.info(f"Token validé pour l'utilisateur: {username}")
         return username
     except jwt.PyJWTError as e:
@@ -152,20 +205,10 @@ def verify_api_key(api_key: str = Header(..., alias="api-key")):
             status_code=403, detail="Tentative d'accès avec une clé API invalide"
         )
     # Sinon, on retourne la clé
-    logging.info("Clé API validée !")
+    logging.debug("Clé API validée !")
     return api_key
 
 
-def update_authorized_users(users):
-    """
-    Permet de mettre à jour le fichier JSON des utilisateurs autorisés
-    """
-    # On ouvre le fichier contenant les utilisateurs
-    with open(users_path, "w") as f:
-        # On actualise le fichier
-        json.dump(users, f, indent=4)
-
-
 # ----------------------------------------------------------------------------------------- #
 
 
@@ -173,7 +216,7 @@ def update_authorized_users(users):
 @app.post("/token", response_model=Token)
 async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends()):
     # On récupère l'utilisateur dans la liste des utilisateurs
-    user = AUTHORIZED_USERS.get(form_data.username)
+    user = user_store.get(form_data.username)
     # Si l'utilisateur n'existe pas ou que son mot de passe est faux, on renvoie une erreur
     if user is None or not user[0] or form_data.password != user[1]:
         logging.warning(
@@ -258,21 +301,11 @@ async def add_user(
 ):
     try:
         logging.info(f"Requête /add_user reçue de l'utilisateur: {current_user}")
-        # On se réfère à la variable globale contenant la liste des utilisateurs
-        global AUTHORIZED_USERS
-        # Si l'utilisateur existe déjà, on ne l'ajoute pas
-        if new_username in AUTHORIZED_USERS:
+        # On ajoute l'utilisateur à la liste la plus récente du fichier JSON, avec son niveau de privilèges.
+        # S'il existe déjà, on ne l'ajoute pas
+        if not user_store.add(new_username, is_admin, user_password):
             raise HTTPException(status_code=400, detail="L'utilisateur existe déjà.")
 
-        # On indique le niveau de privilèges de l'utilisateur
-        if is_admin:
-            AUTHORIZED_USERS[new_username] = [True, user_password]
-        else:
-            AUTHORIZED_USERS[new_username] = [False, user_password]
-
-        # On actualise le fichier JSON
-        update_authorized_users(AUTHORIZED_USERS)
-
         logging.info(f"Nouvel utilisateur ajouté par {current_user}: {new_username}")
         return {"status": f"L'utilisateur {new_username} a été ajouté avec succès !"}
     except Exception as e:
@@ -292,7 +325,7 @@ async def get_users(
 ):
     try:
         logging.info(f"Requête /get_users reçue de l'utilisateur: {current_user}")
-        return {"authorized_users": AUTHORIZED_USERS}
+        return {"authorized_users": user_store.all()}
     except Exception as e:
         logging.error(
             f"Une erreur est survenue lors de la récupération de la liste des utilisateurs': {str(e)}"
@@ -311,15 +344,12 @@ async def train(
     try:
         logging.info(f"Requête /train reçue de l'utilisateur: {current_user}")
         # On fait appel au conteneur chargé de l'entraînement
-        response = requests.get("http://training:5500/train")
+        # La requête lance un entraînement : elle n'est rejouée que si elle n'a pas pu être envoyée
+        response = await training_client.request("GET", "/train", retry=False)
         return response.json()
 
-    except requests.RequestException as e:
-        logging.error(f"Communication avec le conteneur d'entraînement impossible: {e}")
-        raise HTTPException(
-            status_code=500,
-            detail=f"Communication avec le conteneur d'entraînement impossible: {e}",
-        )
+    except (UpstreamUnavailableError, httpx.TimeoutException) as e:
+        raise upstream_error(e, "d'entraînement")
 
 
 # Route pour changer le modèle utilisé par inférence
@@ -332,17 +362,29 @@ async def switch_model(
     try:
         logging.info(f"Requête /switchmodel reçue de l'utilisateur: {current_user}")
         # On donne le run_id au container d'inférence qui changera le modèle utilisé
-        response = requests.post(
-            "http://inference:5500/switchmodel", data={"run_id": run_id}
+        response = await inference_client.request(
+            "POST", "/switchmodel", data={"run_id": run_id}
         )
         return response.json()
 
-    except requests.RequestException as e:
-        logging.error(f"Communication avec le conteneur d'inférence impossible: {e}")
-        raise HTTPException(
-            status_code=500,
-            detail=f"Communication avec le conteneur d'inférence impossible: {e}",
-        )
+    except (UpstreamUnavailableError, httpx.TimeoutException) as e:
+        raise upstream_error(e, "d'inférence")
+
+
+# Route pour revenir au modèle précédemment utilisé par inférence
+@app.post("/rollback")
+async def rollback(
+    api_key: str = Depends(verify_api_key),
+    current_user: str = Depends(verify_token),
+):
+    try:
+        logging.info(f"Requête /rollback reçue de l'utilisateur: {current_user}")
+        # Le container d'inférence garde l'ancien modèle en mémoire pour revenir en arrière
+        response = await inference_client.request("POST", "/rollback")
+        return response.json()
+
+    except (UpstreamUnavailableError, httpx.TimeoutException) as e:
+        raise upstream_error(e, "d'inférence")
 
 
 # Route pour récupérer les résultats de l'entraînement
@@ -353,9 +395,11 @@ async def results(
     logging.info(f"Requête /results reçue de l'utilisateur: {current_user}")
     try:
         # On interroge le container de training sur les résultats de l'entraînement
-        response = requests.get("http://training:5500/results")
+        response = await training_client.request("GET", "/results")
         return response.json()
 
+    except (UpstreamUnavailableError, httpx.TimeoutException) as e:
+        raise upstream_error(e, "training")
     except Exception as e:
         logging.error(f"Erreur de communication avec le conteneur training: {str(e)}")
         raise HTTPException(
@@ -0,0 +1,221 @@
+"""
+Client HTTP asynchrone partagé vers les autres containers (inférence, entraînement).
+Chaque service amont a son propre client, créé une seule fois dans la boucle d'événements de FastAPI :
+- les connexions sont gardées ouvertes (keep-alive) et réutilisées d'une requête à l'autre
+- le délai de connexion et le délai total sont fixés par service
+- les erreurs de connexion sont réessayées avec un délai exponentiel aléatoire (jitter)
+- un disjoncteur refuse immédiatement les requêtes tant que le service est indisponible
+Ce fichier est partagé par les containers user_api et admin_api (copié dans leur image au build).
+"""
+
+import time
+import random
+import asyncio
+import logging
+import httpx
+
+# Méthodes qui peuvent être rejouées sans effet de bord si la réponse a été perdue
+IDEMPOTENT_METHODS = ("GET", "HEAD", "OPTIONS")
+# Codes HTTP comptés comme des échecs par le disjoncteur : service injoignable derrière un proxy ou trop lent.
+# 503 est un refus par surcharge (contrôle d'admission de l'inférence, avec Retry-After), transmis tel quel :
+# le compter ouvrirait le disjoncteur et transformerait un pic de charge en panne complète.
+# Les erreurs 4xx et 500 (erreur liée à la requête elle-même) ne déclenchent pas non plus le disjoncteur
+FAILURE_STATUS_CODES = (502, 504)
+
+
+class UpstreamUnavailableError(Exception):
+    """
+    Levée lorsque le disjoncteur est ouvert ou que le service ne répond pas après les nouvelles tentatives
+    """
+
+    def __init__(self, message, retry_after=1):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """
+    Disjoncteur à trois états :
+    - fermé : les requêtes passent, les échecs consécutifs sont comptés
+    - ouvert (après failure_threshold échecs) : les requêtes sont refusées sans contacter le service
+    - semi-ouvert (après reset_timeout secondes) : une seule requête d'essai passe, son résultat
+      referme ou rouvre le disjoncteur
+    """
+
+    def __init__(self, name, failure_threshold=5, reset_timeout=30):
+        self.name = name
+        self.failure_threshold = max(1, int(failure_threshold))
+        self.reset_timeout = float(reset_timeout)
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.rejected = 0
+        self._trial_running = False
+
+    def retry_after(self):
+        return max(1, int(self.opened_at + self.reset_timeout - time.monotonic()) + 1)
+
+    def allow(self):
+        """
+        Indique si une requête peut être envoyée au service
+        """
+        if self.state == "open" and time.monotonic() - self.opened_at >= self.reset_timeout:
+            self.state = "half_open"
+        if self.state == "closed":
+            return True
+        if self.state == "half_open" and not self._trial_running:
+            self._trial_running = True
+            return True
+        self.rejected += 1
+        return False
+
+    def check(self):
+        """
+        Lève UpstreamUnavailableError si le disjoncteur refuse la requête.
+        Renvoie True si la requête est l'essai du disjoncteur semi-ouvert
+        """
+        if not self.allow():
+            raise UpstreamUnavailableError(
+                f"Le service {self.name} est indisponible, nouvel essai dans {self.retry_after()}s",
+                self.retry_after(),
+            )
+        return self.state == "half_open"
+
+    def release_trial(self):
+        """
+        Libère la requête d'essai qui s'est terminée sans résultat (annulée ou erreur inattendue),
+        pour qu'une autre requête puisse faire l'essai
+        """
+        self._trial_running = False
+
+    def record_success(self):
+        self.state = "closed"
+        self.failures = 0
+        self._trial_running = False
+
+    def record_failure(self):
+        self.failures += 1
+        self._trial_running = False
+        if self.state == "half_open" or self.failures >= self.failure_threshold:
+            if self.state != "open":
+                logging.warning(f"Disjoncteur du service {self.name} ouvert après {self.failures} échecs")
+            self.state = "open"
+            self.opened_at = time.monotonic()
+
+
+class UpstreamClient:
+    """
+    Client d'un service amont. Les chemins sont relatifs à base_url et les arguments
+    de request/stream sont ceux de httpx (params, data, content, json, headers, timeout)
+    """
+
+    def __init__(self, name, base_url, timeout=10, connect_timeout=2, retries=2, backoff=0.1,
+                 max_connections=100, max_keepalive_connections=20, failure_threshold=5, reset_timeout=30):
+        self.name = name
+        self.base_url = base_url
+        self.timeout = httpx.Timeout(timeout, connect=connect_timeout)
+        self.limits = httpx.Limits(
+            max_connections=max_connections, max_keepalive_connections=max_keepalive_connections
+        )
+        self.retries = max(0, int(retries))
+        self.backoff = float(backoff)
+        self.breaker = CircuitBreaker(name, failure_threshold, reset_timeout)
+        self._client = None
+        self.counters = {"requests": 0, "retries": 0, "failures": 0}
+
+    def _connect(self):
+        if self._client is None:
+            self._client = httpx.AsyncClient(base_url=self.base_url, timeout=self.timeout, limits=self.limits)
+        return self._client
+
+    def _retryable(self, error, method, retry):
+        # Une requête qui n'a pas pu être envoyée peut toujours être rejouée,
+        # les autres uniquement si la méthode est idempotente
+        if isinstance(error, (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)):
+            return True
+        idempotent = method.upper() in IDEMPOTENT_METHODS if retry is None else retry
+        return idempotent and isinstance(error, (httpx.ReadError, httpx.RemoteProtocolError))
+
+    async def _sleep_before_retry(self, attempt):
+        # Délai exponentiel tiré au hasard ("full jitter") pour ne pas relancer toutes les requêtes en même temps
+        await asyncio.sleep(random.uniform(0, self.backoff * 2 ** attempt))
+        self.counters["retries"] += 1
+
+    def _record(self, status_code):
+        if status_code in FAILURE_STATUS_CODES:
+            self.counters["failures"] += 1
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+
+    def _unavailable(self, error):
+        self.counters["failures"] += 1
+        self.breaker.record_failure()
+        if isinstance(error, httpx.TimeoutException) and not isinstance(error, httpx.ConnectTimeout):
+            return error
+        return UpstreamUnavailableError(f"Communication avec le service {self.name} impossible: {error}")
+
+    async def request(self, method, path, retry=None, **kwargs):
+        """
+        Envoie une requête et renvoie la réponse httpx. Lève UpstreamUnavailableError si le service
+        est injoignable, httpx.TimeoutException s'il n'a pas répondu à temps.
+        retry force (True) ou interdit (False) les nouvelles tentatives après envoi de la requête
+        """
+        client = self._connect()
+        trial = self.breaker.check()
+        self.counters["requests"] += 1
+        try:
+            for attempt in range(self.retries + 1):
+                try:
+                    response = await client.request(method, path, **kwargs)
+                except httpx.TransportError as e:
+                    if attempt < self.retries and self._retryable(e, method, retry):
+                        await self._sleep_before_retry(attempt)
+                        continue
+                    raise self._unavailable(e) from e
+                self._record(response.status_code)
+                return response
+        finally:
+            # Essai annulé ou interrompu par une autre erreur : sans cela, le disjoncteur resterait semi-ouvert
+            # et refuserait toutes les requêtes
+            if trial:
+                self.breaker.release_trial()
+
+    async def stream(self, method, path, **kwargs):
+        """
+        Comme request, mais le corps de la réponse est lu au fil de l'eau (response.aiter_lines())
+        et doit être fermé par l'appelant (response.aclose()).
+        Seul l'envoi est réessayé : une réponse déjà commencée n'est jamais rejouée
+        """
+        client = self._connect()
+        trial = self.breaker.check()
+        self.counters["requests"] += 1
+        try:
+            for attempt in range(self.retries + 1):
+                try:
+                    response = await client.send(client.build_request(method, path, **kwargs), stream=True)
+                    break
+                except httpx.TransportError as e:
+                    if attempt < self.retries and self._retryable(e, method, False):
+                        await self._sleep_before_retry(attempt)
+                        continue
+                    raise self._unavailable(e) from e
+            self._record(response.status_code)
+            return response
+        finally:
+            if trial:
+                self.breaker.release_trial()
+
+    def stats(self):
+        return {
+            "base_url": self.base_url,
+            "circuit": self.breaker.state,
+            "consecutive_failures": self.breaker.failures,
+            "rejected_by_circuit": self.breaker.rejected,
+            **self.counters,
+        }
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
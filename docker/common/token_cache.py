@@ -0,0 +1,88 @@
+"""
+Cache des tokens JWT déjà vérifiés : un client renvoie le même token à chaque requête,
+la signature et l'expiration ne sont donc vérifiées qu'à la première utilisation.
+Les tokens sont identifiés par leur empreinte SHA-256 (le token lui-même n'est pas conservé),
+chaque entrée expire avec le token et le nombre d'entrées est borné (la plus ancienne est retirée).
+Ce fichier est partagé par les containers user_api et admin_api (copié dans leur image au build).
+"""
+
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+
+
+def token_digest(token):
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+class TokenCache:
+    """
+    Chaque entrée garde le nom d'utilisateur, l'expiration du token et la version de la liste
+    des utilisateurs au moment de la vérification : si la liste a changé depuis, l'appelant
+    doit revérifier l'utilisateur (suppression ou perte des droits) sans revérifier la signature
+    """
+
+    def __init__(self, max_size=1024):
+        self.max_size = max(1, int(max_size))
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, digest):
+        """
+        Renvoie (nom d'utilisateur, version de la liste des utilisateurs) ou None
+        """
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is None or entry[1] <= time.time():
+                if entry is not None:
+                    del self._entries[digest]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(digest)
+            self.hits += 1
+            return entry[0], entry[2]
+
+    def put(self, digest, username, exp, users_version):
+        with self._lock:
+            self._entries[digest] = (username, float(exp), users_version)
+            self._entries.move_to_end(digest)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def revalidate(self, digest, users_version):
+        """
+        Indique que l'utilisateur du token a été revérifié avec la version donnée de la liste des utilisateurs
+        """
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is not None:
+                self._entries[digest] = (entry[0], entry[1], users_version)
+
+    def lookup(self, digest, users_version, is_authorized):
+        """
+        Renvoie (nom d'utilisateur, autorisé) pour un token déjà vérifié, ou None s'il n'est pas en cache.
+        Si la liste des utilisateurs a changé depuis la vérification, is_authorized(nom d'utilisateur)
+        est rappelée : un utilisateur toujours autorisé est revalidé, sinon le token est retiré du cache
+        """
+        cached = self.get(digest)
+        if cached is None:
+            return None
+        username, version = cached
+        if version == users_version:
+            return username, True
+        if is_authorized(username):
+            self.revalidate(digest, users_version)
+            return username, True
+        self.discard(digest)
+        return username, False
+
+    def discard(self, digest):
+        with self._lock:
+            self._entries.pop(digest, None)
+
+    def stats(self):
+        with self._lock:
+            return {"size": len(self._entries), "max_size": self.max_size, "hits": self.hits, "misses": self.misses}
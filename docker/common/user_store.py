@@ -0,0 +1,147 @@
+"""
+Liste des utilisateurs autorisés, partagée par user_api et admin_api via le fichier JSON du volume.
+Le fichier est gardé en mémoire : une recherche ne lit pas le disque, seule sa date de modification
+est vérifiée, au plus une fois toutes les check_interval secondes, pour suivre les changements faits
+par l'autre container. Les écritures remplacent le fichier de façon atomique (fichier temporaire au nom unique puis
+renommage), sous un verrou partagé entre les processus pour ne perdre aucune modification.
+Ce fichier est partagé par les containers user_api et admin_api (copié dans leur image au build).
+"""
+
+import os
+import json
+import time
+import fcntl
+import tempfile
+import logging
+import threading
+from contextlib import contextmanager
+
+
+class UserStore:
+    """
+    Les utilisateurs sont stockés sous la forme {nom: [est_admin, mot_de_passe]}.
+    version est incrémentée à chaque changement de la liste (lecture ou écriture)
+    """
+
+    def __init__(self, path, check_interval=1.0):
+        self.path = path
+        self.lock_path = f"{path}.lock"
+        self.check_interval = float(check_interval)
+        self._lock = threading.Lock()
+        self._users = {}
+        self._signature = None
+        self._checked_at = 0.0
+        self.version = 0
+        self.reload()
+
+    def _file_signature(self):
+        # Le renommage change l'inode, la date et la taille détectent les écritures directes
+        stat = os.stat(self.path)
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+    def reload(self):
+        """
+        Relit le fichier s'il a changé depuis la dernière lecture
+        """
+        with self._lock:
+            self._checked_at = time.monotonic()
+            signature = self._file_signature()
+            if signature == self._signature:
+                return
+            with open(self.path, "r") as f:
+                users = json.load(f)
+            self._users, self._signature = users, signature
+            self.version += 1
+            logging.info(f"Liste des utilisateurs autorisés chargée ({len(users)} utilisateurs)")
+
+    def _refresh(self):
+        if time.monotonic() - self._checked_at >= self.check_interval:
+            try:
+                self.reload()
+            except (OSError, ValueError) as e:
+                # Un fichier illisible n'efface pas la liste en mémoire
+                logging.error(f"Impossible de relire la liste des utilisateurs autorisés: {e}")
+
+    def get(self, username):
+        """
+        Renvoie [est_admin, mot_de_passe] ou None si l'utilisateur n'existe pas
+        """
+        self._refresh()
+        return self._users.get(username)
+
+    def current_version(self):
+        """
+        Renvoie la version de la liste, après avoir vérifié si le fichier a changé
+        """
+        self._refresh()
+        return self.version
+
+    def __contains__(self, username):
+        return self.get(username) is not None
+
+    def all(self):
+        self._refresh()
+        return dict(self._users)
+
+    @contextmanager
+    def _file_lock(self):
+        with open(self.lock_path, "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def write(self, users):
+        """
+        Remplace le fichier de façon atomique : un lecteur voit toujours l'ancienne ou la nouvelle liste
+        """
+        with self._file_lock():
+            self._write(users)
+
+    def _write(self, users):
+        # Le verrou du fichier doit être tenu. Le fichier temporaire a un nom unique, dans le même dossier
+        # pour que le renommage reste atomique
+        descriptor, temp_path = tempfile.mkstemp(dir=os.path.dirname(self.path) or ".", suffix=".tmp")
+        try:
+            with os.fdopen(descriptor, "w") as f:
+                json.dump(users, f, indent=4)
+                f.flush()
+                os.fsync(f.fileno())
+            # mkstemp crée le fichier en lecture seule pour son propriétaire, on garde les droits de l'ancien fichier
+            os.chmod(temp_path, os.stat(self.path).st_mode & 0o777 if os.path.exists(self.path) else 0o644)
+            os.replace(temp_path, self.path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+        with self._lock:
+            self._users, self._signature = dict(users), self._file_signature()
+            self._checked_at = time.monotonic()
+            self.version += 1
+
+    def update(self, change):
+        """
+        Applique change(users) à la liste la plus récente du fichier puis l'enregistre,
+        sans qu'un autre processus ne puisse écrire entre la lecture et l'écriture.
+        Rien n'est écrit si change renvoie False. Renvoie la valeur renvoyée par change
+        """
+        with self._file_lock():
+            self.reload()
+            users = dict(self._users)
+            result = change(users)
+            if result is not False:
+                self._write(users)
+            return result
+
+    def add(self, username, is_admin, password):
+        """
+        Ajoute un utilisateur. Renvoie False s'il existe déjà
+        """
+
+        def change(users):
+            if username in users:
+                return False
+            users[username] = [bool(is_admin), password]
+            return True
+
+        return self.update(change)
@@ -0,0 +1,98 @@
+import math
+import time
+import threading
+
+
+class AdmissionRejectedError(Exception):
+    """
+    Levée lorsqu'une requête est refusée à l'entrée (file pleine ou échéance impossible à tenir)
+    """
+
+    def __init__(self, message, reason, retry_after=1):
+        super().__init__(message)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class DeadlineExceededError(Exception):
+    """
+    Levée lorsque l'échéance d'une requête est dépassée avant que le modèle ne la traite
+    """
+
+
+def deadline_from_header(value):
+    """
+    Convertit l'échéance envoyée par l'API (timestamp Unix en secondes) en temps monotone local, ou None
+    """
+    if not value:
+        return None
+    try:
+        return time.monotonic() + float(value) - time.time()
+    except ValueError:
+        return None
+
+
+class AdmissionController:
+    """
+    Cette classe décide à l'entrée si une requête peut être acceptée.
+    Le nombre de requêtes admises en même temps est borné, et une requête dont l'échéance
+    est plus proche que la latence actuelle (moyenne mobile exponentielle des dernières requêtes,
+    qui inclut donc l'attente dans les files) est refusée immédiatement plutôt que traitée pour rien.
+    L'échéance n'est pas vérifiée quand aucune requête n'est en cours : l'estimation n'est mise à jour que par
+    les requêtes abouties, une requête admise sur un service au repos la corrige après une rafale de requêtes lentes.
+    Refuser tôt garde une latence basse pour les requêtes acceptées lors des pics de charge.
+    """
+
+    def __init__(self, max_pending=128, smoothing=0.2):
+        self.max_pending = max(1, int(max_pending))
+        self.smoothing = float(smoothing)
+        self._lock = threading.Lock()
+        self.pending = 0
+        self.admitted = 0
+        self.latency = 0.0
+        self.rejected = {"queue_full": 0, "deadline": 0}
+
+    def retry_after(self):
+        """
+        Estime le délai (en secondes entières) avant que la file ne se soit vidée
+        """
+        return max(1, math.ceil(self.latency * self.pending / self.max_pending))
+
+    def admit(self, deadline=None):
+        """
+        Admet une requête ou lève AdmissionRejectedError. deadline est en temps monotone (time.monotonic)
+        """
+        with self._lock:
+            if self.pending >= self.max_pending:
+                self.rejected["queue_full"] += 1
+                raise AdmissionRejectedError(
+                    f"Trop de requêtes en cours ({self.max_pending})", "queue_full", self.retry_after()
+                )
+            if deadline is not None and self.pending and deadline - time.monotonic() < self.latency:
+                self.rejected["deadline"] += 1
+                raise AdmissionRejectedError(
+                    f"L'échéance de la requête ne peut pas être tenue (latence actuelle : {self.latency:.3f}s)",
+                    "deadline",
+                    self.retry_after(),
+                )
+            self.pending += 1
+            self.admitted += 1
+
+    def release(self, duration=None):
+        """
+        Libère la place d'une requête terminée et met à jour la latence estimée
+        """
+        with self._lock:
+            self.pending -= 1
+            if duration is not None:
+                self.latency += self.smoothing * (duration - self.latency)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "max_pending": self.max_pending,
+                "pending": self.pending,
+                "admitted": self.admitted,
+                "rejected": dict(self.rejected),
+                "estimated_latency": self.latency,
+            }
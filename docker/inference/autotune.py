@@ -0,0 +1,282 @@
+"""
+Recherche la meilleure configuration CPU de l'inférence sur la machine hôte : nombre de threads
+intra-op et inter-op de TensorFlow, nombre de processus de travail et taille de batch.
+Le modèle est mesuré avec le backend qui le servira (keras, tflite ou onnx, poids partagés ou non).
+Chaque configuration est mesurée dans des processus neufs, TensorFlow ne permettant pas de modifier
+ses pools de threads une fois initialisés. Le meilleur profil est enregistré sur le volume
+et appliqué automatiquement au démarrage du container d'inférence.
+Exemple : python autotune.py volume_data/mlruns/157975935045122495/<run_id>/artifacts/model/ --backend tflite
+"""
+
+import os
+import json
+import time
+import socket
+import logging
+import argparse
+import platform
+import multiprocessing
+from queue import Empty
+import numpy as np
+
+# Fichier où sont enregistrés les profils, un par type de machine
+default_profile_path = os.path.join("volume_data", "tuning", "inference_profile.json")
+
+
+def host_signature():
+    """
+    Identifie le type de machine (modèle de CPU et nombre de coeurs disponibles)
+    """
+    cpu_model = platform.processor()
+    try:
+        with open("/proc/cpuinfo", "r") as file:
+            for line in file:
+                if line.startswith("model name"):
+                    cpu_model = line.split(":", 1)[1].strip()
+                    break
+    except OSError:
+        pass
+    return f"{cpu_model}|{available_cpus()}"
+
+
+def available_cpus():
+    """
+    Renvoie le nombre de coeurs utilisables par le container
+    """
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def load_profile(profile_path=default_profile_path):
+    """
+    Renvoie le profil enregistré pour cette machine, ou None
+    """
+    if not os.path.exists(profile_path):
+        return None
+    try:
+        with open(profile_path, "r") as file:
+            return json.load(file).get(host_signature())
+    except Exception as e:
+        logging.error(f"Erreur lors de la lecture du profil d'inférence : {e}")
+        return None
+
+
+def save_profile(profile, profile_path=default_profile_path):
+    """
+    Enregistre le profil de cette machine sans écraser ceux des autres machines
+    """
+    profiles = {}
+    if os.path.exists(profile_path):
+        with open(profile_path, "r") as file:
+            profiles = json.load(file)
+    profiles[host_signature()] = profile
+    os.makedirs(os.path.dirname(profile_path) or ".", exist_ok=True)
+    temp_path = f"{profile_path}.tmp"
+    with open(temp_path, "w") as file:
+        json.dump(profiles, file, indent=4)
+    os.replace(temp_path, profile_path)
+
+
+def profile_matches_backend(profile, backend, shared_weights=False):
+    """
+    Indique si le profil a été mesuré avec ce backend (les profils sans backend ont été mesurés avec Keras)
+    """
+    return (profile.get("backend", "keras"), profile.get("shared_weights", False)) == (backend, shared_weights)
+
+
+def apply_threading(intra_op_threads, inter_op_threads):
+    """
+    Configure les pools de threads de TensorFlow (à appeler avant toute opération TensorFlow)
+    """
+    import tensorflow as tf
+
+    tf.config.threading.set_intra_op_parallelism_threads(int(intra_op_threads))
+    tf.config.threading.set_inter_op_parallelism_threads(int(inter_op_threads))
+
+
+# Temps laissé à chaque processus pour charger TensorFlow et le modèle avant la première mesure (s)
+startup_timeout = 120.0
+
+
+def _benchmark_worker(model_path, backend, shared_weights, intra_op_threads, inter_op_threads, batch_sizes, duration,
+                      barrier, results):
+    """
+    Mesure le débit et la latence d'un processus pour chaque taille de batch
+    """
+    apply_threading(intra_op_threads, inter_op_threads)
+    from tensorflow.keras.models import load_model
+    from image_decoder import ImageDecoder
+    from backends import create_backend
+
+    # Le nombre de threads des backends TFLite/ONNX est celui appliqué au démarrage de l'inférence
+    model = create_backend(
+        backend,
+        load_model(os.path.join(model_path, "saved_model.h5")),
+        model_path,
+        num_threads=intra_op_threads,
+        shared_weights=shared_weights,
+    )
+    # Entrée synthétique identique à celle du préchauffage du modèle
+    image = ImageDecoder().decode("./load_image.jpg")
+    worker_results = {}
+    for batch_size in batch_sizes:
+        batch = np.repeat(image[np.newaxis], batch_size, axis=0)
+        model.predict(batch)
+        # Tous les processus commencent la mesure en même temps ; la barrière est rompue si l'un d'eux s'arrête
+        barrier.wait(timeout=startup_timeout)
+        latencies = []
+        start_time = time.perf_counter()
+        while time.perf_counter() - start_time < duration:
+            call_start = time.perf_counter()
+            model.predict(batch)
+            latencies.append(time.perf_counter() - call_start)
+        worker_results[batch_size] = {
+            "images": len(latencies) * batch_size,
+            "elapsed": time.perf_counter() - start_time,
+            "p99": float(np.percentile(latencies, 99)),
+        }
+    results.put(worker_results)
+
+
+def benchmark(model_path, workers, intra_op_threads, inter_op_threads, batch_sizes, duration, backend="keras",
+              shared_weights=False):
+    """
+    Lance les processus de mesure d'une configuration et agrège leurs résultats
+    """
+    context = multiprocessing.get_context("spawn")
+    barrier = context.Barrier(workers)
+    results = context.Queue()
+    processes = [
+        context.Process(
+            target=_benchmark_worker,
+            args=(
+                model_path, backend, shared_weights, intra_op_threads, inter_op_threads, batch_sizes, duration,
+                barrier, results,
+            ),
+        )
+        for _ in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    # Un processus arrêté (mémoire insuffisante, erreur TensorFlow) n'envoie jamais son résultat :
+    # on attend avec un délai et on vérifie l'état des processus au lieu de bloquer indéfiniment
+    deadline = time.monotonic() + startup_timeout + 2 * duration * len(batch_sizes)
+    worker_results = []
+    try:
+        while len(worker_results) < workers:
+            try:
+                worker_results.append(results.get(timeout=1.0))
+                continue
+            except Empty:
+                pass
+            failed = [process.exitcode for process in processes if process.exitcode not in (None, 0)]
+            if failed:
+                raise RuntimeError(f"Processus de mesure arrêté (code de sortie {failed[0]})")
+            if time.monotonic() > deadline:
+                raise TimeoutError("Processus de mesure sans résultat dans le délai imparti")
+    finally:
+        for process in processes:
+            if len(worker_results) < workers and process.is_alive():
+                process.terminate()
+            process.join()
+
+    measures = []
+    for batch_size in batch_sizes:
+        measures.append({
+            "workers": workers,
+            "intra_op_threads": intra_op_threads,
+            "inter_op_threads": inter_op_threads,
+            "batch_size": batch_size,
+            "throughput": sum(
+                result[batch_size]["images"] / result[batch_size]["elapsed"] for result in worker_results
+            ),
+            "p99": max(result[batch_size]["p99"] for result in worker_results),
+        })
+    return measures
+
+
+def search_space(cpus, batch_sizes):
+    """
+    Génère les configurations à tester : les threads de tous les processus ne dépassent pas le nombre de coeurs
+    """
+    worker_counts = [count for count in (1, 2, 4, 8) if count <= cpus]
+    for workers in worker_counts:
+        threads_per_worker = max(1, cpus // workers)
+        for intra_op_threads in sorted({threads_per_worker, max(1, threads_per_worker // 2)}):
+            for inter_op_threads in (1, 2):
+                yield workers, intra_op_threads, inter_op_threads, batch_sizes
+
+
+def autotune(model_path, latency_budget=1.0, batch_sizes=(1, 4, 8, 16), duration=3.0,
+             profile_path=default_profile_path, backend="keras", shared_weights=False):
+    """
+    Teste toutes les configurations avec le backend qui servira le modèle
+    et enregistre celle au meilleur débit respectant le budget de latence
+    """
+    cpus = available_cpus()
+    measures = []
+    for workers, intra_op_threads, inter_op_threads, sizes in search_space(cpus, batch_sizes):
+        logging.info(
+            f"Mesure : {workers} processus, {intra_op_threads} threads intra-op, {inter_op_threads} threads inter-op"
+        )
+        try:
+            measures.extend(benchmark(
+                model_path, workers, intra_op_threads, inter_op_threads, sizes, duration, backend, shared_weights
+            ))
+        except (RuntimeError, TimeoutError) as e:
+            # Configuration ignorée, les suivantes sont tout de même mesurées
+            logging.warning(f"Mesure impossible pour cette configuration : {e}")
+    if not measures:
+        raise RuntimeError("Aucune configuration n'a pu être mesurée")
+
+    # On garde les configurations qui respectent le budget de latence, sinon la plus rapide
+    eligible = [measure for measure in measures if measure["p99"] <= latency_budget] or [
+        min(measures, key=lambda measure: measure["p99"])
+    ]
+    best = max(eligible, key=lambda measure: measure["throughput"])
+    profile = {
+        **best,
+        "backend": backend,
+        "shared_weights": shared_weights,
+        "cpus": cpus,
+        "latency_budget": latency_budget,
+        "tuned_at": time.strftime("%d-%m-%Y %H:%M:%S"),
+        "hostname": socket.gethostname(),
+    }
+    save_profile(profile, profile_path)
+    logging.info(f"Profil d'inférence enregistré : {profile}")
+    return profile, measures
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Recherche de la meilleure configuration CPU de l'inférence")
+    parser.add_argument("model_path", help="Dossier des artefacts du modèle (contenant saved_model.h5)")
+    parser.add_argument("--latency-budget", type=float, default=1.0, help="Latence p99 maximale par batch (s)")
+    parser.add_argument("--duration", type=float, default=3.0, help="Durée de mesure par configuration (s)")
+    parser.add_argument("--profile-path", default=default_profile_path, help="Fichier où enregistrer le profil")
+    parser.add_argument(
+        "--backend", default=os.getenv("INFERENCE_BACKEND", "keras"), help="Backend mesuré (keras, tflite ou onnx)"
+    )
+    parser.add_argument(
+        "--shared-weights", action="store_true", help="Mesure le backend tflite aux poids partagés entre processus"
+    )
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    profile, measures = autotune(
+        args.model_path,
+        latency_budget=args.latency_budget,
+        duration=args.duration,
+        profile_path=args.profile_path,
+        backend="tflite" if args.shared_weights else args.backend,
+        shared_weights=args.shared_weights,
+    )
+    for measure in sorted(measures, key=lambda measure: -measure["throughput"]):
+        print(
+            f"{measure['workers']} processus, intra {measure['intra_op_threads']}, "
+            f"inter {measure['inter_op_threads']}, batch {measure['batch_size']} : "
+            f"{measure['throughput']:.1f} images/s, p99 {measure['p99'] * 1000:.0f} ms"
+        )
+    print(f"Meilleur profil : {profile}")
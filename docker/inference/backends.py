@@ -0,0 +1,137 @@
+import os
+import threading
+import logging
+import numpy as np
+import tensorflow as tf
+
+
+class KerasBackend:
+    """
+    Exécute le modèle Keras d'origine
+    """
+    name = "keras"
+
+    def __init__(self, keras_model, model_path, num_threads=None, **kwargs):
+        self.model = keras_model
+
+    def predict(self, batch):
+        return np.asarray(self.model.predict_on_batch(batch))
+
+
+class TFLiteBackend:
+    """
+    Exécute une version TFLite du modèle, accélérée sur CPU par le délégué XNNPACK.
+    Si le run MLflow ne contient pas encore de fichier model.tflite, il est converti
+    depuis le modèle Keras et enregistré à côté de saved_model.h5.
+    """
+    name = "tflite"
+
+    def __init__(self, keras_model, model_path, num_threads=None, shared_weights=False):
+        tflite_path = os.path.join(model_path, "model.tflite")
+        if not os.path.exists(tflite_path):
+            logging.info("Conversion du modèle au format TFLite...")
+            converter = tf.lite.TFLiteConverter.from_keras_model(keras_model)
+            # Écriture atomique : plusieurs processus de travail peuvent convertir le modèle en même temps
+            temp_path = f"{tflite_path}.{os.getpid()}.tmp"
+            with open(temp_path, "wb") as file:
+                file.write(converter.convert())
+            os.replace(temp_path, tflite_path)
+        if shared_weights:
+            # Sans délégué, les poids sont lus directement dans le fichier projeté en mémoire,
+            # dont les pages sont partagées entre tous les processus qui l'ouvrent
+            self.interpreter = tf.lite.Interpreter(
+                model_path=tflite_path,
+                num_threads=num_threads,
+                experimental_op_resolver_type=tf.lite.experimental.OpResolverType.BUILTIN_WITHOUT_DEFAULT_DELEGATES,
+            )
+        else:
+            # XNNPACK est le délégué CPU par défaut de l'interpréteur TFLite
+            self.interpreter = tf.lite.Interpreter(model_path=tflite_path, num_threads=num_threads)
+        self.input_index = self.interpreter.get_input_details()[0]["index"]
+        self.output_index = self.interpreter.get_output_details()[0]["index"]
+        self.batch_size = None
+        # L'interpréteur n'est pas thread-safe
+        self._lock = threading.Lock()
+
+    def predict(self, batch):
+        batch = np.ascontiguousarray(batch, dtype=np.float32)
+        with self._lock:
+            # On redimensionne l'entrée uniquement si la taille du batch change
+            if batch.shape[0] != self.batch_size:
+                self.interpreter.resize_tensor_input(self.input_index, batch.shape)
+                self.interpreter.allocate_tensors()
+                self.batch_size = batch.shape[0]
+            self.interpreter.set_tensor(self.input_index, batch)
+            self.interpreter.invoke()
+            return self.interpreter.get_tensor(self.output_index).copy()
+
+
+class BackendUnavailableError(Exception):
+    """
+    Levée lorsqu'un backend ne peut pas être utilisé dans cet environnement (dépendance absente)
+    """
+
+
+class OnnxBackend:
+    """
+    Exécute une version ONNX du modèle avec ONNX Runtime sur CPU.
+    Si le run MLflow ne contient pas de fichier model.onnx, il est converti depuis
+    le modèle Keras (nécessite tf2onnx) et enregistré à côté de saved_model.h5.
+    """
+    name = "onnx"
+
+    def __init__(self, keras_model, model_path, num_threads=None, **kwargs):
+        import onnxruntime as ort
+
+        onnx_path = os.path.join(model_path, "model.onnx")
+        if not os.path.exists(onnx_path):
+            try:
+                import tf2onnx
+            except ImportError:
+                raise BackendUnavailableError("tf2onnx n'est pas installé, conversion ONNX impossible")
+
+            logging.info("Conversion du modèle au format ONNX...")
+            input_shape = (None,) + tuple(keras_model.input_shape[1:])
+            tf2onnx.convert.from_keras(
+                keras_model,
+                input_signature=[tf.TensorSpec(input_shape, tf.float32, name="input")],
+                output_path=onnx_path,
+            )
+        options = ort.SessionOptions()
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(onnx_path, options, providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+
+    def predict(self, batch):
+        batch = np.ascontiguousarray(batch, dtype=np.float32)
+        return self.session.run(None, {self.input_name: batch})[0]
+
+
+BACKENDS = {
+    KerasBackend.name: KerasBackend,
+    TFLiteBackend.name: TFLiteBackend,
+    OnnxBackend.name: OnnxBackend,
+}
+
+
+def create_backend(name, keras_model, model_path, num_threads=None, **options):
+    """
+    Instancie le backend d'inférence demandé (les options propres à un backend sont ignorées par les autres)
+    """
+    if name not in BACKENDS:
+        raise ValueError(f"Backend d'inférence inconnu : {name} (disponibles : {', '.join(BACKENDS)})")
+    return BACKENDS[name](keras_model, model_path, num_threads=num_threads, **options)
+
+
+def check_parity(reference, candidate, batch, k=3, atol=1e-2):
+    """
+    Vérifie qu'un backend renvoie le même top k et des scores proches du backend de référence
+    """
+    expected = reference.predict(batch)
+    actual = candidate.predict(batch)
+    expected_top = np.argsort(expected, axis=1)[:, ::-1][:, :k]
+    actual_top = np.argsort(actual, axis=1)[:, ::-1][:, :k]
+    max_diff = float(np.max(np.abs(expected - actual)))
+    return bool(np.array_equal(expected_top, actual_top) and max_diff <= atol), max_diff
@@ -0,0 +1,143 @@
+import queue
+import threading
+import time
+import logging
+from concurrent.futures import Future
+from admission import DeadlineExceededError
+
+
+class BatcherFullError(Exception):
+    """
+    Levée lorsque la file d'attente du batcher est pleine
+    """
+
+
+class MicroBatcher:
+    """
+    Cette classe regroupe les prédictions concurrentes en un seul batch.
+    Les requêtes sont collectées pendant une fenêtre de temps bornée (max_wait_ms)
+    ou jusqu'à atteindre la taille maximale du batch, puis une seule passe du modèle
+    est effectuée et chaque appelant reçoit son propre résultat.
+    Les entrées dont l'échéance est dépassée au moment de former le batch sont abandonnées.
+    """
+
+    def __init__(self, predict_fn, max_batch_size=16, max_wait_ms=5, max_queue_size=256, queue_time_fn=None):
+        # La fonction appelée sur une liste d'entrées, elle renvoie une liste de résultats
+        self.predict_fn = predict_fn
+        # Fonction optionnelle appelée avec chaque entrée et son temps d'attente dans la file
+        self.queue_time_fn = queue_time_fn
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0, float(max_wait_ms)) / 1000
+        self.max_queue_size = max(1, int(max_queue_size))
+        self._queue = queue.Queue(maxsize=self.max_queue_size)
+
+        # Statistiques d'occupation des batchs (taille du batch -> nombre de batchs)
+        self._stats_lock = threading.Lock()
+        self.occupancy = {}
+        self.total_batches = 0
+        self.total_items = 0
+        self.rejected = 0
+        self.expired = 0
+        self.total_queue_time = 0.0
+        self.max_queue_time = 0.0
+
+        # On lance le thread qui exécute les batchs
+        self._thread = threading.Thread(target=self._run, name="micro-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, item, deadline=None):
+        """
+        Ajoute une entrée dans la file et renvoie le Future qui contiendra son résultat.
+        deadline (temps monotone) est l'échéance au-delà de laquelle l'entrée n'est plus prédite.
+        """
+        future = Future()
+        try:
+            self._queue.put_nowait((item, future, deadline, time.monotonic()))
+        except queue.Full:
+            with self._stats_lock:
+                self.rejected += 1
+            raise BatcherFullError(
+                f"La file d'attente du batcher est pleine ({self.max_queue_size} requêtes)"
+            )
+        return future
+
+    def _collect(self):
+        """
+        Attend une première entrée puis complète le batch jusqu'à la taille maximale
+        ou jusqu'à la fin de la fenêtre d'attente
+        """
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining <= 0:
+                    batch.append(self._queue.get_nowait())
+                else:
+                    batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _expire(self, batch):
+        """
+        Retire du batch les entrées dont l'échéance est dépassée et mesure le temps passé dans la file
+        """
+        now = time.monotonic()
+        kept = []
+        for item, future, deadline, enqueued_at in batch:
+            queue_time = now - enqueued_at
+            with self._stats_lock:
+                self.total_queue_time += queue_time
+                self.max_queue_time = max(self.max_queue_time, queue_time)
+            if self.queue_time_fn is not None:
+                self.queue_time_fn(item, queue_time)
+            if deadline is not None and now > deadline:
+                with self._stats_lock:
+                    self.expired += 1
+                future.set_exception(DeadlineExceededError(f"Échéance dépassée après {queue_time:.3f}s d'attente"))
+            else:
+                kept.append((item, future))
+        return kept
+
+    def _run(self):
+        while True:
+            batch = self._expire(self._collect())
+            if not batch:
+                continue
+            items = [item for item, _ in batch]
+            futures = [future for _, future in batch]
+            try:
+                results = self.predict_fn(items)
+                for future, result in zip(futures, results):
+                    future.set_result(result)
+            except Exception as e:
+                logging.error(f"Erreur lors de l'exécution d'un batch de {len(batch)} images : {e}")
+                for future in futures:
+                    future.set_exception(e)
+            with self._stats_lock:
+                self.occupancy[len(batch)] = self.occupancy.get(len(batch), 0) + 1
+                self.total_batches += 1
+                self.total_items += len(batch)
+
+    def stats(self):
+        """
+        Renvoie les statistiques d'occupation des batchs
+        """
+        with self._stats_lock:
+            mean_occupancy = self.total_items / self.total_batches if self.total_batches else 0
+            return {
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait * 1000,
+                "max_queue_size": self.max_queue_size,
+                "queue_depth": self._queue.qsize(),
+                "total_batches": self.total_batches,
+                "total_items": self.total_items,
+                "rejected": self.rejected,
+                "expired": self.expired,
+                "mean_queue_time": self.total_queue_time / (self.total_items + self.expired or 1),
+                "max_queue_time": self.max_queue_time,
+                "mean_batch_size": mean_occupancy,
+                "mean_occupancy": mean_occupancy / self.max_batch_size,
+                "occupancy": dict(sorted(self.occupancy.items())),
+            }
@@ -0,0 +1,67 @@
+"""
+Compare le temps de décodage par image entre l'ancien chemin (load_img de Keras,
+qui décode l'image en pleine résolution puis la redimensionne) et l'ImageDecoder.
+Exemple : python benchmark_decode.py volume_data/temp_images --repeat 5
+"""
+
+import os
+import time
+import argparse
+import numpy as np
+from tensorflow.keras.preprocessing import image
+from image_decoder import ImageDecoder
+
+
+def list_images(folder):
+    """
+    Renvoie les chemins des images JPEG et PNG d'un dossier
+    """
+    return [
+        os.path.join(folder, name)
+        for name in sorted(os.listdir(folder))
+        if name.lower().endswith((".jpg", ".jpeg", ".png"))
+    ]
+
+
+def keras_decode(image_path, target_size):
+    img = image.load_img(image_path, target_size=target_size)
+    return image.img_to_array(img)
+
+
+def benchmark(decode_fn, image_paths, repeat):
+    """
+    Renvoie les temps de décodage par image en millisecondes
+    """
+    timings = []
+    for _ in range(repeat):
+        for image_path in image_paths:
+            start_time = time.perf_counter()
+            decode_fn(image_path)
+            timings.append((time.perf_counter() - start_time) * 1000)
+    return np.array(timings)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark du décodage des images")
+    parser.add_argument("folder", help="Dossier contenant les images à décoder")
+    parser.add_argument("--repeat", type=int, default=3, help="Nombre de passages sur le dossier")
+    args = parser.parse_args()
+
+    target_size = (224, 224)
+    image_paths = list_images(args.folder)
+    if not image_paths:
+        raise SystemExit(f"Aucune image trouvée dans {args.folder}")
+    decoder = ImageDecoder(target_size=target_size)
+
+    results = {
+        "keras load_img": benchmark(lambda path: keras_decode(path, target_size), image_paths, args.repeat),
+        "ImageDecoder": benchmark(decoder.decode, image_paths, args.repeat),
+    }
+    print(f"{len(image_paths)} images, {args.repeat} passages")
+    for name, timings in results.items():
+        print(
+            f"{name:>16} : moyenne {timings.mean():.2f} ms, médiane {np.median(timings):.2f} ms, "
+            f"p95 {np.percentile(timings, 95):.2f} ms"
+        )
+    speedup = results["keras load_img"].mean() / results["ImageDecoder"].mean()
+    print(f"Accélération moyenne : x{speedup:.2f}")
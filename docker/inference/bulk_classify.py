@@ -0,0 +1,185 @@
+"""
+Classe toutes les images d'un dossier (et de ses sous-dossiers) hors ligne, sans passer par l'API.
+Les images sont parcourues au fil de l'eau avec os.scandir, décodées en parallèle par un pool de threads
+et prédites par gros batchs. Les résultats sont écrits au format Parquet, par parties enregistrées
+au fur et à mesure : si la commande est interrompue, elle reprend là où elle s'était arrêtée.
+Exemple : python bulk_classify.py volume_data/unknown_images volume_data/bulk/unknown_images --top-k 5
+"""
+
+import os
+import json
+import time
+import logging
+import argparse
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+from tensorflow.keras.applications.efficientnet import preprocess_input
+from tensorflow.keras.models import load_model
+from backends import BACKENDS, create_backend
+from image_decoder import ImageDecoder
+
+volume_path = "volume_data"
+prod_model_id_path = os.path.join(volume_path, "mlruns", "prod_model_id.txt")
+image_extensions = (".jpg", ".jpeg", ".png")
+default_image_size = (224, 224)
+
+
+def scan_images(folder):
+    """
+    Parcourt le dossier et ses sous-dossiers sans construire la liste complète des fichiers
+    """
+    folders = [folder]
+    while folders:
+        with os.scandir(folders.pop()) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    folders.append(entry.path)
+                elif entry.name.lower().endswith(image_extensions):
+                    yield entry.path
+
+
+def load_processed(output_folder):
+    """
+    Renvoie les chemins des images déjà classées, lus dans les parties déjà écrites,
+    ainsi que le numéro de la prochaine partie
+    """
+    processed = set()
+    parts = sorted(name for name in os.listdir(output_folder) if name.endswith(".parquet"))
+    for name in parts:
+        processed.update(pq.read_table(os.path.join(output_folder, name), columns=["path"]).column("path").to_pylist())
+    return processed, len(parts)
+
+
+def write_part(output_folder, part_number, rows, top_k):
+    """
+    Écrit une partie des résultats de façon atomique (elle sert aussi de point de reprise)
+    """
+    # Les types sont fixés pour que toutes les parties aient le même schéma, même sans aucune erreur
+    columns = {
+        "path": pa.array([row[0] for row in rows], pa.string()),
+        "error": pa.array([row[3] for row in rows], pa.string()),
+    }
+    for rank in range(top_k):
+        columns[f"class_{rank + 1}"] = pa.array([row[1][rank] if row[1] else None for row in rows], pa.string())
+        columns[f"score_{rank + 1}"] = pa.array([row[2][rank] if row[2] else None for row in rows], pa.float32())
+    path = os.path.join(output_folder, f"part-{part_number:05d}.parquet")
+    temp_path = f"{path}.tmp"
+    pq.write_table(pa.table(columns), temp_path, compression="zstd")
+    os.replace(temp_path, path)
+
+
+def model_image_size(keras_model):
+    """
+    Renvoie la taille d'entrée du modèle, ou la taille d'entraînement (224, 224) si elle n'est pas fixée
+    (EfficientNetB0 est créé sans input_shape, ses dimensions d'entrée valent None)
+    """
+    height, width = keras_model.input_shape[1:3]
+    if height is None or width is None:
+        return default_image_size
+    return height, width
+
+
+def decode(decoder, path):
+    """
+    Décode une image, ou renvoie l'erreur rencontrée
+    """
+    try:
+        return preprocess_input(decoder.decode(path)), None
+    except Exception as e:
+        return None, str(e)
+
+
+def classify(input_folder, output_folder, run_id=None, backend="keras", batch_size=64, top_k=3,
+             decode_workers=None, checkpoint_size=4096, num_threads=None):
+    """
+    Classe les images du dossier d'entrée et écrit les résultats dans le dossier de sortie.
+    Renvoie le nombre d'images traitées et le débit obtenu (images/s)
+    """
+    if run_id is None:
+        with open(prod_model_id_path, "r") as file:
+            run_id = file.read().strip()
+    model_path = os.path.join(volume_path, f"mlruns/157975935045122495/{run_id}/artifacts/model/")
+    with open(os.path.join(model_path, "classes.json"), "r") as file:
+        class_names = json.load(file)
+    keras_model = load_model(os.path.join(model_path, "saved_model.h5"))
+    model = create_backend(backend, keras_model, model_path, num_threads=num_threads)
+    decoder = ImageDecoder(target_size=model_image_size(keras_model))
+
+    os.makedirs(output_folder, exist_ok=True)
+    processed, part_number = load_processed(output_folder)
+    if processed:
+        logging.info(f"Reprise : {len(processed)} images déjà classées")
+    pending = (path for path in scan_images(input_folder) if os.path.relpath(path, input_folder) not in processed)
+
+    rows = []
+    total = 0
+    start_time = time.perf_counter()
+    decode_workers = decode_workers or os.cpu_count() or 1
+    with ThreadPoolExecutor(max_workers=decode_workers, thread_name_prefix="decode") as pool:
+        # Les décodages sont lancés en avance, dans la limite de deux batchs, pendant que le modèle travaille
+        in_flight = deque()
+
+        def fill():
+            while len(in_flight) < 2 * batch_size:
+                path = next(pending, None)
+                if path is None:
+                    return
+                in_flight.append((path, pool.submit(decode, decoder, path)))
+
+        fill()
+        while in_flight:
+            batch = [in_flight.popleft() for _ in range(min(batch_size, len(in_flight)))]
+            fill()
+            decoded = [(os.path.relpath(path, input_folder),) + future.result() for path, future in batch]
+            images = [image for _, image, error in decoded if error is None]
+            predictions = iter(model.predict(np.stack(images, axis=0)) if images else [])
+            for relative_path, image, error in decoded:
+                if error is not None:
+                    rows.append((relative_path, None, None, error))
+                    continue
+                prediction = next(predictions)
+                top = np.argsort(prediction)[::-1][:top_k]
+                rows.append((relative_path, [class_names[str(index)] for index in top], prediction[top].tolist(), None))
+            total += len(decoded)
+            if len(rows) >= checkpoint_size:
+                write_part(output_folder, part_number, rows, top_k)
+                part_number += 1
+                rows = []
+                elapsed = time.perf_counter() - start_time
+                logging.info(f"{total} images classées ({total / elapsed:.1f} images/s)")
+        if rows:
+            write_part(output_folder, part_number, rows, top_k)
+
+    elapsed = time.perf_counter() - start_time
+    return total, total / elapsed if elapsed else 0.0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Classification hors ligne des images d'un dossier")
+    parser.add_argument("input_folder", help="Dossier contenant les images (parcouru récursivement)")
+    parser.add_argument("output_folder", help="Dossier des résultats Parquet (point de reprise)")
+    parser.add_argument("--run-id", default=None, help="Run du modèle à utiliser (par défaut, celui en production)")
+    parser.add_argument("--backend", default="keras", choices=sorted(BACKENDS), help="Backend d'exécution du modèle")
+    parser.add_argument("--batch-size", type=int, default=64, help="Nombre d'images par passe du modèle")
+    parser.add_argument("--top-k", type=int, default=3, help="Nombre de classes enregistrées par image")
+    parser.add_argument("--decode-workers", type=int, default=None, help="Threads de décodage (un par coeur)")
+    parser.add_argument("--checkpoint-size", type=int, default=4096, help="Nombre d'images par partie enregistrée")
+    parser.add_argument("--num-threads", type=int, default=None, help="Threads CPU des backends TFLite et ONNX")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    total, throughput = classify(
+        args.input_folder,
+        args.output_folder,
+        run_id=args.run_id,
+        backend=args.backend,
+        batch_size=args.batch_size,
+        top_k=args.top_k,
+        decode_workers=args.decode_workers,
+        checkpoint_size=args.checkpoint_size,
+        num_threads=args.num_threads,
+    )
+    print(f"{total} images classées, {throughput:.1f} images/s")
@@ -0,0 +1,160 @@
+import os
+import json
+import threading
+import numpy as np
+
+
+class EmbeddingIndex:
+    """
+    Index des embeddings (sortie de l'avant-dernière couche du modèle) des images d'entraînement,
+    pour retrouver les images de référence les plus proches visuellement d'une image prédite.
+    Les embeddings sont normalisés et stockés en float16 dans un fichier brut projeté en mémoire
+    (recherche exacte par produit scalaire) : seules les pages lues sont chargées en RAM.
+    L'index est construit de façon incrémentale : seules les images absentes de l'index sont calculées
+    et ajoutées à la fin du fichier, les images supprimées sont ignorées lors de la recherche.
+    """
+
+    def __init__(self, folder, dim=640):
+        self.folder = folder
+        self.dim = int(dim)
+        self.embeddings_path = os.path.join(folder, "embeddings.f16")
+        self.entries_path = os.path.join(folder, "entries.json")
+        self._lock = threading.Lock()
+        # Tenu pendant toute une mise à jour : une seule mise à jour à la fois par index
+        self._update_lock = threading.Lock()
+        # Chemin relatif et classe de chaque ligne du fichier d'embeddings
+        self.paths = []
+        self.labels = np.empty(0, dtype=np.int32)
+        self.removed = set()
+        self._embeddings = None
+        self._entries_mtime = None
+        self.load()
+
+    def __len__(self):
+        return len(self.paths)
+
+    @property
+    def updating(self):
+        return self._update_lock.locked()
+
+    def load(self):
+        """
+        Charge la liste des images indexées et projette le fichier d'embeddings en mémoire
+        """
+        if not os.path.exists(self.entries_path):
+            return
+        mtime = os.path.getmtime(self.entries_path)
+        with open(self.entries_path, "r") as file:
+            entries = json.load(file)
+        # Les lignes écrites après le dernier enregistrement de la liste sont ignorées (arrêt pendant une mise à jour)
+        count = min(len(entries["paths"]), os.path.getsize(self.embeddings_path) // (self.dim * 2))
+        with self._lock:
+            self.paths = entries["paths"][:count]
+            self.labels = np.asarray(entries["labels"][:count], dtype=np.int32)
+            self.removed = set(entries.get("removed", []))
+            self._entries_mtime = mtime
+            self._map(count)
+
+    def reload_if_changed(self):
+        """
+        Recharge l'index s'il a été mis à jour par un autre processus
+        """
+        if self.updating or not os.path.exists(self.entries_path):
+            return
+        if os.path.getmtime(self.entries_path) != self._entries_mtime:
+            self.load()
+
+    def _map(self, count):
+        self._embeddings = (
+            np.memmap(self.embeddings_path, dtype=np.float16, mode="r", shape=(count, self.dim)) if count else None
+        )
+
+    def _save_entries(self):
+        temp_path = f"{self.entries_path}.tmp"
+        with open(temp_path, "w") as file:
+            json.dump(
+                {"dim": self.dim, "paths": self.paths, "labels": self.labels.tolist(), "removed": sorted(self.removed)},
+                file,
+            )
+        os.replace(temp_path, self.entries_path)
+        self._entries_mtime = os.path.getmtime(self.entries_path)
+
+    @staticmethod
+    def normalize(embeddings):
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        norms = np.linalg.norm(embeddings, axis=-1, keepdims=True)
+        return embeddings / np.maximum(norms, 1e-12)
+
+    def update(self, images, embed_fn, batch_size=64):
+        """
+        Ajoute à l'index les images absentes. images est une liste de (chemin relatif, chemin complet, classe),
+        embed_fn calcule les embeddings d'une liste de chemins complets.
+        Renvoie le nombre d'images ajoutées, ou None si une autre mise à jour de l'index est déjà en cours.
+        """
+        # Le test et la prise du verrou sont atomiques : deux appels simultanés ne peuvent pas écrire tous les deux
+        if not self._update_lock.acquire(blocking=False):
+            return None
+        try:
+            os.makedirs(self.folder, exist_ok=True)
+            with self._lock:
+                indexed = set(self.paths)
+                current = {relative_path for relative_path, _, _ in images}
+                self.removed = {path for path in indexed if path not in current}
+            missing = [image for image in images if image[0] not in indexed]
+            added = 0
+            # On retire les lignes écrites après le dernier enregistrement de la liste (arrêt pendant une mise à jour)
+            if os.path.exists(self.embeddings_path):
+                with open(self.embeddings_path, "r+b") as file:
+                    file.truncate(len(self.paths) * self.dim * 2)
+            for start in range(0, len(missing), batch_size):
+                chunk = missing[start:start + batch_size]
+                embeddings = self.normalize(embed_fn([full_path for _, full_path, _ in chunk]))
+                # On ajoute les lignes à la fin du fichier puis on met à jour la liste des images
+                with open(self.embeddings_path, "ab") as file:
+                    file.write(embeddings.astype(np.float16).tobytes())
+                with self._lock:
+                    self.paths.extend(relative_path for relative_path, _, _ in chunk)
+                    self.labels = np.concatenate([self.labels, [label for _, _, label in chunk]]).astype(np.int32)
+                    self._save_entries()
+                    self._map(len(self.paths))
+                added += len(chunk)
+            if not missing:
+                with self._lock:
+                    self._save_entries()
+            return added
+        finally:
+            self._update_lock.release()
+
+    def search(self, query, labels, k=3):
+        """
+        Renvoie, pour chaque classe demandée, les k images indexées de cette classe les plus proches
+        de l'embedding donné, sous la forme {classe: [(chemin relatif, similarité), ...]}
+        """
+        self.reload_if_changed()
+        query = self.normalize(query).astype(np.float16)
+        with self._lock:
+            embeddings, paths, row_labels, removed = self._embeddings, self.paths, self.labels, self.removed
+        results = {label: [] for label in labels}
+        if embeddings is None:
+            return results
+        # Un seul produit matriciel pour toutes les classes, puis sélection par classe
+        similarities = np.asarray(embeddings @ query, dtype=np.float32)
+        for label in labels:
+            rows = np.flatnonzero(row_labels == label)
+            if removed:
+                rows = np.asarray([row for row in rows if paths[row] not in removed], dtype=np.int64)
+            if rows.size == 0:
+                continue
+            top = rows[np.argsort(-similarities[rows])[:k]]
+            results[label] = [(paths[row], float(similarities[row])) for row in top]
+        return results
+
+    def stats(self):
+        with self._lock:
+            return {
+                "images": len(self.paths),
+                "removed": len(self.removed),
+                "dim": self.dim,
+                "size_mb": len(self.paths) * self.dim * 2 / (1024 * 1024),
+                "updating": self.updating,
+            }
@@ -0,0 +1,110 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+class ExecutorFullError(Exception):
+    """
+    Levée lorsque trop de tâches sont déjà en attente dans l'exécuteur
+    """
+
+
+class BoundedExecutor:
+    """
+    Cette classe exécute les tâches bloquantes (décodage, inférence, écriture des logs,
+    chargement de modèle) dans un pool de threads borné, afin que la boucle d'événements
+    de FastAPI ne s'occupe que des entrées/sorties.
+    Le nombre de tâches en attente est limité : au-delà, les nouvelles tâches sont refusées.
+    """
+
+    def __init__(self, max_workers=4, max_pending=64, name="inference"):
+        self.max_workers = max(1, int(max_workers))
+        self.max_pending = max(self.max_workers, int(max_pending))
+        self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=name)
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+
+        # Métriques de la file d'attente
+        self._stats_lock = threading.Lock()
+        self.pending = 0
+        self.running = 0
+        self.completed = 0
+        self.rejected = 0
+        self.cancelled = 0
+        self.total_wait_time = 0.0
+        self.max_wait_time = 0.0
+
+    def submit(self, fn, *args, **kwargs):
+        """
+        Soumet une tâche au pool et renvoie son Future
+        """
+        # On refuse immédiatement la tâche si la file est pleine
+        if not self._slots.acquire(blocking=False):
+            with self._stats_lock:
+                self.rejected += 1
+            raise ExecutorFullError(
+                f"Trop de tâches en attente dans l'exécuteur ({self.max_pending})"
+            )
+        submitted_at = time.monotonic()
+        with self._stats_lock:
+            self.pending += 1
+        started = threading.Event()
+
+        def task():
+            # On mesure le temps passé dans la file avant l'exécution
+            wait_time = time.monotonic() - submitted_at
+            with self._stats_lock:
+                self.pending -= 1
+                self.running += 1
+                self.total_wait_time += wait_time
+                self.max_wait_time = max(self.max_wait_time, wait_time)
+            started.set()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                with self._stats_lock:
+                    self.running -= 1
+                    self.completed += 1
+
+        def release(future):
+            # Appelé que la tâche se termine ou soit annulée avant d'avoir démarré
+            # (coroutine annulée pendant l'attente) : la place est toujours rendue
+            if not started.is_set():
+                with self._stats_lock:
+                    self.pending -= 1
+                    self.cancelled += 1
+            self._slots.release()
+
+        try:
+            future = self._pool.submit(task)
+        except Exception:
+            with self._stats_lock:
+                self.pending -= 1
+            self._slots.release()
+            raise
+        future.add_done_callback(release)
+        return future
+
+    async def run(self, fn, *args, **kwargs):
+        """
+        Exécute une tâche dans le pool et attend son résultat sans bloquer la boucle d'événements
+        """
+        return await asyncio.wrap_future(self.submit(fn, *args, **kwargs))
+
+    def stats(self):
+        """
+        Renvoie les métriques de la file d'attente de l'exécuteur
+        """
+        with self._stats_lock:
+            started = self.completed + self.running
+            return {
+                "max_workers": self.max_workers,
+                "max_pending": self.max_pending,
+                "queue_depth": self.pending,
+                "running": self.running,
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "cancelled": self.cancelled,
+                "mean_wait_time": self.total_wait_time / started if started else 0,
+                "max_wait_time": self.max_wait_time,
+            }
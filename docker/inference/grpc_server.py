@@ -0,0 +1,130 @@
+"""
+Interface binaire (gRPC sur HTTP/2) du container d'inférence, servie à côté de FastAPI.
+Les messages ne passent pas par protobuf : une requête contient le nom de l'image suivi de son contenu,
+une réponse contient un court en-tête JSON (classes, étage, nom) suivi des scores en float32.
+Méthodes :
+- /aviscan.Inference/Predict : une image, une réponse
+- /aviscan.Inference/PredictStream : flux d'images, flux de réponses dans le même ordre
+"""
+
+import json
+import struct
+import asyncio
+import logging
+import numpy as np
+import grpc
+
+SERVICE = "aviscan.Inference"
+
+
+def encode_request(file_name, content):
+    name = file_name.encode()
+    return struct.pack("<H", len(name)) + name + content
+
+
+def decode_request(message):
+    (name_length,) = struct.unpack_from("<H", message)
+    name = message[2:2 + name_length].decode()
+    return name, message[2 + name_length:]
+
+
+def encode_response(result):
+    # Une erreur sur une image d'un flux est renvoyée dans l'en-tête, sans scores
+    header = json.dumps({key: value for key, value in result.items() if key != "scores"}).encode()
+    scores = np.asarray(result.get("scores", []), dtype="<f4").tobytes()
+    return struct.pack("<I", len(header)) + header + scores
+
+
+def decode_response(message):
+    (header_length,) = struct.unpack_from("<I", message)
+    result = json.loads(message[4:4 + header_length])
+    result["scores"] = np.frombuffer(message[4 + header_length:], dtype="<f4").tolist()
+    return result
+
+
+def status_code(http_status):
+    """
+    Convertit le code HTTP d'une erreur de l'inférence en code gRPC
+    """
+    if http_status == 503:
+        return grpc.StatusCode.RESOURCE_EXHAUSTED
+    if http_status == 400:
+        return grpc.StatusCode.INVALID_ARGUMENT
+    return grpc.StatusCode.INTERNAL
+
+
+def create_server(predict_fn, port, deadline_fn, max_in_flight=16):
+    """
+    Crée le serveur gRPC asynchrone. predict_fn(content, file_name, deadline) est la coroutine
+    de prédiction de FastAPI, deadline_fn convertit le temps restant de l'appel en échéance.
+    max_in_flight borne le nombre d'images d'un même flux en cours de prédiction (la taille d'un batch)
+    """
+
+    async def predict_one(message, context):
+        file_name, content = decode_request(message)
+        return await predict_fn(content, file_name or None, deadline_fn(context.time_remaining()))
+
+    async def predict(message, context):
+        try:
+            return encode_response(await predict_one(message, context))
+        except Exception as e:
+            headers = getattr(e, "headers", None) or {}
+            if "Retry-After" in headers:
+                await context.send_initial_metadata((("retry-after", headers["Retry-After"]),))
+            await context.abort(status_code(getattr(e, "status_code", 500)), str(getattr(e, "detail", e)))
+
+    async def predict_stream_one(message, context):
+        try:
+            return encode_response(await predict_one(message, context))
+        except Exception as e:
+            return encode_response({"filename": decode_request(message)[0], "error": str(getattr(e, "detail", e))})
+
+    async def predict_stream(messages, context):
+        # Les images du flux sont prédites en parallèle (elles rejoignent les mêmes batchs) dans la limite
+        # de max_in_flight à la fois, pour ne pas remplir l'exécuteur avec un seul flux ;
+        # les réponses sont renvoyées dans l'ordre des requêtes
+        slots = asyncio.Semaphore(max_in_flight)
+        pending = asyncio.Queue()
+        tasks = set()
+
+        async def read():
+            try:
+                async for message in messages:
+                    await slots.acquire()
+                    task = asyncio.ensure_future(predict_stream_one(message, context))
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+                    await pending.put(task)
+            finally:
+                await pending.put(None)
+
+        reader = asyncio.ensure_future(read())
+        try:
+            while True:
+                task = await pending.get()
+                if task is None:
+                    # Relance l'erreur éventuelle de lecture du flux
+                    await reader
+                    break
+                response = await task
+                slots.release()
+                yield response
+        finally:
+            # Fin du flux, client parti ou échéance dépassée : les prédictions restantes sont annulées
+            reader.cancel()
+            for task in list(tasks):
+                task.cancel()
+
+    handlers = grpc.method_handlers_generic_handler(SERVICE, {
+        "Predict": grpc.unary_unary_rpc_method_handler(predict),
+        "PredictStream": grpc.stream_stream_rpc_method_handler(predict_stream),
+    })
+    server = grpc.aio.server(options=[
+        ("grpc.max_receive_message_length", 32 * 1024 * 1024),
+        ("grpc.keepalive_permit_without_calls", 1),
+        ("grpc.http2.min_ping_interval_without_data_ms", 10000),
+    ])
+    server.add_generic_rpc_handlers((handlers,))
+    server.add_insecure_port(f"[::]:{port}")
+    logging.info(f"Serveur gRPC prêt sur le port {port}")
+    return server
@@ -0,0 +1,123 @@
+import os
+import csv
+import threading
+import logging
+from collections import deque
+from datetime import datetime
+
+
+class InferenceHistoryWriter:
+    """
+    Cette classe enregistre l'historique des inférences en arrière-plan.
+    Les lignes sont gardées dans un buffer circulaire en mémoire puis écrites par lots,
+    dès que le buffer atteint flush_size lignes ou toutes les flush_interval secondes.
+    Un nouveau fichier est créé chaque jour ou lorsque le fichier courant dépasse max_file_size octets.
+    En cas d'arrêt brutal, au plus un intervalle d'écriture est perdu.
+    Le préfixe des fichiers permet à plusieurs processus d'écrire dans le même dossier.
+    """
+
+    columns = [
+        "timestamp", "id_model", "role", "image_name",
+        "class_1", "class_2", "class_3", "score_1", "score_2", "score_3",
+    ]
+
+    def __init__(self, folder, flush_interval=1.0, flush_size=256, max_file_size=50 * 1024 * 1024,
+                 buffer_size=10000, prefix="inferences"):
+        self.folder = folder
+        self.prefix = prefix
+        self.flush_interval = float(flush_interval)
+        self.flush_size = max(1, int(flush_size))
+        self.max_file_size = int(max_file_size)
+        os.makedirs(self.folder, exist_ok=True)
+
+        # Buffer circulaire : si l'écriture prend du retard, les lignes les plus anciennes sont perdues
+        self._buffer = deque(maxlen=max(self.flush_size, int(buffer_size)))
+        self._lock = threading.Lock()
+        self._flush_requested = threading.Event()
+        self._stopped = threading.Event()
+        # Empêche deux écritures simultanées (thread d'arrière-plan et arrêt du container)
+        self._file_lock = threading.Lock()
+
+        self.current_path = None
+        self.current_day = None
+        self.written = 0
+        self.dropped = 0
+
+        self._thread = threading.Thread(target=self._run, name="history-writer", daemon=True)
+        self._thread.start()
+
+    def write(self, run_id, image_name, class_indices, scores, role="production"):
+        """
+        Ajoute une inférence au buffer, sans aucune écriture sur le disque.
+        Le rôle indique si le modèle était en production, en canary ou en shadow.
+        """
+        row = [datetime.now().isoformat(timespec="milliseconds"), run_id, role, image_name]
+        row += [int(index) for index in class_indices]
+        row += [f"{float(score):.6g}" for score in scores]
+        with self._lock:
+            if len(self._buffer) == self._buffer.maxlen:
+                self.dropped += 1
+            self._buffer.append(row)
+            if len(self._buffer) >= self.flush_size:
+                self._flush_requested.set()
+
+    def _open_file(self):
+        """
+        Renvoie le fichier dans lequel écrire, en passant à un nouveau fichier si nécessaire
+        """
+        now = datetime.now()
+        if (
+            self.current_path is None
+            or self.current_day != now.date()
+            or os.path.getsize(self.current_path) >= self.max_file_size
+        ):
+            self.current_day = now.date()
+            self.current_path = os.path.join(self.folder, f'{self.prefix}_{now.strftime("%d%m%Y_%H%M%S")}.csv')
+        is_new = not os.path.exists(self.current_path)
+        file = open(self.current_path, "a", newline="")
+        if is_new:
+            csv.writer(file).writerow(self.columns)
+        return file
+
+    def flush(self):
+        """
+        Écrit toutes les lignes en attente dans le fichier courant
+        """
+        with self._file_lock:
+            with self._lock:
+                rows = list(self._buffer)
+                self._buffer.clear()
+            if not rows:
+                return
+            try:
+                with self._open_file() as file:
+                    csv.writer(file).writerows(rows)
+                    file.flush()
+                    os.fsync(file.fileno())
+                self.written += len(rows)
+            except Exception as e:
+                logging.error(f"Erreur lors de l'écriture de l'historique des inférences : {e}")
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._flush_requested.wait(timeout=self.flush_interval)
+            self._flush_requested.clear()
+            self.flush()
+
+    def close(self):
+        """
+        Arrête le thread d'écriture et écrit les dernières lignes
+        """
+        self._stopped.set()
+        self._flush_requested.set()
+        self._thread.join(timeout=5)
+        self.flush()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "buffered": len(self._buffer),
+                "written": self.written,
+                "dropped": self.dropped,
+                "current_file": self.current_path,
+            }
@@ -0,0 +1,60 @@
+import io
+import numpy as np
+from PIL import Image, ImageOps
+
+
+class ImageDecodeError(Exception):
+    """
+    Levée lorsque le contenu envoyé n'est pas une image lisible (format inconnu, fichier tronqué)
+    """
+
+
+class ImageDecoder:
+    """
+    Cette classe décode les images envoyées au modèle le plus rapidement possible.
+    Pour un JPEG, le décodage se fait directement à l'échelle réduite (1/2, 1/4 ou 1/8)
+    la plus proche au-dessus de la taille cible grâce au mode draft de Pillow,
+    puis un seul redimensionnement est effectué vers la taille du modèle.
+    Les autres formats (PNG...) sont décodés normalement, et l'orientation EXIF est respectée.
+    """
+
+    def __init__(self, target_size=(224, 224), resample=Image.Resampling.BICUBIC):
+        # La taille cible est exprimée en (hauteur, largeur) comme pour Keras
+        self.target_size = tuple(target_size)
+        self.resample = resample
+
+    def open(self, source):
+        """
+        Ouvre une image depuis un chemin ou depuis son contenu en octets
+        """
+        if isinstance(source, (bytes, bytearray, memoryview)):
+            return Image.open(io.BytesIO(source))
+        return Image.open(source)
+
+    def decode_uint8(self, source):
+        """
+        Décode une image en tableau uint8 de forme (hauteur, largeur, 3)
+        """
+        height, width = self.target_size
+        try:
+            with self.open(source) as img:
+                if img.format == "JPEG":
+                    # Le décodeur JPEG saute directement les coefficients DCT inutiles,
+                    # la taille obtenue reste supérieure ou égale à la taille demandée
+                    img.draft("RGB", (width, height))
+                img = ImageOps.exif_transpose(img)
+                if img.mode != "RGB":
+                    img = img.convert("RGB")
+                if img.size != (width, height):
+                    img = img.resize((width, height), self.resample)
+                return np.asarray(img, dtype=np.uint8)
+        except (OSError, SyntaxError, Image.DecompressionBombError) as e:
+            # Pillow signale un contenu illisible par UnidentifiedImageError, OSError ou SyntaxError
+            raise ImageDecodeError(f"Image illisible : {e}") from e
+
+    def decode(self, source):
+        """
+        Décode une image en tableau float32 de forme (hauteur, largeur, 3).
+        Un nouveau tableau est créé à chaque appel : il reste dans la file du batcher jusqu'à la passe du modèle
+        """
+        return self.decode_uint8(source).astype(np.float32)
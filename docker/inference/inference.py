@@ -1,16 +1,33 @@
 import os
 import numpy as np
-from fastapi import FastAPI, HTTPException, Body
-from tensorflow.keras.preprocessing import image
+from fastapi import FastAPI, HTTPException, Body, BackgroundTasks, Request, Header
+from fastapi.responses import StreamingResponse
+from typing import List
 from tensorflow.keras.applications.efficientnet import preprocess_input
-from tensorflow.keras.models import load_model
+from tensorflow.keras.models import load_model, Model
 import logging
 import tensorflow as tf
 import time
 import json
-import csv
-from datetime import datetime
+import asyncio
+import threading
+import random
+import hashlib
 from alert_system import AlertSystem
+from batcher import MicroBatcher, BatcherFullError
+from admission import AdmissionController, AdmissionRejectedError, DeadlineExceededError, deadline_from_header
+from executor import BoundedExecutor, ExecutorFullError
+from prediction_cache import PredictionCache
+from backends import KerasBackend, BackendUnavailableError, create_backend, check_parity
+from image_decoder import ImageDecoder, ImageDecodeError
+from history_writer import InferenceHistoryWriter
+from metrics import InferenceMetrics, SlowInferenceDetector
+from model_pool import ModelPool
+from single_flight import SingleFlight
+from embedding_index import EmbeddingIndex
+from grpc_server import create_server
+from autotune import autotune, load_profile, apply_threading, profile_matches_backend
+from workers import publish_stats, read_stats, memory_usage, RetryBackoff
 
 # On lance le serveur FastAPI
 app = FastAPI()
@@ -23,7 +40,13 @@ volume_path = "volume_data"
 log_folder = os.path.join(volume_path, "logs")
 mlruns_path = os.path.join(volume_path, "mlruns")
 prod_model_id_path = os.path.join(mlruns_path, "prod_model_id.txt")
+# Répartition canary/shadow du trafic, suivie par tous les processus de travail
+traffic_config_path = os.path.join(mlruns_path, "traffic.json")
 temp_folder = os.path.join(volume_path, "temp_images")
+hist_inferences_dir = os.path.join(log_folder, "inferences")
+train_images_path = os.path.join(volume_path, "dataset_clean", "train")
+embedding_index_folder = os.path.join(volume_path, "embedding_index")
+golden_images_path = os.getenv("INFERENCE_GOLDEN_IMAGES_PATH", os.path.join(volume_path, "golden_images"))
 
 # On créer le dossier si nécessaire
 os.makedirs(log_folder, exist_ok=True)
@@ -36,43 +59,104 @@ logging.basicConfig(
     datefmt="%d/%m/%Y %I:%M:%S %p",
 )
 
-# Cette variable s'incrémente dès que le temps d'inférence est trop long
-too_long_inference = 0
+# Paramètres de l'alerte de lenteur : elle est envoyée lorsque le percentile de latence
+# des dernières requêtes dépasse le seuil (en secondes), au plus une fois par cooldown
+latency_threshold = float(os.getenv("INFERENCE_LATENCY_THRESHOLD", "1"))
+latency_percentile = int(os.getenv("INFERENCE_LATENCY_PERCENTILE", "95"))
+latency_window_size = int(os.getenv("INFERENCE_LATENCY_WINDOW", "200"))
+latency_alert_cooldown = float(os.getenv("INFERENCE_LATENCY_ALERT_COOLDOWN", "900"))
+
+# On collecte les métriques de performance (latence par étape, débit, taille des batchs...)
+metrics = InferenceMetrics(window_size=latency_window_size)
+slow_inference_detector = SlowInferenceDetector(
+    metrics,
+    threshold=latency_threshold,
+    percentile=latency_percentile,
+    cooldown=latency_alert_cooldown,
+)
+
+# Paramètres du regroupement des requêtes concurrentes en batchs
+max_batch_size = int(os.getenv("INFERENCE_MAX_BATCH_SIZE", "16"))
+max_batch_wait_ms = float(os.getenv("INFERENCE_MAX_BATCH_WAIT_MS", "5"))
+max_queue_size = int(os.getenv("INFERENCE_MAX_QUEUE_SIZE", "256"))
+
+# Nombre maximal de requêtes /predict admises en même temps, au-delà elles sont refusées (503 et Retry-After)
+max_pending_requests = int(os.getenv("INFERENCE_MAX_PENDING_REQUESTS", "128"))
+
+# Paramètres du pool de threads qui exécute les tâches bloquantes
+executor_workers = int(os.getenv("INFERENCE_EXECUTOR_WORKERS", "4"))
+executor_max_pending = int(os.getenv("INFERENCE_EXECUTOR_MAX_PENDING", "64"))
+
+# Paramètres du cache des prédictions (le chemin est optionnel et permet de conserver le cache)
+cache_max_entries = int(os.getenv("INFERENCE_CACHE_SIZE", "1024"))
+cache_ttl = float(os.getenv("INFERENCE_CACHE_TTL", "3600"))
+cache_path = os.getenv("INFERENCE_CACHE_PATH", "")
+
+# Paramètres de l'écriture de l'historique des inférences
+history_flush_interval = float(os.getenv("INFERENCE_HISTORY_FLUSH_INTERVAL", "1"))
+history_flush_size = int(os.getenv("INFERENCE_HISTORY_FLUSH_SIZE", "256"))
+history_max_file_size = int(float(os.getenv("INFERENCE_HISTORY_MAX_FILE_SIZE_MB", "50")) * 1024 * 1024)
+
+# Backend utilisé pour exécuter le modèle (keras, tflite ou onnx) et nombre de threads CPU.
+# Un fichier backend.txt dans les artefacts du modèle permet de choisir le backend d'un run précis
+default_backend = os.getenv("INFERENCE_BACKEND", "keras")
+backend_num_threads = int(os.getenv("INFERENCE_NUM_THREADS", "0")) or None
+
+# Réglage automatique des threads et de la taille de batch : "0" utilise le profil enregistré s'il existe,
+# "1" lance la recherche au démarrage si aucun profil n'existe pour cette machine, "force" la relance toujours
+autotune_mode = os.getenv("INFERENCE_AUTOTUNE", "0")
+tuning_profile_path = os.getenv(
+    "INFERENCE_TUNING_PROFILE_PATH", os.path.join(volume_path, "tuning", "inference_profile.json")
+)
+
+# Mode cascade : un petit modèle (cascade_model.h5 dans les artefacts du run) répond en premier,
+# et seules les images dont le meilleur score est inférieur au seuil passent par le modèle complet
+cascade_enabled = os.getenv("INFERENCE_CASCADE", "0") == "1"
+cascade_threshold = float(os.getenv("INFERENCE_CASCADE_THRESHOLD", "0.9"))
+
+# Nombre de modèles gardés en mémoire et budget mémoire de leurs poids (canary, shadow, retour arrière)
+max_resident_models = int(os.getenv("INFERENCE_MAX_RESIDENT_MODELS", "3"))
+model_memory_budget_mb = float(os.getenv("INFERENCE_MODEL_MEMORY_BUDGET_MB", "2048"))
+
+# Si égal à 1, l'index des embeddings des images d'entraînement du modèle en production est construit
+# (ou complété) automatiquement au démarrage et après chaque changement de modèle
+embedding_index_enabled = os.getenv("INFERENCE_EMBEDDING_INDEX", "0") == "1"
+
+# Port de l'interface binaire gRPC servie à côté de FastAPI (0 pour la désactiver)
+grpc_port = int(os.getenv("INFERENCE_GRPC_PORT", "50051"))
+
+# Tailles de batch préchauffées au chargement d'un modèle (par défaut, calculées à partir de la taille maximale)
+warmup_batch_sizes = os.getenv("INFERENCE_WARMUP_BATCH_SIZES", "")
+
+# Mode multi-processus (workers.py) : identifiant du processus de travail, absent en mode mono-processus
+worker_id = os.getenv("INFERENCE_WORKER_ID")
+# Les poids peuvent être partagés entre processus via le fichier TFLite projeté en mémoire (backend tflite
+# sans délégué) : moins de mémoire par processus, mais pas de XNNPACK ni d'embeddings
+shared_weights = os.getenv("INFERENCE_SHARED_WEIGHTS", "0") == "1"
+# Intervalle de publication des métriques de chaque processus et de vérification du modèle en production
+worker_sync_interval = float(os.getenv("INFERENCE_WORKER_SYNC_INTERVAL", "5"))
+if worker_id is not None:
+    # Chaque processus a son propre fichier de cache, les fichiers d'historique sont préfixés par son identifiant
+    if cache_path:
+        cache_path = f"{os.path.splitext(cache_path)[0]}_worker{worker_id}{os.path.splitext(cache_path)[1]}"
+
+# Précision top-3 minimale qu'un nouveau modèle doit atteindre sur les images de référence
+golden_min_accuracy = float(os.getenv("INFERENCE_GOLDEN_MIN_ACCURACY", "0.8"))
 
 # ----------------------------------------------------------------------------------------- #
 
 
 class predictClass:
     """
-    Cette classe permet d'effectuer des prédictions à partir d'un modèle .h5 (Keras)
+    Cette classe permet d'effectuer des prédictions à partir d'un modèle .h5 (Keras).
+    Le modèle peut être exécuté par Keras ou par une version convertie (TFLite, ONNX Runtime).
     """
 
-    def __init__(self, model_path, img_size=(224, 224)):
+    def __init__(self, model_path, img_size=(224, 224), run_id=None, backend=None):
         self.img_size = img_size
         self.model_path = model_path
-
-        # region On créer un dossier pour stocker l'historique des inférences
-        volume_path = "volume_data"
-        hist_inferences_dir = os.path.join(volume_path, "logs/inferences")
-        os.makedirs(hist_inferences_dir, exist_ok=True)
-
-        self.csv_filename = os.path.join(
-            hist_inferences_dir, f'inferences_{datetime.now().strftime("%d%m%Y_%H%M")}.csv'
-        )
-        with open(self.csv_filename, "w", newline="") as csvfile:
-            writer = csv.writer(csvfile)
-
-            columns = [
-                "timestamp",
-                "id_model",
-                "image_name",
-                "classes",
-                "scores"
-            ]
-
-            writer.writerow(columns)
-
-        # endregion
+        self.run_id = run_id
+        self.decoder = ImageDecoder(target_size=img_size)
 
         # Configurer GPU si disponible
         self.configure_gpu()
@@ -83,6 +167,9 @@ class predictClass:
             # On charge les labels des classes utilisées durant l'entraînement
             with open(os.path.join(model_path, "classes.json"), "r") as file:
                 self.class_names = json.load(file)
+            # Dictionnaire inverse pour retrouver l'index d'une classe à partir de son label
+            self.class_indices = {name: int(index) for index, name in self.class_names.items()}
+            self.num_params = self.model.count_params()
             logging.info("Modèle chargé avec succès.")
         except Exception as e:
             logging.error(f"Erreur lors de l'ouverture du modèle: {str(e)}")
@@ -92,6 +179,77 @@ class predictClass:
             )
             raise
 
+        # On choisit le backend qui exécutera le modèle
+        backend_name = backend or get_run_backend(model_path)
+        if shared_weights and backend_name != "tflite":
+            logging.info(f"Poids partagés entre processus : backend tflite utilisé à la place de {backend_name}")
+            backend_name = "tflite"
+        self.backend = self.load_backend(backend_name)
+        # Modèle renvoyant à la fois les scores et l'embedding (avant-dernière couche), créé à la première utilisation
+        self.embedding_model = None
+        self._embedding_lock = threading.Lock()
+        if shared_weights and self.backend.name == "tflite":
+            # Le modèle Keras n'est plus nécessaire, seuls les poids du fichier partagé restent en mémoire
+            self.model = None
+        # On charge le petit modèle de la cascade s'il est activé et présent dans le run
+        self.cascade_backend = self.load_cascade_backend() if cascade_enabled else None
+
+    def load_cascade_backend(self):
+        """
+        Charge le petit modèle utilisé en premier étage de la cascade
+        """
+        cascade_path = os.path.join(self.model_path, "cascade_model.h5")
+        if not os.path.exists(cascade_path):
+            logging.warning(f"Aucun modèle de cascade pour le run {self.run_id}, le modèle complet répond seul.")
+            return None
+        try:
+            cascade_model = load_model(cascade_path)
+            if cascade_model.output_shape[-1] != len(self.class_names):
+                raise ValueError(
+                    f"Le modèle de cascade renvoie {cascade_model.output_shape[-1]} scores "
+                    f"pour {len(self.class_names)} classes"
+                )
+            logging.info("Modèle de cascade chargé avec succès.")
+            return KerasBackend(cascade_model, self.model_path)
+        except Exception as e:
+            logging.error(f"Impossible d'utiliser le modèle de cascade, le modèle complet répond seul : {e}")
+            return None
+
+    def load_backend(self, backend_name):
+        """
+        Charge le backend demandé et vérifie qu'il donne les mêmes résultats que Keras.
+        En cas d'échec, on revient sur le modèle Keras.
+        """
+        keras_backend = KerasBackend(self.model, self.model_path)
+        if backend_name == KerasBackend.name:
+            return keras_backend
+        try:
+            backend = create_backend(
+                backend_name,
+                self.model,
+                self.model_path,
+                num_threads=backend_num_threads,
+                shared_weights=shared_weights,
+            )
+            # On compare le top 3 du backend avec celui de Keras sur l'image de chargement
+            batch = np.expand_dims(self.preprocess("./load_image.jpg"), axis=0)
+            identical, max_diff = check_parity(keras_backend, backend, batch)
+            if not identical:
+                raise ValueError(f"Résultats différents de Keras (écart maximal des scores : {max_diff})")
+            logging.info(f"Backend {backend_name} chargé, écart maximal avec Keras : {max_diff}")
+            return backend
+        except BackendUnavailableError as e:
+            # Limite connue de l'environnement : pas d'alerte à chaque chargement de modèle
+            logging.warning(f"Backend {backend_name} indisponible, utilisation de Keras : {e}")
+            return keras_backend
+        except Exception as e:
+            logging.error(f"Impossible d'utiliser le backend {backend_name}, utilisation de Keras : {e}")
+            alert_system.send_alert(
+                subject="Erreur lors de l'inférence",
+                message=f"Impossible d'utiliser le backend {backend_name}, utilisation de Keras : {e}",
+            )
+            return keras_backend
+
     def configure_gpu(self):
         try:
             # Si un GPU est présent, on configure l'utilisation dynamique de la mémoire
@@ -109,28 +267,88 @@ class predictClass:
                 message=f"Erreur lors de la configuration du GPU : {e}",
             )
 
+    def preprocess(self, source):
+        """
+        Charge une image (chemin, contenu en octets ou tableau uint8 déjà décodé)
+        et effectue le preprocessing pour EfficientNet
+        """
+        if isinstance(source, np.ndarray):
+            # Image déjà décodée par le client : seule la conversion en float32 reste à faire
+            if source.shape != self.img_size + (3,):
+                raise ValueError(f"Forme {source.shape} invalide, attendue : {self.img_size + (3,)}")
+            return preprocess_input(source.astype(np.float32))
+        if isinstance(source, str):
+            with metrics.timer("file_read", self.run_id):
+                with open(source, "rb") as file:
+                    source = file.read()
+        with metrics.timer("decode", self.run_id):
+            img_array = self.decoder.decode(source)
+        with metrics.timer("preprocess", self.run_id):
+            return preprocess_input(img_array)
+
+    def top_classes(self, prediction, k=3):
+        """
+        Renvoie les labels et scores des k meilleures classes d'une prédiction
+        """
+        # On récupère la liste des index des k meilleures classes
+        meilleures_classes_index = np.flip(np.argsort(prediction)[-k:])
+        # On récupère la liste des k meilleurs scores
+        meilleurs_scores = prediction[meilleures_classes_index]
+        # On récupère les labels des classes
+        meilleures_classes = [self.class_names[str(index)] for index in meilleures_classes_index]
+        return meilleures_classes, meilleurs_scores
+
+    def predict_batch_staged(self, images):
+        """
+        Effectue une seule passe du modèle sur un batch d'images déjà prétraitées
+        et renvoie les 3 meilleures classes et scores de chaque image, ainsi que l'étage
+        qui a répondu ("cascade" pour le petit modèle, "full" pour le modèle complet)
+        """
+        try:
+            # On empile les images pour ne lancer qu'une prédiction
+            batch = np.stack(images, axis=0)
+            metrics.observe_batch(len(images), self.run_id)
+            stages = np.full(len(images), "full", dtype=object)
+            if self.cascade_backend is not None:
+                # Le petit modèle répond en premier sur tout le batch
+                with metrics.timer("forward_cascade", self.run_id):
+                    predictions = np.array(self.cascade_backend.predict(batch))
+                stages[:] = "cascade"
+                # Seules les images dont il n'est pas assez sûr passent par le modèle complet
+                escalated = np.flatnonzero(predictions.max(axis=1) < cascade_threshold)
+                if escalated.size:
+                    with metrics.timer("forward", self.run_id):
+                        predictions[escalated] = self.backend.predict(batch[escalated])
+                    stages[escalated] = "full"
+            else:
+                with metrics.timer("forward", self.run_id):
+                    predictions = self.backend.predict(batch)
+            for stage in ("cascade", "full"):
+                count = int(np.count_nonzero(stages == stage))
+                if count:
+                    metrics.increment(f"stage_{stage}", self.run_id, count)
+            with metrics.timer("postprocess", self.run_id):
+                return [self.top_classes(prediction) + (stage,) for prediction, stage in zip(predictions, stages)]
+        except Exception as e:
+            logging.error(f"Erreur lors de la prédiction : {str(e)}")
+            alert_system.send_alert(
+                subject="Erreur lors de l'inférence",
+                message=f"Erreur lors de la prédiction : {str(e)}",
+            )
+            raise
+
+    def predict_batch(self, images):
+        """
+        Effectue une seule passe du modèle sur un batch d'images déjà prétraitées
+        et renvoie les 3 meilleures classes et scores de chaque image
+        """
+        return [(classes, scores) for classes, scores, _ in self.predict_batch_staged(images)]
+
     def predict(self, image_path):
 
         try:
             # On charge l'image et on effectue le preprocessing pour EfficientNet
-            img = image.load_img(image_path, target_size=self.img_size)
-            img_array = image.img_to_array(img)
-            img_array_expanded_dims = np.expand_dims(img_array, axis=0)
-            img_ready = preprocess_input(img_array_expanded_dims)
-
-            # On lance la prédiction sur l'image
-            prediction = self.model.predict(img_ready)
-
-            # On récupère la liste des 3 meilleurs scores
-            meilleurs_scores = np.flip(np.sort(prediction[0])[-3:])
-            # On récupère la liste des index des 3 meilleures classes
-            meilleures_classes_index = np.flip(np.argsort(prediction[0])[-3:])
-            meilleures_classes = []
-            # On récupère les labels des classes
-            for index in meilleures_classes_index:
-                meilleures_classes.append(self.class_names[str(index)])
-            logging.info("Prédiction effectuée avec succès.")
-            return meilleures_classes, meilleurs_scores
+            img_ready = self.preprocess(image_path)
         except Exception as e:
             logging.error(f"Erreur lors de la prédiction : {str(e)}")
             alert_system.send_alert(
@@ -139,23 +357,504 @@ class predictClass:
             )
             raise
 
+        # On lance la prédiction sur l'image
+        meilleures_classes, meilleurs_scores = self.predict_batch([img_ready])[0]
+        logging.info("Prédiction effectuée avec succès.")
+        return meilleures_classes, meilleurs_scores
+
+    def get_embedding_model(self):
+        """
+        Renvoie le modèle qui calcule les scores et l'embedding (entrée de la dernière couche Dense, 640 dimensions)
+        """
+        with self._embedding_lock:
+            if self.embedding_model is None:
+                if self.model is None:
+                    raise ValueError("Les embeddings ne sont pas disponibles lorsque les poids sont partagés")
+                self.embedding_model = Model(
+                    inputs=self.model.input, outputs=[self.model.output, self.model.layers[-1].input]
+                )
+            return self.embedding_model
+
+    def predict_with_embeddings(self, images):
+        """
+        Effectue une passe du modèle sur un batch d'images prétraitées
+        et renvoie les scores et les embeddings de chaque image
+        """
+        with metrics.timer("forward_embedding", self.run_id):
+            predictions, embeddings = self.get_embedding_model().predict_on_batch(np.stack(images, axis=0))
+        return np.asarray(predictions), np.asarray(embeddings)
+
+    def embed_files(self, paths):
+        """
+        Renvoie les embeddings d'une liste d'images sur le disque
+        """
+        return self.predict_with_embeddings([self.preprocess(path) for path in paths])[1]
 
-def load_classifier(run_id):
+    def warm_up(self, batch_sizes, image_path="./load_image.jpg"):
+        """
+        Exécute chaque chemin de l'inférence une première fois (décodage des octets, tableau uint8,
+        passe du modèle pour chaque taille de batch) afin que les premières requêtes ne paient
+        ni la compilation ni l'allocation des graphes. Renvoie la durée de chaque étape.
+        """
+        durations = {}
+        with open(image_path, "rb") as file:
+            content = file.read()
+        start_time = time.perf_counter()
+        img_ready = self.preprocess(content)
+        durations["preprocess_bytes"] = time.perf_counter() - start_time
+        start_time = time.perf_counter()
+        self.preprocess(self.decoder.decode_uint8(content))
+        durations["preprocess_uint8"] = time.perf_counter() - start_time
+
+        backends = [("full", self.backend)]
+        if self.cascade_backend is not None:
+            backends.append(("cascade", self.cascade_backend))
+        for batch_size in batch_sizes:
+            batch = np.repeat(img_ready[np.newaxis], batch_size, axis=0).astype(np.float32)
+            for stage, backend in backends:
+                start_time = time.perf_counter()
+                backend.predict(batch)
+                durations[f"{stage}_{backend.name}_batch{batch_size}_float32"] = time.perf_counter() - start_time
+        logging.info(f"Préchauffage du modèle {self.run_id} terminé : {durations}")
+        return durations
+
+
+def get_model_path(run_id):
     """
-    Permet de charger le modèle en entier pour accélerer les inférences suivantes
+    Renvoie le dossier des artefacts du modèle d'un run
     """
-    # On attends que le chemin vers le dossier du modèle existe
-    model_path = os.path.join(
+    return os.path.join(
         volume_path, f"mlruns/157975935045122495/{run_id}/artifacts/model/"
     )
+
+
+def get_run_backend(model_path):
+    """
+    Renvoie le backend demandé pour un run (fichier backend.txt dans ses artefacts), ou celui par défaut
+    """
+    backend_path = os.path.join(model_path, "backend.txt")
+    if os.path.exists(backend_path):
+        with open(backend_path, "r") as file:
+            return file.read().strip()
+    return default_backend
+
+
+def get_warmup_batch_sizes():
+    """
+    Renvoie les tailles de batch à préchauffer : INFERENCE_WARMUP_BATCH_SIZES,
+    sinon les puissances de 2 jusqu'à la taille maximale des batchs, et cette taille maximale
+    """
+    if warmup_batch_sizes:
+        return sorted({int(size) for size in warmup_batch_sizes.split(",")})
+    sizes = {max_batch_size}
+    size = 1
+    while size < max_batch_size:
+        sizes.add(size)
+        size *= 2
+    return sorted(sizes)
+
+
+def warm_up_classifier(classifier):
+    """
+    Préchauffe un modèle pour toutes les tailles de batch et enregistre les durées
+    """
+    durations = classifier.warm_up(get_warmup_batch_sizes())
+    metrics.set_warmup_times(classifier.run_id, durations)
+
+
+def load_classifier(run_id, warm_up=True):
+    """
+    Permet de charger le modèle en entier pour accélerer les inférences suivantes
+    """
+    model_path = get_model_path(run_id)
+    start_time = time.perf_counter()
     # On instancie de classifier
-    classifier = predictClass(model_path=model_path)
-    # On fais la prédiction d'une image pour charger le modèle
-    # et accélérer les prochaines inférences
-    classifier.predict("./load_image.jpg")
+    classifier = predictClass(model_path=model_path, run_id=run_id)
+    # On exécute le modèle pour chaque taille de batch pour accélerer les prochaines inférences
+    if warm_up:
+        warm_up_classifier(classifier)
+    metrics.set_model_load_time(run_id, time.perf_counter() - start_time)
     return classifier
 
 
+def get_embedding_index(run_id):
+    """
+    Renvoie l'index des embeddings d'un modèle (un index par run, les embeddings dépendant des poids)
+    """
+    with embedding_indexes_lock:
+        if run_id not in embedding_indexes:
+            embedding_indexes[run_id] = EmbeddingIndex(os.path.join(embedding_index_folder, run_id))
+        return embedding_indexes[run_id]
+
+
+def list_train_images(current_classifier):
+    """
+    Liste les images d'entraînement sous la forme (chemin relatif, chemin complet, index de la classe)
+    """
+    images = []
+    with os.scandir(train_images_path) as class_folders:
+        for class_folder in class_folders:
+            if not class_folder.is_dir() or class_folder.name not in current_classifier.class_indices:
+                continue
+            label = current_classifier.class_indices[class_folder.name]
+            with os.scandir(class_folder.path) as entries:
+                for entry in entries:
+                    if entry.is_file():
+                        images.append((f"{class_folder.name}/{entry.name}", entry.path, label))
+    return sorted(images)
+
+
+def refresh_embedding_index(current_classifier):
+    """
+    Complète l'index des embeddings d'un modèle avec les images d'entraînement qui n'y sont pas encore
+    """
+    try:
+        index = get_embedding_index(current_classifier.run_id)
+        start_time = time.perf_counter()
+        added = index.update(list_train_images(current_classifier), current_classifier.embed_files)
+        if added is None:
+            logging.info(f"Index des embeddings du modèle {current_classifier.run_id} déjà en cours de mise à jour")
+            return
+        logging.info(
+            f"Index des embeddings du modèle {current_classifier.run_id} : {added} images ajoutées "
+            f"en {time.perf_counter() - start_time:.1f}s ({len(index)} au total)"
+        )
+    except Exception as e:
+        logging.error(f"Erreur lors de la mise à jour de l'index des embeddings : {e}")
+
+
+def start_embedding_index_refresh(current_classifier):
+    """
+    Lance la mise à jour de l'index dans un thread, une seule à la fois par modèle
+    (EmbeddingIndex.update ne fait rien si une autre mise à jour a commencé entre-temps)
+    """
+    if get_embedding_index(current_classifier.run_id).updating:
+        return False
+    threading.Thread(
+        target=refresh_embedding_index, args=(current_classifier,), name="embedding-index", daemon=True
+    ).start()
+    return True
+
+
+def validate_classifier(candidate):
+    """
+    Vérifie qu'un modèle candidat fonctionne avant de le mettre en production.
+    Les images de référence sont rangées par espèce dans le dossier golden_images,
+    le modèle doit retrouver l'espèce dans son top 3 pour une part suffisante d'entre elles.
+    """
+    # On vérifie que les sorties du modèle sont cohérentes avec ses classes
+    prediction = candidate.backend.predict(
+        np.expand_dims(candidate.preprocess("./load_image.jpg"), axis=0)
+    )[0]
+    if prediction.shape[0] != len(candidate.class_names):
+        raise ValueError(
+            f"Le modèle renvoie {prediction.shape[0]} scores pour {len(candidate.class_names)} classes"
+        )
+    if not np.all(np.isfinite(prediction)) or not np.isclose(prediction.sum(), 1, atol=1e-3):
+        raise ValueError("Les scores renvoyés par le modèle ne forment pas une distribution de probabilités")
+
+    # Sans images de référence, on se contente de ces vérifications
+    if not os.path.isdir(golden_images_path):
+        logging.warning("Aucune image de référence trouvée, validation limitée du modèle.")
+        return
+
+    # On prédit les images de référence par batchs d'une espèce
+    total, correct = 0, 0
+    for classe in sorted(os.listdir(golden_images_path)):
+        class_path = os.path.join(golden_images_path, classe)
+        if not os.path.isdir(class_path):
+            continue
+        images = [candidate.preprocess(os.path.join(class_path, name)) for name in sorted(os.listdir(class_path))]
+        if not images:
+            continue
+        for meilleures_classes, _ in candidate.predict_batch(images):
+            total += 1
+            correct += classe in meilleures_classes
+
+    if total and correct / total < golden_min_accuracy:
+        raise ValueError(
+            f"Précision top-3 de {correct}/{total} sur les images de référence, "
+            f"inférieure au minimum requis ({golden_min_accuracy})"
+        )
+    logging.info(f"Modèle {candidate.run_id} validé sur {total} images de référence ({correct} correctes).")
+
+
+def swap_classifier(new_classifier):
+    """
+    Remplace atomiquement le modèle en production et garde l'ancien en mémoire pour un retour arrière
+    """
+    global classifier, previous_classifier, run_id
+    with swap_lock:
+        # Les requêtes déjà acceptées terminent sur l'ancien modèle,
+        # les suivantes utilisent directement le nouveau
+        previous_classifier = classifier
+        classifier = new_classifier
+        run_id = new_classifier.run_id
+        # Si le modèle promu était en canary ou en shadow, on arrête de lui envoyer du trafic
+        promoted_secondary = secondary_classifier is not None and secondary_classifier.run_id == run_id
+        if promoted_secondary:
+            set_traffic("off")
+    # Le nouveau modèle est épinglé avant d'être ajouté au pool, pour que ce soit l'ancien modèle non épinglé
+    # qui soit retiré de la mémoire
+    pin_models()
+    model_pool.add(new_classifier)
+    # Les prédictions en cache ne correspondent plus au modèle en production
+    prediction_cache.invalidate()
+    if embedding_index_enabled and worker_id in (None, "0"):
+        start_embedding_index_refresh(new_classifier)
+    # On n'enregistre l'identifiant du modèle qu'une fois le changement effectué
+    with open(prod_model_id_path, "w") as file:
+        file.write(run_id)
+    if promoted_secondary:
+        save_traffic_config()
+
+
+def deploy_model(new_run_id, notify=True, alert=True):
+    """
+    Charge, préchauffe et valide un nouveau modèle en arrière-plan avant de le mettre en production.
+    Cette fonction est lancée comme tâche de fond et s'exécute donc hors de la boucle d'événements.
+    notify vaut False lorsqu'un processus de travail suit un changement déjà annoncé par un autre,
+    alert vaut False lorsqu'il retente un changement dont l'échec a déjà été signalé.
+    """
+    global switch_status
+    try:
+        switch_status = {"state": "loading", "run_id": new_run_id}
+        # Si le modèle est déjà en mémoire (canary, shadow, ancien modèle), il n'est pas rechargé
+        candidate = model_pool.get(new_run_id)
+        switch_status = {"state": "validating", "run_id": new_run_id}
+        validate_classifier(candidate)
+        swap_classifier(candidate)
+        switch_status = {"state": "done", "run_id": new_run_id}
+        logging.info("Changement de modèle effectué !")
+        if notify:
+            alert_system.send_alert(
+                subject="Changement de modèle effectué",
+                message=f"Le nouveau modèle utilisé provient maintenant du run id suivant : {new_run_id}",
+            )
+    except Exception as e:
+        switch_status = {"state": "failed", "run_id": new_run_id, "error": str(e)}
+        logging.error(f"Le changement de modèle n'a pas fonctionné : {e}")
+        if alert:
+            alert_system.send_alert(
+                subject="Erreur lors de l'inférence",
+                message=f"Le changement de modèle n'a pas fonctionné : {e}",
+            )
+
+
+def log_prediction(current_classifier, file_name, meilleures_classes, meilleurs_scores, role="production"):
+    """
+    Ajoute une prédiction à l'historique des inférences (écrit en arrière-plan)
+    """
+    with metrics.timer("logging", current_classifier.run_id):
+        history_writer.write(
+            current_classifier.run_id,
+            file_name,
+            [current_classifier.class_indices[classe] for classe in meilleures_classes],
+            meilleurs_scores,
+            role=role,
+        )
+
+
+def run_batch(items):
+    """
+    Exécute un batch du micro-batcher. Chaque entrée contient le modèle qui doit la prédire
+    (production ou canary), les images sont donc regroupées par modèle.
+    """
+    results = [None] * len(items)
+    groups = {}
+    for position, (model, _) in enumerate(items):
+        groups.setdefault(id(model), (model, []))[1].append(position)
+    for model, positions in groups.values():
+        predictions = model.predict_batch_staged([items[position][1] for position in positions])
+        for position, result in zip(positions, predictions):
+            results[position] = result
+    return results
+
+
+def pin_models():
+    """
+    Empêche le retrait du pool des modèles en production, précédent et en canary/shadow
+    """
+    model_pool.pin(
+        classifier.run_id,
+        previous_classifier.run_id if previous_classifier else None,
+        secondary_classifier.run_id if secondary_classifier else None,
+    )
+
+
+def set_traffic(mode, secondary=None, percentage=0.0):
+    """
+    Configure l'envoi d'une partie (canary) ou d'une copie (shadow) du trafic vers un second modèle
+    """
+    global secondary_classifier
+    secondary_classifier = secondary if mode != "off" else None
+    traffic.update({
+        "mode": mode,
+        "run_id": secondary_classifier.run_id if secondary_classifier else None,
+        "percentage": percentage if mode == "canary" else 0.0,
+    })
+
+
+def save_traffic_config():
+    """
+    Enregistre la répartition du trafic à côté de prod_model_id.txt, pour que les autres processus la suivent
+    """
+    # Écriture atomique : un processus ne lit jamais un fichier à moitié écrit
+    temp_path = f"{traffic_config_path}.{os.getpid()}.tmp"
+    with open(temp_path, "w") as file:
+        json.dump({key: traffic[key] for key in ("mode", "run_id", "percentage")}, file)
+    os.replace(temp_path, traffic_config_path)
+
+
+def load_traffic_config():
+    """
+    Renvoie la répartition du trafic enregistrée, ou None si elle n'a jamais été configurée
+    """
+    if not os.path.exists(traffic_config_path):
+        return None
+    with open(traffic_config_path, "r") as file:
+        return json.load(file)
+
+
+def configure_traffic(mode, new_run_id, percentage, persist=True, alert=True):
+    """
+    Charge le second modèle si nécessaire puis active le canary ou le shadow.
+    Cette fonction est lancée comme tâche de fond et s'exécute donc hors de la boucle d'événements.
+    persist vaut False lorsqu'un processus de travail suit une répartition déjà enregistrée par un autre,
+    alert vaut False lorsqu'il retente une activation dont l'échec a déjà été signalé.
+    """
+    try:
+        traffic["state"] = "loading"
+        secondary = model_pool.get(new_run_id)
+        set_traffic(mode, secondary, percentage)
+        pin_models()
+        traffic["state"] = "ready"
+        if persist:
+            save_traffic_config()
+        logging.info(f"Trafic {mode} activé vers le modèle {new_run_id} ({percentage}%)")
+    except Exception as e:
+        traffic["state"] = "failed"
+        logging.error(f"Impossible d'activer le trafic {mode} vers le modèle {new_run_id} : {e}")
+        if alert:
+            alert_system.send_alert(
+                subject="Erreur lors de l'inférence",
+                message=f"Impossible d'activer le trafic {mode} vers le modèle {new_run_id} : {e}",
+            )
+
+
+def choose_classifier():
+    """
+    Renvoie le modèle qui doit répondre à la requête et son rôle
+    """
+    secondary = secondary_classifier
+    if traffic["mode"] == "canary" and secondary is not None and random.random() * 100 < traffic["percentage"]:
+        return secondary, "canary"
+    return classifier, "production"
+
+
+def shadow_predict(shadow_classifier, source, img_ready, file_name, meilleures_classes):
+    """
+    Prédit une copie de la requête avec le modèle en shadow et enregistre le résultat
+    dans l'historique à côté de celui du modèle en production
+    """
+    try:
+        cached = prediction_cache.get(file_name, shadow_classifier.run_id)
+        if cached is not None:
+            shadow_classes, shadow_scores = cached[0], np.asarray(cached[1], dtype=np.float32)
+        else:
+            if img_ready is None:
+                img_ready = shadow_classifier.preprocess(source)
+            shadow_classes, shadow_scores = shadow_classifier.predict_batch([img_ready])[0]
+            prediction_cache.put(file_name, shadow_classifier.run_id, shadow_classes, shadow_scores)
+        log_prediction(shadow_classifier, file_name, shadow_classes, shadow_scores, role="shadow")
+        with shadow_lock:
+            shadow_stats["predictions"] += 1
+            shadow_stats["top1_agreement"] += shadow_classes[0] == meilleures_classes[0]
+    except Exception as e:
+        with shadow_lock:
+            shadow_stats["errors"] += 1
+        logging.error(f"Erreur lors de la prédiction en shadow : {e}")
+
+
+def start_shadow(source, img_ready, file_name, meilleures_classes):
+    """
+    Lance la prédiction en shadow hors du chemin critique de la requête
+    """
+    shadow_classifier = secondary_classifier
+    if traffic["mode"] != "shadow" or shadow_classifier is None:
+        return
+    try:
+        executor.submit(shadow_predict, shadow_classifier, source, img_ready, file_name, meilleures_classes)
+    except ExecutorFullError:
+        # La copie du trafic n'est pas prioritaire, on l'abandonne si l'exécuteur est saturé
+        with shadow_lock:
+            shadow_stats["dropped"] += 1
+
+
+def check_latency():
+    """
+    Envoie une alerte si la latence des dernières inférences dépasse le seuil
+    """
+    percentiles = slow_inference_detector.check()
+    if percentiles is None:
+        return
+    logging.error(f"Lenteur détectée pour l'inférence : {percentiles}")
+    # L'envoi de l'email se fait dans un thread pour ne pas bloquer la requête
+    threading.Thread(
+        target=alert_system.send_alert,
+        kwargs={
+            "subject": "Lenteur du container d'inférence",
+            "message": f"""Sur les {percentiles['samples']} dernières inférences, le p{latency_percentile} de latence
+            dépasse {latency_threshold} seconde(s) (p50 : {percentiles['p50']:.3f}s,
+            p95 : {percentiles['p95']:.3f}s, p99 : {percentiles['p99']:.3f}s).
+            Il y a un problème de performance, merci de vous reporter à la route /metrics et aux logs.""",
+        },
+        daemon=True,
+    ).start()
+
+
+def predict_chunk(current_classifier, file_names):
+    """
+    Prédit un groupe d'images en une seule passe du modèle et renvoie les résultats dans l'ordre.
+    Une image illisible ne fait pas échouer les autres, son résultat contient l'erreur.
+    """
+    results = [None] * len(file_names)
+    images, positions = [], []
+    for position, file_name in enumerate(file_names):
+        # On cherche d'abord la prédiction en cache
+        cached = prediction_cache.get(file_name, current_classifier.run_id)
+        if cached is not None:
+            results[position] = (cached[0], np.asarray(cached[1], dtype=np.float32), "cache")
+            continue
+        try:
+            images.append(current_classifier.preprocess(os.path.join(temp_folder, file_name)))
+            positions.append(position)
+        except Exception as e:
+            logging.error(f"Erreur lors du chargement de l'image {file_name} : {e}")
+            results[position] = e
+
+    # On prédit toutes les images absentes du cache en une seule fois
+    if images:
+        for position, result in zip(positions, current_classifier.predict_batch_staged(images)):
+            results[position] = result
+            prediction_cache.put(file_names[position], current_classifier.run_id, *result[:2])
+
+    responses = []
+    for file_name, result in zip(file_names, results):
+        if isinstance(result, Exception):
+            responses.append({"filename": file_name, "error": str(result)})
+            continue
+        meilleures_classes, meilleurs_scores, stage = result
+        log_prediction(current_classifier, file_name, meilleures_classes, meilleurs_scores)
+        responses.append({
+            "predictions": meilleures_classes,
+            "scores": meilleurs_scores.tolist(),
+            "filename": file_name,
+            "stage": stage,
+        })
+    return responses
+
+
 # ----------------------------------------------------------------------------------------- #
 
 
@@ -166,67 +865,329 @@ while not os.path.exists(prod_model_id_path):
 with open(prod_model_id_path, "r") as file:
     run_id = file.read()
 
-# On charge le classifier pour ne pas le charger à chaque inférence
-classifier = load_classifier(run_id)
+# On cherche le profil de réglage CPU de cette machine, et on le calcule si demandé.
+# Le profil doit avoir été mesuré avec le backend qui servira le modèle (tflite si les poids sont partagés)
+tuning_profile = load_profile(tuning_profile_path)
+serving_backend = "tflite" if shared_weights else get_run_backend(get_model_path(run_id))
+profile_outdated = tuning_profile is None or not profile_matches_backend(
+    tuning_profile, serving_backend, shared_weights
+)
+# En mode multi-processus, seul le premier processus lance la recherche
+if worker_id in (None, "0") and (autotune_mode == "force" or (autotune_mode == "1" and profile_outdated)):
+    logging.info(f"Recherche de la meilleure configuration CPU pour l'inférence (backend {serving_backend})...")
+    tuning_profile, _ = autotune(
+        get_model_path(run_id),
+        latency_budget=latency_threshold,
+        profile_path=tuning_profile_path,
+        backend=serving_backend,
+        shared_weights=shared_weights,
+    )
+elif tuning_profile is not None and profile_outdated:
+    logging.warning(
+        f"Profil d'inférence mesuré avec le backend {tuning_profile.get('backend', 'keras')} "
+        f"et non {serving_backend} : relancer la recherche (INFERENCE_AUTOTUNE=force)"
+    )
+# Le profil est appliqué avant le chargement du modèle, les variables d'environnement restant prioritaires
+if tuning_profile is not None:
+    apply_threading(tuning_profile["intra_op_threads"], tuning_profile["inter_op_threads"])
+    if "INFERENCE_MAX_BATCH_SIZE" not in os.environ:
+        max_batch_size = int(tuning_profile["batch_size"])
+    if backend_num_threads is None:
+        backend_num_threads = int(tuning_profile["intra_op_threads"])
+    logging.info(f"Profil d'inférence appliqué : {tuning_profile}")
+
+# On charge le classifier pour ne pas le charger à chaque inférence.
+# Le préchauffage est fait en arrière-plan : le serveur répond sur / pendant ce temps,
+# mais /ready renvoie une erreur 503 tant qu'il n'est pas terminé
+classifier = load_classifier(run_id, warm_up=False)
+ready = threading.Event()
+
+
+def warm_up_startup_classifier(startup_classifier):
+    try:
+        warm_up_classifier(startup_classifier)
+        ready.set()
+        # En mode multi-processus, seul le premier processus construit l'index
+        if embedding_index_enabled and worker_id in (None, "0"):
+            start_embedding_index_refresh(startup_classifier)
+    except Exception as e:
+        logging.error(f"Erreur lors du préchauffage du modèle : {e}")
+        alert_system.send_alert(
+            subject="Erreur lors de l'inférence",
+            message=f"Erreur lors du préchauffage du modèle : {e}",
+        )
+
+
+threading.Thread(target=warm_up_startup_classifier, args=(classifier,), name="warm-up", daemon=True).start()
+# L'ancien modèle reste en mémoire après un changement pour pouvoir revenir en arrière
+previous_classifier = None
+swap_lock = threading.Lock()
+# État du dernier changement de modèle
+switch_status = {"state": "idle", "run_id": run_id}
+
+# Les modèles sont gardés en mémoire dans un pool pour le canary, le shadow et le retour arrière
+model_pool = ModelPool(load_classifier, max_models=max_resident_models, memory_budget_mb=model_memory_budget_mb)
+model_pool.add(classifier)
+model_pool.pin(run_id)
+# Second modèle recevant une partie (canary) ou une copie (shadow) du trafic
+secondary_classifier = None
+traffic = {"mode": "off", "run_id": None, "percentage": 0.0, "state": "idle"}
+shadow_lock = threading.Lock()
+shadow_stats = {"predictions": 0, "top1_agreement": 0, "dropped": 0, "errors": 0}
+
+# Les requêtes concurrentes sont regroupées pour n'effectuer qu'une passe du modèle
+batcher = MicroBatcher(
+    run_batch,
+    max_batch_size=max_batch_size,
+    max_wait_ms=max_batch_wait_ms,
+    max_queue_size=max_queue_size,
+    queue_time_fn=lambda item, queue_time: metrics.observe("queue", queue_time, item[0].run_id),
+)
+
+# Les requêtes sont refusées dès l'entrée si trop sont en cours ou si leur échéance ne peut pas être tenue
+admission = AdmissionController(max_pending=max_pending_requests)
+
+# Les tâches bloquantes sont exécutées hors de la boucle d'événements de FastAPI
+executor = BoundedExecutor(max_workers=executor_workers, max_pending=executor_max_pending)
+
+# L'historique des inférences est écrit par lots en arrière-plan
+history_writer = InferenceHistoryWriter(
+    hist_inferences_dir,
+    flush_interval=history_flush_interval,
+    flush_size=history_flush_size,
+    max_file_size=history_max_file_size,
+    prefix="inferences" if worker_id is None else f"inferences_worker{worker_id}",
+)
+
+# Les requêtes simultanées pour la même image et le même modèle partagent une seule prédiction
+single_flight = SingleFlight()
+
+# Index des embeddings des images d'entraînement, par run_id
+embedding_indexes = {}
+embedding_indexes_lock = threading.Lock()
+
+# Les prédictions sont gardées en cache, indexées par le hash de l'image et le run_id du modèle
+prediction_cache = PredictionCache(max_entries=cache_max_entries, ttl=cache_ttl, persist_path=cache_path)
+
+
+def worker_stats():
+    """
+    Renvoie les métriques de ce processus de travail
+    """
+    return {
+        "worker_id": worker_id,
+        "pid": os.getpid(),
+        "prod_run_id": classifier.run_id,
+        "backend": classifier.backend.name,
+        "memory_mb": memory_usage(),
+        "updated_at": time.time(),
+        **metrics.snapshot(),
+        "batcher": batcher.stats(),
+        "executor": executor.stats(),
+    }
+
+
+def sync_worker():
+    """
+    En mode multi-processus, publie régulièrement les métriques du processus et suit les changements
+    de modèle et de répartition du trafic effectués par les autres processus
+    (les routes /switchmodel et /traffic n'atteignent qu'un seul d'entre eux).
+    Un changement qui échoue est retenté de plus en plus rarement, et n'est signalé par email qu'une fois.
+    """
+    while True:
+        time.sleep(worker_sync_interval)
+        try:
+            publish_stats(worker_id, worker_stats())
+            with open(prod_model_id_path, "r") as file:
+                prod_run_id = file.read()
+            if (
+                prod_run_id
+                and prod_run_id != classifier.run_id
+                and switch_status["state"] not in ("loading", "validating")
+                and deploy_backoff.ready(prod_run_id)
+            ):
+                logging.info(f"Processus {worker_id} : passage au modèle en production {prod_run_id}")
+                deploy_model(prod_run_id, notify=False, alert=deploy_backoff.target != prod_run_id)
+                if classifier.run_id == prod_run_id:
+                    deploy_backoff.succeeded()
+                else:
+                    deploy_backoff.failed(prod_run_id)
+            sync_traffic()
+        except Exception as e:
+            logging.error(f"Erreur lors de la synchronisation du processus {worker_id} : {e}")
+
+
+def sync_traffic():
+    """
+    Applique la répartition du trafic enregistrée par un autre processus si elle diffère de celle du processus
+    """
+    config = load_traffic_config()
+    if config is None or traffic["state"] == "loading":
+        return
+    target = (config["mode"], config["run_id"], config["percentage"])
+    if target == (traffic["mode"], traffic["run_id"], traffic["percentage"]) or not traffic_backoff.ready(target):
+        return
+    logging.info(f"Processus {worker_id} : passage au trafic {config['mode']} ({config['run_id']})")
+    if config["mode"] == "off":
+        set_traffic("off")
+        pin_models()
+        traffic_backoff.succeeded()
+        return
+    configure_traffic(*target, persist=False, alert=traffic_backoff.target != target)
+    if traffic["state"] == "failed":
+        traffic_backoff.failed(target)
+    else:
+        traffic_backoff.succeeded()
+
+
+# Les changements de modèle et de trafic qui échouent sont retentés de plus en plus rarement
+deploy_backoff = RetryBackoff(worker_sync_interval)
+traffic_backoff = RetryBackoff(worker_sync_interval)
+
+
+if worker_id is not None:
+    threading.Thread(target=sync_worker, name="worker-sync", daemon=True).start()
+
+
+async def grpc_predict(content, file_name, deadline):
+    """
+    Prédiction demandée via l'interface gRPC, avec le même traitement que la route /predict_bytes
+    """
+    if not file_name:
+        file_name = hashlib.sha256(content).hexdigest() + ".jpg"
+    return await serve_prediction(content, file_name, deadline)
+
+
+grpc_server = None
+
+
+@app.on_event("startup")
+async def start_grpc_server():
+    global grpc_server
+    if grpc_port:
+        grpc_server = create_server(
+            grpc_predict,
+            grpc_port,
+            lambda remaining: time.monotonic() + remaining if remaining is not None else None,
+            max_in_flight=batcher.max_batch_size,
+        )
+        await grpc_server.start()
+
+
+@app.on_event("shutdown")
+async def stop_grpc_server():
+    if grpc_server is not None:
+        await grpc_server.stop(grace=5)
+
+
+@app.on_event("shutdown")
+def shutdown():
+    prediction_cache.save()
+    history_writer.close()
 
 
 # ----------------------------------------------------------------------------------------- #
 
 
+# Vérifie que le serveur est en vie (liveness)
 @app.get("/")
 def read_root():
     return {"Status": "OK"}
 
 
-# Cette route permet d'effectuer une prédiction sur une image
-@app.get("/predict")
-async def predict(file_name: str):
+# Vérifie que le modèle est chargé et préchauffé, avant d'envoyer du trafic au container (readiness)
+@app.get("/ready")
+def read_ready():
+    if not ready.is_set():
+        raise HTTPException(status_code=503, detail="Le modèle est en cours de préchauffage.")
+    return {"Status": "Ready", "run_id": classifier.run_id}
+
+
+async def compute_prediction(current_classifier, source, file_name, deadline=None):
+    """
+    Décode une image (chemin, octets ou tableau uint8), la prédit dans le prochain batch et met le résultat en cache
+    """
+    # On charge l'image et on effectue le preprocessing hors de la boucle d'événements
+    img_ready = await executor.run(current_classifier.preprocess, source)
+    # On ajoute l'image au prochain batch et on attend son résultat
+    future = batcher.submit((current_classifier, img_ready), deadline=deadline)
+    meilleures_classes, meilleurs_scores, stage = await asyncio.wrap_future(future)
+    prediction_cache.put(file_name, current_classifier.run_id, meilleures_classes, meilleurs_scores)
+    return meilleures_classes, meilleurs_scores, stage, img_ready
+
+
+def reject(status_code, detail, retry_after, counter, run_id):
+    """
+    Renvoie l'erreur d'une requête refusée faute de capacité, avec le délai conseillé avant de réessayer
+    """
+    metrics.increment(counter, run_id)
+    logging.warning(f"Requête refusée : {detail}")
+    return HTTPException(status_code=status_code, detail=detail, headers={"Retry-After": str(retry_after)})
+
+
+async def serve_prediction(source, file_name, deadline=None):
+    """
+    Prédit une image (chemin sur le volume, octets ou tableau uint8) avec le modèle en production ou en canary.
+    deadline est l'échéance de la requête en temps monotone, ou None
+    """
+    # Permet de calculer le temps d'inférence
+    start_time = time.perf_counter()
+    # On choisit le modèle qui répond (production ou canary)
+    current_classifier, role = choose_classifier()
+    try:
+        admission.admit(deadline)
+    except AdmissionRejectedError as e:
+        raise reject(503, str(e), e.retry_after, f"rejected_{e.reason}", current_classifier.run_id)
+    metrics.request_started()
+    # Seule la latence des requêtes abouties met à jour l'estimation utilisée par l'admission
+    total_time = None
     try:
-        global too_long_inference
-        # Permet de calculer le temps d'inférence
-        start_time = time.time()
-        # On récupère la bonne image dans le volume
-        image_path = os.path.join(temp_folder, file_name)
-        # On lance la prédiction
-        meilleures_classes, meilleurs_scores = classifier.predict(image_path)
+        img_ready = None
+        # Le nom de l'image est le hash de son contenu, on cherche d'abord la prédiction en cache
+        cached = prediction_cache.get(file_name, current_classifier.run_id)
+        if cached is not None:
+            meilleures_classes, scores = cached
+            meilleurs_scores = np.asarray(scores, dtype=np.float32)
+            stage = "cache"
+        else:
+            # Si la même image est déjà en cours de prédiction par ce modèle, on attend ce résultat
+            meilleures_classes, meilleurs_scores, stage, img_ready = await single_flight.do(
+                (file_name, current_classifier.run_id),
+                lambda: compute_prediction(current_classifier, source, file_name, deadline),
+            )
 
         # On enregistre la prédiction
-        with open(classifier.csv_filename, "a", newline="") as csvfile:
-            writer = csv.writer(csvfile)
-            writer.writerow(
-                [
-                    datetime.now().strftime("%d-%m-%Y %H:%M:%S"),
-                    run_id,
-                    file_name,
-                    meilleures_classes,
-                    meilleurs_scores
-                ]
-            )
+        log_prediction(current_classifier, file_name, meilleures_classes, meilleurs_scores, role=role)
+        # On envoie une copie de la requête au modèle en shadow, sans attendre son résultat
+        start_shadow(source, img_ready, file_name, meilleures_classes)
 
         # On calcule temps qui a été nécessaire
-        end_time = time.time()
-        total_time = end_time - start_time
+        total_time = time.perf_counter() - start_time
+        metrics.request_finished(total_time, current_classifier.run_id)
+        # On suit aussi la latence selon l'étage qui a répondu (cache, cascade ou modèle complet)
+        metrics.observe(f"total_{stage}", total_time, current_classifier.run_id)
         logging.info(f"Temps pour l'inférence : {total_time}")
-        if total_time > 1:
-            too_long_inference += 1
-        if too_long_inference > 3:
-            # On envoie un email pour indiquer que les 4 dernières inférences étaient trop longues
-            too_long_inference = 0
-            logging.error("Lenteur détectée pour l'inférence...")
-            alert_system.send_alert(
-                subject="Lenteur du container d'inférence",
-                message="""Les 4 dernières inférences ont pris plus de
-                                    1 seconde à s'éxectuer, il y a un problème de performance.
-                                    Merci de vous reporter aux logs.""",
-            )
+        check_latency()
 
         return {
             "predictions": meilleures_classes,
             "scores": meilleurs_scores.tolist(),
             "filename": file_name,
+            "stage": stage,
         }
 
+    except (BatcherFullError, ExecutorFullError) as e:
+        metrics.request_finished(time.perf_counter() - start_time, current_classifier.run_id, error=True)
+        raise reject(503, str(e), admission.retry_after(), "rejected_queue_full", current_classifier.run_id)
+    except DeadlineExceededError as e:
+        metrics.request_finished(time.perf_counter() - start_time, current_classifier.run_id, error=True)
+        raise reject(503, str(e), admission.retry_after(), "rejected_expired", current_classifier.run_id)
+    except ImageDecodeError as e:
+        # Erreur du client : pas d'alerte, et le disjoncteur de l'API ne la compte pas comme une panne
+        metrics.request_finished(time.perf_counter() - start_time, current_classifier.run_id, error=True)
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
+        metrics.request_finished(time.perf_counter() - start_time, current_classifier.run_id, error=True)
         logging.error(f"Un problème est survenu lors de l'inférence: {e}")
         alert_system.send_alert(
             subject="Erreur lors de l'inférence",
@@ -235,23 +1196,246 @@ async def predict(file_name: str):
         raise HTTPException(
             status_code=500, detail=f"Un problème est survenu lors de l'inférence: {e}"
         )
+    finally:
+        admission.release(total_time)
+
+
+# Cette route permet d'effectuer une prédiction sur une image enregistrée dans le volume
+# L'en-tête X-Request-Deadline (timestamp Unix en secondes, envoyé par l'API) est l'échéance de la requête
+@app.get("/predict")
+async def predict(file_name: str, request_deadline: str = Header(None, alias="X-Request-Deadline")):
+    return await serve_prediction(
+        os.path.join(temp_folder, file_name), file_name, deadline_from_header(request_deadline)
+    )
+
+
+# Cette route permet d'effectuer une prédiction sur une image envoyée dans le corps de la requête,
+# sans passer par le volume : fichier encodé (JPEG, PNG...) ou, si le paramètre shape est fourni
+# (par exemple "224,224,3"), tableau uint8 déjà décodé et redimensionné.
+# Le nom (hash du fichier) sert de clé au cache et à l'historique, il est calculé s'il n'est pas fourni
+def parse_image_body(content, shape=None):
+    """
+    Renvoie l'image contenue dans le corps d'une requête : octets du fichier encodé,
+    ou tableau uint8 déjà décodé si sa forme est indiquée
+    """
+    if not content:
+        raise HTTPException(status_code=400, detail="Le corps de la requête est vide.")
+    source = content
+    if shape:
+        try:
+            dimensions = tuple(int(dimension) for dimension in shape.split(","))
+            source = np.frombuffer(content, dtype=np.uint8).reshape(dimensions)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=f"Tableau uint8 invalide : {e}")
+        if source.shape != classifier.img_size + (3,):
+            raise HTTPException(
+                status_code=400, detail=f"Forme {source.shape} invalide, attendue : {classifier.img_size + (3,)}"
+            )
+    return source
+
+
+@app.post("/predict_bytes")
+async def predict_bytes(
+    request: Request,
+    file_name: str = None,
+    shape: str = None,
+    request_deadline: str = Header(None, alias="X-Request-Deadline"),
+):
+    content = await request.body()
+    source = parse_image_body(content, shape)
+    if not file_name:
+        file_name = hashlib.sha256(content).hexdigest() + ".jpg"
+    return await serve_prediction(source, file_name, deadline_from_header(request_deadline))
+
+
+def predict_similar(current_classifier, source, k):
+    """
+    Prédit une image et cherche, en une seule recherche dans l'index, les images d'entraînement
+    les plus proches pour chacune des 3 classes prédites
+    """
+    img_ready = current_classifier.preprocess(source)
+    predictions, embeddings = current_classifier.predict_with_embeddings([img_ready])
+    meilleures_classes, meilleurs_scores = current_classifier.top_classes(predictions[0])
+    labels = [current_classifier.class_indices[classe] for classe in meilleures_classes]
+    neighbours = get_embedding_index(current_classifier.run_id).search(embeddings[0], labels, k=k)
+    return {
+        "predictions": meilleures_classes,
+        "scores": meilleurs_scores.tolist(),
+        "similar": {
+            classe: [{"image": path, "similarity": similarity} for path, similarity in neighbours[label]]
+            for classe, label in zip(meilleures_classes, labels)
+        },
+    }
+
+
+# Cette route renvoie l'embedding (avant-dernière couche du modèle) d'une image envoyée dans le corps de la requête
+@app.post("/embedding")
+async def embedding(request: Request, shape: str = None):
+    source = parse_image_body(await request.body(), shape)
+    current_classifier = classifier
+    try:
+        img_ready = await executor.run(current_classifier.preprocess, source)
+        _, embeddings = await executor.run(current_classifier.predict_with_embeddings, [img_ready])
+    except ExecutorFullError as e:
+        raise reject(503, str(e), admission.retry_after(), "rejected_queue_full", current_classifier.run_id)
+    except ImageDecodeError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return {"run_id": current_classifier.run_id, "dim": int(embeddings.shape[1]), "embedding": embeddings[0].tolist()}
+
+
+# Cette route prédit une image envoyée dans le corps de la requête et renvoie, pour chaque classe prédite,
+# les k images d'entraînement les plus proches visuellement (chemins relatifs au dossier train)
+@app.post("/similar")
+async def similar(request: Request, k: int = 3, shape: str = None):
+    source = parse_image_body(await request.body(), shape)
+    current_classifier = classifier
+    try:
+        return await executor.run(predict_similar, current_classifier, source, max(1, min(k, 20)))
+    except ExecutorFullError as e:
+        raise reject(503, str(e), admission.retry_after(), "rejected_queue_full", current_classifier.run_id)
+    except ImageDecodeError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+
+def refresh_run_embedding_index(run_id):
+    """
+    Charge si nécessaire le modèle d'un run et complète son index des embeddings
+    """
+    try:
+        refresh_embedding_index(model_pool.get(run_id))
+    except Exception as e:
+        logging.error(f"Impossible de mettre à jour l'index des embeddings du run {run_id} : {e}")
+
+
+# Cette route complète l'index des embeddings d'un run (par défaut, le modèle en production).
+# Elle est appelée par le container d'entraînement à la fin de chaque entraînement
+@app.post("/embedding_index/refresh")
+async def embedding_index_refresh(background_tasks: BackgroundTasks, run_id: str = Body(None, embed=True)):
+    run_id = run_id or classifier.run_id
+    if get_embedding_index(run_id).updating:
+        raise HTTPException(status_code=409, detail=f"L'index du run {run_id} est déjà en cours de mise à jour.")
+    background_tasks.add_task(refresh_run_embedding_index, run_id)
+    return {"status": f"Mise à jour de l'index des embeddings du run {run_id} lancée."}
+
+
+# Cette route permet de suivre la taille et la mise à jour des index des embeddings
+@app.get("/embedding_index_stats")
+def embedding_index_stats():
+    with embedding_indexes_lock:
+        indexes = dict(embedding_indexes)
+    return {run_id: index.stats() for run_id, index in indexes.items()}
+
+
+# Cette route permet d'effectuer une prédiction sur une liste d'images.
+# Les images sont prédites par groupes et les résultats sont renvoyés au fil de l'eau
+# au format NDJSON (une ligne JSON par image), dans l'ordre de la liste
+@app.post("/predict_batch")
+async def predict_batch(file_names: List[str] = Body(...)):
+    current_classifier = classifier
+
+    async def stream_predictions():
+        for start in range(0, len(file_names), max_batch_size):
+            chunk = file_names[start:start + max_batch_size]
+            try:
+                responses = await executor.run(predict_chunk, current_classifier, chunk)
+            except Exception as e:
+                logging.error(f"Un problème est survenu lors de l'inférence par batch: {e}")
+                responses = [{"filename": file_name, "error": str(e)} for file_name in chunk]
+            for response in responses:
+                yield json.dumps(response) + "\n"
+
+    logging.info(f"Prédiction par batch de {len(file_names)} images")
+    return StreamingResponse(stream_predictions(), media_type="application/x-ndjson")
+
+
+# Cette route renvoie les métriques de performance du container
+@app.get("/metrics")
+def get_metrics():
+    return {
+        **metrics.snapshot(),
+        "batcher": batcher.stats(),
+        "executor": executor.stats(),
+        "admission": admission.stats(),
+        "cache": prediction_cache.stats(),
+        "single_flight": single_flight.stats(),
+        "tuning_profile": tuning_profile,
+        "worker": {"id": worker_id, "pid": os.getpid(), "memory_mb": memory_usage()},
+        "history": history_writer.stats(),
+    }
+
+
+# Cette route renvoie les métriques de chaque processus de travail (mode multi-processus)
+@app.get("/workers")
+def get_workers():
+    stats = read_stats()
+    if worker_id is not None:
+        # Les métriques du processus qui répond sont toujours à jour
+        stats[worker_id] = worker_stats()
+    memory = [worker.get("memory_mb", {}) for worker in stats.values()]
+    return {
+        "responding_worker": worker_id,
+        "workers": stats,
+        "total_rss_mb": sum(usage.get("rss", 0) for usage in memory),
+        "total_pss_mb": sum(usage.get("pss", 0) for usage in memory),
+    }
+
+
+# Cette route permet de suivre l'occupation des batchs pour régler le débit et la latence
+@app.get("/batcher_stats")
+def batcher_stats():
+    return batcher.stats()
+
+
+# Cette route permet de suivre l'écriture de l'historique des inférences
+@app.get("/history_stats")
+def history_stats():
+    return history_writer.stats()
+
+
+# Cette route permet de suivre l'utilisation du cache des prédictions
+@app.get("/cache_stats")
+def cache_stats():
+    return prediction_cache.stats()
+
+
+# Cette route permet de suivre les requêtes admises et refusées à l'entrée
+@app.get("/admission_stats")
+def admission_stats():
+    return admission.stats()
+
+
+# Cette route permet de suivre la file d'attente et le temps d'attente de l'exécuteur
+@app.get("/executor_stats")
+def executor_stats():
+    return executor.stats()
 
 
 @app.post("/switchmodel")
-async def switch_model(run_id: str = Body(...)):
+async def switch_model(background_tasks: BackgroundTasks, run_id: str = Body(...)):
     try:
-        global classifier
-        # On récupère le run_id et on l'enregistre
-        run_id = run_id.removeprefix("run_id=")
-        # On recharge le classifier avec le nouveau modèle
-        classifier = load_classifier(run_id)
-        with open(os.path.join(mlruns_path, "prod_model_id.txt"), "w") as file:
-            file.write(run_id)
-        logging.info("Changement de modèle effectué !")
+        # On récupère le run_id
+        new_run_id = run_id.removeprefix("run_id=")
+        # On refuse un changement si un autre est déjà en cours
+        if switch_status["state"] in ("loading", "validating"):
+            raise HTTPException(
+                status_code=409,
+                detail=f"Un changement de modèle est déjà en cours (run id : {switch_status['run_id']})",
+            )
+        # Le nouveau modèle est chargé et validé en arrière-plan,
+        # le modèle actuel continue de répondre aux prédictions en attendant
+        switch_status.update({"state": "loading", "run_id": new_run_id})
+        background_tasks.add_task(deploy_model, new_run_id)
         return {
-            f"Le nouveau modèle utilisé provient maintenant du run id suivant : {run_id}"
+            f"Chargement du modèle du run id suivant lancé : {new_run_id}, "
+            "merci d'attendre le mail indiquant le succès du changement."
         }
 
+    except HTTPException:
+        raise
     except Exception as e:
         logging.error(f"Le changement de modèle n'a pas fonctionné : {e}")
         alert_system.send_alert(
@@ -261,3 +1445,82 @@ async def switch_model(run_id: str = Body(...)):
         raise HTTPException(
             status_code=500, detail=f"Le changement de modèle n'a pas fonctionné : {e}"
         )
+
+
+# Cette route permet d'envoyer une partie (canary) ou une copie (shadow) du trafic vers un second modèle.
+# mode vaut "canary", "shadow" ou "off", percentage est le pourcentage de requêtes envoyées en canary
+@app.post("/traffic")
+async def set_traffic_route(
+    background_tasks: BackgroundTasks,
+    mode: str = Body(...),
+    run_id: str = Body(None),
+    percentage: float = Body(0.0),
+):
+    if mode not in ("off", "canary", "shadow"):
+        raise HTTPException(status_code=400, detail="Le mode doit valoir 'off', 'canary' ou 'shadow'.")
+    if mode == "off":
+        set_traffic("off")
+        pin_models()
+        save_traffic_config()
+        return {"status": "Tout le trafic est envoyé au modèle en production."}
+    if not run_id:
+        raise HTTPException(status_code=400, detail="Le run id du second modèle est obligatoire.")
+    if not 0 <= percentage <= 100:
+        raise HTTPException(status_code=400, detail="Le pourcentage doit être compris entre 0 et 100.")
+    if run_id == classifier.run_id:
+        raise HTTPException(status_code=400, detail="Ce modèle est déjà en production.")
+    # Le second modèle est chargé en arrière-plan si nécessaire
+    background_tasks.add_task(configure_traffic, mode, run_id, percentage)
+    return {"status": f"Activation du trafic {mode} vers le modèle {run_id} lancée."}
+
+
+# Cette route permet de suivre la répartition du trafic et les modèles en mémoire
+@app.get("/traffic")
+def get_traffic():
+    with shadow_lock:
+        stats = dict(shadow_stats)
+    stats["top1_agreement_rate"] = stats["top1_agreement"] / stats["predictions"] if stats["predictions"] else 0
+    return {
+        **traffic,
+        "prod_run_id": classifier.run_id,
+        "shadow": stats,
+        "models": model_pool.stats(),
+    }
+
+
+# Cette route permet de suivre l'avancement du dernier changement de modèle
+@app.get("/switchmodel_status")
+def switch_model_status():
+    return {
+        **switch_status,
+        "prod_run_id": classifier.run_id,
+        "backend": classifier.backend.name,
+        "previous_run_id": previous_classifier.run_id if previous_classifier else None,
+    }
+
+
+# Cette route permet de revenir instantanément au modèle précédent
+@app.post("/rollback")
+async def rollback():
+    try:
+        if previous_classifier is None:
+            raise HTTPException(status_code=409, detail="Aucun modèle précédent n'est disponible.")
+        if switch_status["state"] in ("loading", "validating"):
+            raise HTTPException(status_code=409, detail="Un changement de modèle est en cours.")
+        # L'ancien modèle étant toujours en mémoire, l'échange est immédiat
+        await executor.run(swap_classifier, previous_classifier)
+        switch_status.update({"state": "done", "run_id": classifier.run_id})
+        logging.info(f"Retour au modèle précédent : {classifier.run_id}")
+        return {f"Le modèle utilisé provient maintenant du run id suivant : {classifier.run_id}"}
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logging.error(f"Le retour au modèle précédent n'a pas fonctionné : {e}")
+        alert_system.send_alert(
+            subject="Erreur lors de l'inférence",
+            message=f"Le retour au modèle précédent n'a pas fonctionné : {e}",
+        )
+        raise HTTPException(
+            status_code=500, detail=f"Le retour au modèle précédent n'a pas fonctionné : {e}"
+        )
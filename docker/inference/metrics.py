@@ -0,0 +1,217 @@
+import time
+import threading
+from collections import deque
+from contextlib import contextmanager
+import numpy as np
+
+# Bornes (en secondes) des histogrammes de latence
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+# Bornes des histogrammes de taille de batch
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128)
+
+
+class Histogram:
+    """
+    Histogramme à bornes fixes (compteurs cumulés comme Prometheus), avec somme et nombre d'observations
+    """
+
+    def __init__(self, buckets):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        # On cherche le premier intervalle qui contient la valeur (le dernier est +inf)
+        index = int(np.searchsorted(self.buckets, value, side="left"))
+        self.counts[index] += 1
+        self.sum += value
+        self.count += 1
+
+    def snapshot(self):
+        cumulative = np.cumsum(self.counts).tolist()
+        labels = [str(bucket) for bucket in self.buckets] + ["+Inf"]
+        return {
+            "buckets": dict(zip(labels, cumulative)),
+            "sum": self.sum,
+            "count": self.count,
+            "mean": self.sum / self.count if self.count else 0,
+        }
+
+
+class RollingWindow:
+    """
+    Garde les dernières valeurs observées pour en calculer les percentiles
+    """
+
+    def __init__(self, size=200):
+        self.values = deque(maxlen=max(1, int(size)))
+
+    def observe(self, value):
+        self.values.append(value)
+
+    def percentile(self, q):
+        if not self.values:
+            return 0.0
+        return float(np.percentile(np.fromiter(self.values, dtype=np.float64), q))
+
+
+class InferenceMetrics:
+    """
+    Cette classe collecte les métriques de performance du container d'inférence :
+    latence de chaque étape (lecture, décodage, preprocessing, passe du modèle, post-traitement, log),
+    débit, requêtes en cours, taille des batchs et temps de chargement des modèles, par run_id.
+    Les durées sont mesurées avec une horloge monotone (time.perf_counter).
+    """
+
+    def __init__(self, window_size=200, rate_window=60):
+        self._lock = threading.Lock()
+        self.started_at = time.monotonic()
+        self.stages = {}
+        self.batch_sizes = {}
+        self.model_load_times = {}
+        self.warmup_times = {}
+        self.requests_total = {}
+        self.errors_total = {}
+        self.counters = {}
+        self.in_flight = 0
+        # Fenêtre glissante des latences totales, utilisée pour les percentiles et l'alerte de lenteur
+        self.latency_window = RollingWindow(window_size)
+        # Horodatage des dernières requêtes pour calculer le débit
+        self.rate_window = float(rate_window)
+        self._request_times = deque()
+
+    def observe(self, stage, duration, run_id):
+        """
+        Enregistre la durée d'une étape pour un modèle
+        """
+        with self._lock:
+            key = (stage, run_id)
+            if key not in self.stages:
+                self.stages[key] = Histogram(LATENCY_BUCKETS)
+            self.stages[key].observe(duration)
+
+    @contextmanager
+    def timer(self, stage, run_id):
+        """
+        Mesure la durée du bloc de code et l'enregistre pour l'étape indiquée
+        """
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start_time, run_id)
+
+    def increment(self, name, run_id, value=1):
+        """
+        Incrémente un compteur pour un modèle
+        """
+        with self._lock:
+            key = (name, run_id)
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe_batch(self, size, run_id):
+        with self._lock:
+            if run_id not in self.batch_sizes:
+                self.batch_sizes[run_id] = Histogram(BATCH_SIZE_BUCKETS)
+            self.batch_sizes[run_id].observe(size)
+
+    def set_model_load_time(self, run_id, duration):
+        with self._lock:
+            self.model_load_times[run_id] = duration
+
+    def set_warmup_times(self, run_id, durations):
+        """
+        Enregistre la durée du préchauffage de chaque chemin (taille de batch, type d'entrée) d'un modèle
+        """
+        with self._lock:
+            self.warmup_times[run_id] = dict(durations)
+
+    def request_started(self):
+        with self._lock:
+            self.in_flight += 1
+
+    def request_finished(self, duration, run_id, error=False):
+        """
+        Enregistre la fin d'une requête et sa latence totale
+        """
+        now = time.monotonic()
+        with self._lock:
+            self.in_flight -= 1
+            counter = self.errors_total if error else self.requests_total
+            counter[run_id] = counter.get(run_id, 0) + 1
+            self._request_times.append(now)
+            while self._request_times and now - self._request_times[0] > self.rate_window:
+                self._request_times.popleft()
+            if not error:
+                self.latency_window.observe(duration)
+        if not error:
+            self.observe("total", duration, run_id)
+
+    def latency_percentiles(self, percentiles=(50, 95, 99)):
+        with self._lock:
+            result = {f"p{q}": self.latency_window.percentile(q) for q in percentiles}
+            result["samples"] = len(self.latency_window.values)
+            return result
+
+    def snapshot(self):
+        """
+        Renvoie l'ensemble des métriques
+        """
+        now = time.monotonic()
+        with self._lock:
+            while self._request_times and now - self._request_times[0] > self.rate_window:
+                self._request_times.popleft()
+            elapsed = min(self.rate_window, now - self.started_at) or 1
+            stages = {}
+            for (stage, run_id), histogram in self.stages.items():
+                stages.setdefault(run_id, {})[stage] = histogram.snapshot()
+            counters = {}
+            for (name, run_id), value in self.counters.items():
+                counters.setdefault(run_id, {})[name] = value
+            result = {
+                "uptime": now - self.started_at,
+                "in_flight": self.in_flight,
+                "request_rate": len(self._request_times) / elapsed,
+                "requests_total": dict(self.requests_total),
+                "errors_total": dict(self.errors_total),
+                "counters": counters,
+                "latency_seconds": stages,
+                "batch_sizes": {run_id: histogram.snapshot() for run_id, histogram in self.batch_sizes.items()},
+                "model_load_seconds": dict(self.model_load_times),
+                "warmup_seconds": dict(self.warmup_times),
+            }
+        result["latency_window"] = self.latency_percentiles()
+        return result
+
+
+class SlowInferenceDetector:
+    """
+    Déclenche une alerte lorsque le percentile de latence observé sur la fenêtre glissante
+    dépasse le seuil, au plus une fois par période de cooldown
+    """
+
+    def __init__(self, metrics, threshold=1.0, percentile=95, min_samples=20, cooldown=900):
+        self.metrics = metrics
+        self.threshold = float(threshold)
+        self.percentile = percentile
+        self.min_samples = int(min_samples)
+        self.cooldown = float(cooldown)
+        self._last_alert = None
+        self._lock = threading.Lock()
+
+    def check(self):
+        """
+        Renvoie les percentiles de latence si une alerte doit être envoyée, sinon None
+        """
+        percentiles = self.metrics.latency_percentiles(sorted({50, 95, 99, self.percentile}))
+        if percentiles["samples"] < self.min_samples:
+            return None
+        if percentiles[f"p{self.percentile}"] <= self.threshold:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            if self._last_alert is not None and now - self._last_alert < self.cooldown:
+                return None
+            self._last_alert = now
+        return percentiles
@@ -0,0 +1,95 @@
+import threading
+import logging
+from collections import OrderedDict
+
+
+class ModelPool:
+    """
+    Cette classe garde plusieurs modèles en mémoire, indexés par run_id.
+    Le nombre de modèles et la mémoire occupée par leurs poids sont bornés : au-delà,
+    le modèle utilisé le moins récemment est retiré, sauf s'il est épinglé
+    (modèle en production, modèle précédent ou modèle en canary/shadow).
+    """
+
+    def __init__(self, loader, max_models=3, memory_budget_mb=2048):
+        # Fonction qui charge un modèle à partir de son run_id
+        self.loader = loader
+        self.max_models = max(1, int(max_models))
+        self.memory_budget = float(memory_budget_mb) * 1024 * 1024
+        self._models = OrderedDict()
+        self._pinned = set()
+        self._lock = threading.Lock()
+        # Un verrou par run_id pour ne pas charger deux fois le même modèle en parallèle
+        self._loading_locks = {}
+        self.loads = 0
+        self.evictions = 0
+
+    @staticmethod
+    def model_size(classifier):
+        """
+        Estime la mémoire occupée par les poids d'un modèle (float32)
+        """
+        return classifier.num_params * 4
+
+    def add(self, classifier):
+        """
+        Ajoute un modèle déjà chargé dans le pool. Il n'est jamais retiré par son propre ajout,
+        même s'il n'est pas encore épinglé
+        """
+        with self._lock:
+            self._models[classifier.run_id] = classifier
+            self._models.move_to_end(classifier.run_id)
+            self._evict(keep=classifier.run_id)
+
+    def get(self, run_id):
+        """
+        Renvoie le modèle demandé en le chargeant si nécessaire (appel bloquant)
+        """
+        with self._lock:
+            if run_id in self._models:
+                self._models.move_to_end(run_id)
+                return self._models[run_id]
+            loading_lock = self._loading_locks.setdefault(run_id, threading.Lock())
+        with loading_lock:
+            with self._lock:
+                if run_id in self._models:
+                    return self._models[run_id]
+            classifier = self.loader(run_id)
+            with self._lock:
+                self.loads += 1
+                self._loading_locks.pop(run_id, None)
+            self.add(classifier)
+            return classifier
+
+    def pin(self, *run_ids):
+        """
+        Remplace l'ensemble des modèles qui ne peuvent pas être retirés du pool
+        """
+        with self._lock:
+            self._pinned = {run_id for run_id in run_ids if run_id}
+            self._evict()
+
+    def _evict(self, keep=None):
+        # On retire les modèles les moins récemment utilisés tant que les limites sont dépassées
+        while len(self._models) > 1:
+            memory = sum(self.model_size(classifier) for classifier in self._models.values())
+            if len(self._models) <= self.max_models and memory <= self.memory_budget:
+                return
+            candidates = [run_id for run_id in self._models if run_id not in self._pinned and run_id != keep]
+            if not candidates:
+                return
+            del self._models[candidates[0]]
+            self.evictions += 1
+            logging.info(f"Modèle {candidates[0]} retiré de la mémoire.")
+
+    def stats(self):
+        with self._lock:
+            return {
+                "resident": list(self._models),
+                "pinned": sorted(self._pinned),
+                "max_models": self.max_models,
+                "memory_budget_mb": self.memory_budget / (1024 * 1024),
+                "memory_mb": sum(self.model_size(classifier) for classifier in self._models.values()) / (1024 * 1024),
+                "loads": self.loads,
+                "evictions": self.evictions,
+            }
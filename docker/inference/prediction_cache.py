@@ -0,0 +1,122 @@
+import os
+import json
+import time
+import threading
+import logging
+from collections import OrderedDict
+
+
+class PredictionCache:
+    """
+    Cette classe garde en mémoire les dernières prédictions, indexées par le hash de l'image
+    et l'identifiant du modèle qui les a produites.
+    Le cache est borné en nombre d'entrées (éviction LRU) et en durée de vie (TTL),
+    et peut être enregistré sur le disque pour survivre à un redémarrage du container.
+    """
+
+    def __init__(self, max_entries=1024, ttl=3600, persist_path=None):
+        self.max_entries = max(1, int(max_entries))
+        self.ttl = float(ttl)
+        self.persist_path = persist_path or None
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+        # Compteurs d'utilisation du cache
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        if self.persist_path:
+            self.load()
+
+    def _expired(self, created_at):
+        return self.ttl > 0 and time.time() - created_at > self.ttl
+
+    def get(self, file_hash, run_id):
+        """
+        Renvoie les classes et scores en cache pour une image, ou None si absents
+        """
+        key = (file_hash, run_id)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or self._expired(entry[2]):
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            # On marque l'entrée comme la plus récemment utilisée
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0], entry[1]
+
+    def put(self, file_hash, run_id, classes, scores):
+        """
+        Ajoute une prédiction dans le cache en évinçant la moins récemment utilisée si nécessaire
+        """
+        key = (file_hash, run_id)
+        with self._lock:
+            self._entries[key] = (list(classes), [float(score) for score in scores], time.time())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self):
+        """
+        Vide le cache, par exemple après un changement de modèle
+        """
+        with self._lock:
+            self._entries.clear()
+
+    def load(self):
+        """
+        Recharge le cache enregistré sur le disque
+        """
+        if not os.path.exists(self.persist_path):
+            return
+        try:
+            with open(self.persist_path, "r") as file:
+                entries = json.load(file)
+            with self._lock:
+                for file_hash, run_id, classes, scores, created_at in entries[-self.max_entries:]:
+                    if not self._expired(created_at):
+                        self._entries[(file_hash, run_id)] = (classes, scores, created_at)
+            logging.info(f"{len(self._entries)} prédictions rechargées depuis le cache.")
+        except Exception as e:
+            logging.error(f"Erreur lors du chargement du cache des prédictions : {e}")
+
+    def save(self):
+        """
+        Enregistre le cache sur le disque (fichier temporaire puis renommage)
+        """
+        if not self.persist_path:
+            return
+        try:
+            with self._lock:
+                entries = [
+                    [file_hash, run_id, classes, scores, created_at]
+                    for (file_hash, run_id), (classes, scores, created_at) in self._entries.items()
+                ]
+            os.makedirs(os.path.dirname(self.persist_path) or ".", exist_ok=True)
+            temp_path = f"{self.persist_path}.tmp"
+            with open(temp_path, "w") as file:
+                json.dump(entries, file)
+            os.replace(temp_path, self.persist_path)
+        except Exception as e:
+            logging.error(f"Erreur lors de l'enregistrement du cache des prédictions : {e}")
+
+    def stats(self):
+        """
+        Renvoie les compteurs d'utilisation du cache
+        """
+        with self._lock:
+            requests = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / requests if requests else 0,
+            }
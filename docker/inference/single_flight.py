@@ -0,0 +1,46 @@
+import asyncio
+
+
+class SingleFlight:
+    """
+    Cette classe regroupe les appels identiques simultanés : tant qu'un calcul est en cours
+    pour une clé, les appels suivants avec la même clé attendent son résultat
+    au lieu de relancer le travail.
+    Le calcul est exécuté dans une tâche séparée, l'annulation d'un appelant
+    (client déconnecté) n'interrompt donc pas les autres.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self.executed = 0
+        self.deduplicated = 0
+
+    async def do(self, key, coro_fn):
+        """
+        Renvoie le résultat de coro_fn() pour cette clé, en le partageant avec les appels simultanés
+        """
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(coro_fn())
+            self._calls[key] = task
+            task.add_done_callback(lambda done_task: self._done(key, done_task))
+            self.executed += 1
+        else:
+            self.deduplicated += 1
+        return await asyncio.shield(task)
+
+    def _done(self, key, task):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        # On récupère l'exception pour éviter un avertissement si plus personne n'attend le résultat
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self):
+        calls = self.executed + self.deduplicated
+        return {
+            "in_flight": len(self._calls),
+            "executed": self.executed,
+            "deduplicated": self.deduplicated,
+            "deduplication_rate": self.deduplicated / calls if calls else 0,
+        }
@@ -0,0 +1,203 @@
+"""
+Lance le serveur d'inférence sur plusieurs processus (mode pre-fork).
+Le processus principal ouvre le socket d'écoute puis crée les processus de travail, qui acceptent
+les connexions sur ce même socket : le noyau répartit les requêtes entre eux.
+Les processus sont créés avant l'import de TensorFlow, qui ne supporte pas le fork une fois initialisé.
+Avec INFERENCE_SHARED_WEIGHTS=1, les poids du modèle sont partagés en lecture seule via le fichier TFLite
+projeté en mémoire : la mémoire résidente de N processus reste bien inférieure à N fois celle d'un seul.
+Un processus de travail qui s'arrête est relancé automatiquement.
+"""
+
+import os
+import json
+import time
+import signal
+import socket
+import logging
+from autotune import load_profile
+
+# Dossier où chaque processus de travail publie ses métriques
+default_stats_folder = os.path.join("volume_data", "tmp", "workers")
+
+
+def worker_count(profile_path):
+    """
+    Renvoie le nombre de processus de travail : INFERENCE_WORKERS, sinon la valeur du profil de réglage CPU, sinon 1
+    """
+    workers = int(os.getenv("INFERENCE_WORKERS", "0"))
+    if workers <= 0:
+        profile = load_profile(profile_path)
+        workers = int(profile["workers"]) if profile else 1
+    return max(1, workers)
+
+
+def memory_usage():
+    """
+    Renvoie la mémoire résidente (rss) et la mémoire proportionnelle (pss, où les pages partagées
+    entre processus ne sont comptées qu'au prorata) du processus courant, en Mo
+    """
+    usage = {}
+    try:
+        with open("/proc/self/smaps_rollup", "r") as file:
+            for line in file:
+                key, _, value = line.partition(":")
+                if key in ("Rss", "Pss", "Shared_Clean", "Private_Dirty"):
+                    usage[key.lower()] = int(value.split()[0]) / 1024
+    except OSError:
+        pass
+    return usage
+
+
+def publish_stats(worker_id, stats, folder=default_stats_folder):
+    """
+    Écrit les métriques d'un processus de travail pour qu'elles soient lisibles par tous les autres
+    """
+    os.makedirs(folder, exist_ok=True)
+    path = os.path.join(folder, f"worker_{worker_id}.json")
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "w") as file:
+        json.dump(stats, file, default=str)
+    os.replace(temp_path, path)
+
+
+def read_stats(folder=default_stats_folder):
+    """
+    Renvoie les dernières métriques publiées par chaque processus de travail
+    """
+    stats = {}
+    if not os.path.isdir(folder):
+        return stats
+    for entry in os.scandir(folder):
+        if entry.name.startswith("worker_") and entry.name.endswith(".json"):
+            try:
+                with open(entry.path, "r") as file:
+                    stats[entry.name[len("worker_"):-len(".json")]] = json.load(file)
+            except (OSError, ValueError):
+                continue
+    return stats
+
+
+class RetryBackoff:
+    """
+    Espace les nouvelles tentatives d'une synchronisation qui échoue toujours sur la même cible
+    (modèle en production, répartition du trafic) : le délai double à chaque échec, jusqu'à max_delay
+    """
+
+    def __init__(self, base_delay, max_delay=600.0):
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.target = None
+        self.failures = 0
+        self.retry_at = 0.0
+
+    def ready(self, target):
+        """
+        Indique si une tentative vers cette cible peut être lancée maintenant
+        """
+        return target != self.target or time.monotonic() >= self.retry_at
+
+    def failed(self, target):
+        """
+        Enregistre l'échec d'une tentative et renvoie True s'il s'agit du premier échec pour cette cible
+        """
+        first = target != self.target
+        self.failures = 1 if first else self.failures + 1
+        self.target = target
+        self.retry_at = time.monotonic() + min(self.base_delay * 2 ** self.failures, self.max_delay)
+        return first
+
+    def succeeded(self):
+        self.target = None
+        self.failures = 0
+
+
+def _run_worker(worker_id, sock, app, log_level):
+    """
+    Point d'entrée d'un processus de travail : importe l'application et sert les requêtes sur le socket partagé
+    """
+    import uvicorn
+
+    os.environ["INFERENCE_WORKER_ID"] = str(worker_id)
+    config = uvicorn.Config(app, log_level=log_level)
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+def serve(app="inference:app", host="0.0.0.0", port=5500, workers=1, log_level="info"):
+    """
+    Ouvre le socket d'écoute, crée les processus de travail et les relance s'ils s'arrêtent
+    """
+    if workers <= 1:
+        import uvicorn
+
+        uvicorn.run(app, host=host, port=port, log_level=log_level)
+        return
+
+    # Les métriques d'une exécution précédente ne sont plus valables
+    if os.path.isdir(default_stats_folder):
+        for entry in os.scandir(default_stats_folder):
+            os.remove(entry.path)
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+
+    children = {}
+    stopping = False
+
+    def spawn(worker_id):
+        pid = os.fork()
+        if pid == 0:
+            # Les signaux sont gérés par uvicorn dans le processus de travail
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            try:
+                _run_worker(worker_id, sock, app, log_level)
+            finally:
+                os._exit(0)
+        children[pid] = worker_id
+        logging.info(f"Processus de travail {worker_id} démarré (pid {pid})")
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    for worker_id in range(workers):
+        spawn(worker_id)
+
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        worker_id = children.pop(pid, None)
+        if worker_id is None or stopping:
+            continue
+        logging.error(f"Le processus de travail {worker_id} s'est arrêté (statut {status}), il est relancé")
+        # On évite de relancer en boucle un processus qui échoue au démarrage
+        time.sleep(1)
+        spawn(worker_id)
+    sock.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    profile_path = os.getenv(
+        "INFERENCE_TUNING_PROFILE_PATH", os.path.join("volume_data", "tuning", "inference_profile.json")
+    )
+    serve(
+        host=os.getenv("INFERENCE_HOST", "0.0.0.0"),
+        port=int(os.getenv("INFERENCE_PORT", "5500")),
+        workers=worker_count(profile_path),
+    )
@@ -0,0 +1,143 @@
+import os
+import io
+import json
+import logging
+from PIL import Image, ImageOps
+
+
+class ThumbnailStore:
+    """
+    Cette classe `ThumbnailStore` génère une miniature (WebP ou JPEG) par classe du dossier train,
+    utilisée par l'API pour illustrer les prédictions.
+    Les miniatures sont regroupées dans un seul fichier (thumbnails-<génération>.bin) et index.json donne,
+    pour chaque classe, [position, taille, date de modification du dossier de la classe, image source].
+    La mise à jour est incrémentale : seules les classes dont le dossier a changé sont régénérées et leurs
+    miniatures ajoutées à la fin du fichier. Quand plus de la moitié du fichier n'est plus référencée,
+    il est réécrit sous une nouvelle génération. L'index est toujours remplacé de façon atomique.
+    """
+    image_extensions = (".jpg", ".jpeg", ".png")
+
+    def __init__(self, train_path, store_path, size=160, image_format="webp", quality=80):
+        # On définit les chemins et les paramètres des miniatures
+        self.train_path = train_path
+        self.store_path = store_path
+        self.index_path = os.path.join(store_path, "index.json")
+        self.size = int(size)
+        self.image_format = image_format.lower()
+        self.quality = int(quality)
+        self.generation = 0
+        self.entries = {}
+        self.load_index()
+
+    @property
+    def pack_name(self):
+        return f"thumbnails-{self.generation}.bin"
+
+    def load_index(self):
+        """
+        Charge l'index existant, sauf si les miniatures ont été générées avec d'autres paramètres
+        """
+        if not os.path.exists(self.index_path):
+            return
+        with open(self.index_path, "r") as file:
+            index = json.load(file)
+        self.generation = index["generation"]
+        if (index["format"], index["size"]) == (self.image_format, self.size) and os.path.exists(
+            os.path.join(self.store_path, index["pack"])
+        ):
+            self.entries = index["classes"]
+        else:
+            # Toutes les miniatures seront régénérées dans un nouveau fichier
+            self.generation += 1
+
+    def save_index(self):
+        temp_path = f"{self.index_path}.tmp"
+        with open(temp_path, "w") as file:
+            json.dump(
+                {
+                    "generation": self.generation,
+                    "pack": self.pack_name,
+                    "format": self.image_format,
+                    "size": self.size,
+                    "classes": self.entries,
+                },
+                file,
+            )
+        os.replace(temp_path, self.index_path)
+        # Les fichiers des générations précédentes ne sont plus référencés par l'index
+        for name in os.listdir(self.store_path):
+            if name.startswith("thumbnails-") and name.endswith(".bin") and name != self.pack_name:
+                os.remove(os.path.join(self.store_path, name))
+
+    def make_thumbnail(self, class_path):
+        """
+        Renvoie la miniature de la première image lisible de la classe et le nom de cette image
+        """
+        for name in sorted(os.listdir(class_path)):
+            if not name.lower().endswith(self.image_extensions):
+                continue
+            try:
+                with Image.open(os.path.join(class_path, name)) as image:
+                    image = ImageOps.exif_transpose(image).convert("RGB")
+                    image.thumbnail((self.size, self.size))
+                    buffer = io.BytesIO()
+                    image.save(buffer, format=self.image_format.upper(), quality=self.quality)
+                return buffer.getvalue(), name
+            except Exception as e:
+                logging.warning(f"Miniature impossible pour l'image {name} : {e}")
+        return b"", None
+
+    def update(self):
+        """
+        Régénère les miniatures des classes ajoutées ou modifiées et retire celles des classes supprimées.
+        Renvoie le nombre de classes régénérées
+        """
+        if not os.path.isdir(self.train_path):
+            return 0
+        # L'ajout ou la suppression d'une image modifie la date du dossier de sa classe
+        classes = {
+            entry.name: entry.stat().st_mtime_ns for entry in os.scandir(self.train_path) if entry.is_dir()
+        }
+        changed = [classe for classe, mtime in classes.items() if self.entries.get(classe, [0, 0, None])[2] != mtime]
+        removed = [classe for classe in self.entries if classe not in classes]
+        if not changed and not removed:
+            return 0
+
+        os.makedirs(self.store_path, exist_ok=True)
+        pack_path = os.path.join(self.store_path, self.pack_name)
+        with open(pack_path, "ab") as pack:
+            for classe in changed:
+                thumbnail, source = self.make_thumbnail(os.path.join(self.train_path, classe))
+                offset = pack.tell()
+                pack.write(thumbnail)
+                self.entries[classe] = [offset, len(thumbnail), classes[classe], source]
+            pack.flush()
+            os.fsync(pack.fileno())
+        for classe in removed:
+            del self.entries[classe]
+
+        # Si plus de la moitié du fichier n'est plus utilisée, on le réécrit
+        used = sum(entry[1] for entry in self.entries.values())
+        if os.path.getsize(pack_path) > 2 * used:
+            self.compact()
+        else:
+            self.save_index()
+        logging.info(f"Miniatures mises à jour : {len(changed)} classes régénérées, {len(removed)} supprimées")
+        return len(changed)
+
+    def compact(self):
+        """
+        Réécrit les miniatures utilisées dans un nouveau fichier, qui remplace l'ancien
+        """
+        old_pack_path = os.path.join(self.store_path, self.pack_name)
+        self.generation += 1
+        entries = {}
+        with open(old_pack_path, "rb") as old_pack, open(os.path.join(self.store_path, self.pack_name), "wb") as pack:
+            for classe, (offset, length, mtime, source) in self.entries.items():
+                old_pack.seek(offset)
+                entries[classe] = [pack.tell(), length, mtime, source]
+                pack.write(old_pack.read(length))
+            pack.flush()
+            os.fsync(pack.fileno())
+        self.entries = entries
+        self.save_index()
@@ -8,6 +8,7 @@ import json
 import schedule
 from CleanDB import CleanDB
 from DatasetCorrection import DatasetCorrection
+from ThumbnailStore import ThumbnailStore
 from alert_system import AlertSystem
 
 # On créer les différents chemins
@@ -21,6 +22,7 @@ state_path = os.path.join(state_folder, "preprocessing_state.txt")
 training_state_path = os.path.join(state_folder, "training_state.txt")
 monitoring_state_path = os.path.join(state_folder, "drift_monitor_state.txt")
 log_folder = os.path.join(volume_path, "logs")
+thumbnails_path = os.path.join(volume_path, "thumbnails")
 
 # On créer les dossiers si nécessaire
 os.makedirs(log_folder, exist_ok=True)
@@ -274,6 +276,14 @@ except Exception as e:
     )
 
 
+# On instancie la classe qui génère les miniatures des classes affichées par l'API
+thumbnail_store = ThumbnailStore(
+    os.path.join(dataset_raw_path, "train"),
+    thumbnails_path,
+    size=int(os.getenv("THUMBNAIL_SIZE", "160")),
+    image_format=os.getenv("THUMBNAIL_FORMAT", "webp"),
+)
+
 # Tous les jours à 02h, on vérifie la présence d'un nouveau dataset
 schedule.every().day.at("02:00").do(auto_update_dataset, "gpiosenka/100-bird-species", dataset_raw_path)
 
@@ -371,6 +381,15 @@ while True:
             message=f"Erreur lors du tracking des classes : {e}"
         )
 
+    try:
+        # On régénère uniquement les miniatures des classes dont les images ont changé
+        # (pas pendant le téléchargement du dataset)
+        with open(state_path, "r") as file:
+            if file.read() != "2":
+                thumbnail_store.update()
+    except Exception as e:
+        logging.error(f"Erreur lors de la mise à jour des miniatures : {e}")
+
     try:
         # On fait tourner le scheduler pour le téléchargement automatique du dataset
         schedule.run_pending()
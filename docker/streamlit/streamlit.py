@@ -2,6 +2,7 @@ import streamlit as st
 import requests
 from PIL import Image
 import os
+import base64
 import streamlit.components.v1 as components
 
 # Configuration de la page
@@ -648,11 +649,19 @@ elif page == "Interface utilisateur (APIs)":
                         try:
                             st.session_state.class_images = []
                             headers = {"Authorization": f"Bearer {st.session_state.user_token}", "api-key": API_KEY}
-                            for classe in st.session_state.prediction['predictions']:
-                                response = requests.get(f"{USER_API_URL}/get_class_image",
-                                                        params={'classe': classe},
-                                                        headers=headers)
-                                st.session_state.class_images.append(response.content)
+                            # Les miniatures des classes prédites sont récupérées en une seule requête
+                            response = requests.get(f"{USER_API_URL}/get_class_thumbnails",
+                                                    params={'classes': st.session_state.prediction['predictions']},
+                                                    headers=headers)
+                            for thumbnail in response.json()['thumbnails']:
+                                if thumbnail['image'] is not None:
+                                    st.session_state.class_images.append(base64.b64decode(thumbnail['image']))
+                                else:
+                                    # Sans miniature (pas encore générée), on récupère l'image complète
+                                    response = requests.get(f"{USER_API_URL}/get_class_image",
+                                                            params={'classe': thumbnail['classe']},
+                                                            headers=headers)
+                                    st.session_state.class_images.append(response.content)
                         except Exception:
                             st.error("Impossible de récupérer les images associées aux classes.")
 
@@ -716,13 +725,27 @@ elif page == "Interface utilisateur (APIs)":
                                 ["Sélectionnez une espèce..."] + st.session_state.prediction['predictions']
                             )
                         elif st.session_state.feedback_step == "known_species":
-                            if 'species_list' not in st.session_state:
-                                headers = {"Authorization": f"Bearer {st.session_state.user_token}", "api-key": API_KEY}
-                                response = requests.get(f"{USER_API_URL}/get_species", headers=headers)
-                                st.session_state.species_list = response.json()['species']
+                            # L'API ne renvoie que les espèces correspondant à la recherche,
+                            # les réponses déjà reçues sont revalidées avec leur ETag
+                            search = st.text_input("Rechercher une espèce (nom anglais) :")
+                            if 'species_search' not in st.session_state:
+                                st.session_state.species_search = {}
+                            headers = {"Authorization": f"Bearer {st.session_state.user_token}", "api-key": API_KEY}
+                            cached = st.session_state.species_search.get(search)
+                            if cached is not None:
+                                headers["If-None-Match"] = cached[0]
+                            response = requests.get(
+                                f"{USER_API_URL}/get_species",
+                                params={"q": search, "mode": "contains", "limit": 50},
+                                headers=headers,
+                            )
+                            if response.status_code == 200:
+                                cached = (response.headers.get("ETag"), response.json()['species'])
+                                st.session_state.species_search[search] = cached
+                            species_list = cached[1] if cached is not None else []
                             st.session_state.selected_species = st.selectbox(
                                 "Sélectionnez l'espèce correcte :",
-                                ["Sélectionnez une espèce..."] + st.session_state.species_list
+                                ["Sélectionnez une espèce..."] + species_list
                             )
 
                         # Soumission de la sélection d'espèce
@@ -7,8 +7,9 @@ import logging
 import mlflow
 import shutil
 import json
+import requests
 from sklearn.metrics import confusion_matrix
-from tensorflow.keras.applications import EfficientNetB0
+from tensorflow.keras.applications import EfficientNetB0, MobileNetV3Small
 from tensorflow.keras.layers import Dropout, GlobalAveragePooling2D, Dense
 from tensorflow.keras.callbacks import ReduceLROnPlateau, EarlyStopping
 from tensorflow.keras.preprocessing.image import ImageDataGenerator
@@ -44,6 +45,9 @@ os.makedirs(log_folder, exist_ok=True)
 # On déclare le nom de l'expérience MLflow à récupérer
 experiment_id = "157975935045122495"
 
+# Permet d'entraîner en plus un petit modèle utilisé en premier étage de la cascade d'inférence
+train_cascade = os.getenv("TRAINING_CASCADE_MODEL", "0") == "1"
+
 # On déclare l'état par défaut du container
 with open(state_path, "w") as file:
     file.write("0")
@@ -171,6 +175,67 @@ def get_worst_f1_scores(run_id: str):
         )
 
 
+def train_cascade_model(train_generator, valid_generator, num_classes):
+    """
+    Entraîne un petit modèle MobileNetV3 sur les mêmes classes que le modèle principal.
+    Il répond en premier lors de l'inférence, le modèle principal n'étant utilisé
+    que lorsque ce petit modèle n'est pas assez sûr de lui.
+    """
+    try:
+        # On désactive l'autolog pour ne pas écraser les métriques du modèle principal
+        mlflow.keras.autolog(disable=True)
+        logging.info("Démarrage de l'entraînement du modèle de cascade")
+
+        # MobileNetV3 intègre son preprocessing, il reçoit donc les mêmes images qu'EfficientNet
+        base_model = MobileNetV3Small(weights="imagenet", include_top=False, input_shape=(224, 224, 3))
+        for layer in base_model.layers[:-20]:
+            layer.trainable = False
+        x = GlobalAveragePooling2D()(base_model.output)
+        x = Dropout(rate=0.2)(x)
+        predictions = Dense(num_classes, activation="softmax")(x)
+        cascade_model = Model(inputs=base_model.input, outputs=predictions)
+        cascade_model.compile(
+            optimizer=Adam(learning_rate=0.001),
+            loss="categorical_crossentropy",
+            metrics=["acc"],
+        )
+        history = cascade_model.fit(
+            train_generator,
+            epochs=1,
+            steps_per_epoch=train_generator.samples // train_generator.batch_size,
+            validation_data=valid_generator,
+            validation_steps=valid_generator.samples // valid_generator.batch_size,
+            verbose=1,
+        )
+        mlflow.log_metric("cascade_val_acc", history.history["val_acc"][-1])
+
+        # On enregistre le modèle à côté du modèle principal
+        cascade_save_path = "cascade_model.h5"
+        cascade_model.save(cascade_save_path)
+        mlflow.log_artifact(cascade_save_path, artifact_path="model")
+        os.remove(cascade_save_path)
+        logging.info("Modèle de cascade enregistré avec succès !")
+    except Exception as e:
+        logging.error(f"Un problème est survenu lors de l'entraînement du modèle de cascade : {e}")
+        alert_system.send_alert(
+            subject="Erreur lors de l'entraînement",
+            message=f"Un problème est survenu lors de l'entraînement du modèle de cascade : {e}",
+        )
+
+
+def request_embedding_index(run_id):
+    """
+    Lance dans le container d'inférence la construction de l'index des embeddings d'un run
+    """
+    try:
+        requests.post(
+            "http://inference:5500/embedding_index/refresh", json={"run_id": run_id}, timeout=10
+        ).raise_for_status()
+    except Exception as e:
+        # L'index pourra être construit plus tard, lors de la mise en production du modèle
+        logging.error(f"Impossible de lancer la construction de l'index des embeddings : {e}")
+
+
 def train_model():
     """
     Fonction qui lance l'entraînement du modèle tout en faisant un suivi avec MLFlow
@@ -304,9 +369,17 @@ def train_model():
             # On génère et sauvegarde la matrice de confusion pour plus tard
             generate_confusion_matrix(test_generator, model)
 
+            # On entraîne si demandé le petit modèle de la cascade d'inférence
+            if train_cascade:
+                train_cascade_model(train_generator, valid_generator, num_classes)
+
             # On termine le run MLFlow
+            run_id = mlflow.active_run().info.run_id
             mlflow.end_run()
 
+            # On demande au container d'inférence de construire l'index des embeddings du nouveau modèle
+            request_embedding_index(run_id)
+
             alert_system.send_alert(
                 subject="Entraînement terminé avec succès !",
                 message="""L'entraînement s'est terminé avec succès !
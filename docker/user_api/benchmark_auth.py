@@ -0,0 +1,86 @@
+"""
+Mesure le coût de l'authentification (token JWT et utilisateur autorisé) par requête, sans passer par le réseau :
+- avant : relecture du fichier des utilisateurs, décodage du token et écriture du token dans les logs à chaque requête
+- décodage : décodage du token et recherche de l'utilisateur dans la liste gardée en mémoire
+- cache : token déjà vérifié, retrouvé par son empreinte
+Exemple : python benchmark_auth.py --requests 20000
+"""
+
+import os
+import json
+import time
+import logging
+import argparse
+import tempfile
+import statistics
+from datetime import datetime, timedelta
+import jwt
+from user_store import UserStore
+from token_cache import TokenCache, token_digest
+
+SECRET_KEY = "benchmark"
+ALGORITHM = "HS256"
+
+
+def summarize(name, timings):
+    timings = sorted(timings)
+    print(
+        f"{name:<9} moyenne {statistics.mean(timings):.2f} µs, p50 {timings[len(timings) // 2]:.2f} µs, "
+        f"p99 {timings[int(len(timings) * 0.99) - 1]:.2f} µs"
+    )
+
+
+def measure(verify, token, count):
+    timings = []
+    for _ in range(count):
+        start_time = time.perf_counter()
+        verify(token)
+        timings.append((time.perf_counter() - start_time) * 1e6)
+    return timings
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Coût de l'authentification par requête")
+    parser.add_argument("--requests", type=int, default=10000, help="Nombre de vérifications mesurées par méthode")
+    parser.add_argument("--users", type=int, default=50, help="Nombre d'utilisateurs dans le fichier")
+    args = parser.parse_args()
+
+    folder = tempfile.mkdtemp()
+    users_path = os.path.join(folder, "authorized_users.json")
+    with open(users_path, "w") as f:
+        json.dump({f"user{i}": [i == 0, "password"] for i in range(args.users)}, f, indent=4)
+    logging.basicConfig(filename=os.path.join(folder, "benchmark.log"), level=logging.INFO)
+    token = jwt.encode(
+        {"sub": "user1", "exp": datetime.utcnow() + timedelta(minutes=30)}, SECRET_KEY, algorithm=ALGORITHM
+    )
+
+    def verify_before(token):
+        logging.info(f"Tentative de décodage du token: {token}")
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        with open(users_path, "r") as f:
+            user = json.load(f).get(payload.get("sub"))
+        logging.info("Clé API validée !")
+        return user
+
+    user_store = UserStore(users_path)
+
+    def verify_decode(token):
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        return user_store.get(payload.get("sub"))
+
+    token_cache = TokenCache()
+
+    def verify_cached(token):
+        digest = token_digest(token)
+        users_version = user_store.current_version()
+        cached = token_cache.get(digest)
+        if cached is not None and cached[1] == users_version:
+            return cached[0]
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        user_store.get(payload["sub"])
+        token_cache.put(digest, payload["sub"], payload["exp"], users_version)
+        return payload["sub"]
+
+    summarize("avant", measure(verify_before, token, args.requests))
+    summarize("décodage", measure(verify_decode, token, args.requests))
+    summarize("cache", measure(verify_cached, token, args.requests))
@@ -0,0 +1,77 @@
+"""
+Compare le surcoût par requête entre la route JSON /predict_bytes et l'interface gRPC du container d'inférence.
+La même image est envoyée à chaque requête : après la première, la prédiction vient du cache de l'inférence,
+la mesure porte donc sur le transport (connexion, sérialisation, taille des réponses) et non sur le modèle.
+Exemple (depuis le container user_api) : python benchmark_transport.py image.jpg --requests 500
+"""
+
+import time
+import asyncio
+import hashlib
+import argparse
+import statistics
+import requests
+from inference_grpc import InferenceGrpcClient, encode_request
+
+
+def summarize(name, timings, request_size, response_size):
+    timings = sorted(timings)
+    print(
+        f"{name:<6} moyenne {statistics.mean(timings):.2f} ms, p50 {timings[len(timings) // 2]:.2f} ms, "
+        f"p99 {timings[int(len(timings) * 0.99) - 1]:.2f} ms, requête {request_size} o, réponse {response_size} o"
+    )
+
+
+def benchmark_http(url, content, file_name, count):
+    """
+    Requêtes successives sur une connexion HTTP/1.1 persistante
+    """
+    timings = []
+    response = None
+    with requests.Session() as session:
+        for _ in range(count + 1):
+            start_time = time.perf_counter()
+            response = session.post(
+                url, params={"file_name": file_name}, data=content,
+                headers={"Content-Type": "application/octet-stream"},
+            )
+            response.raise_for_status()
+            response.json()
+            timings.append((time.perf_counter() - start_time) * 1000)
+    # La première requête (calcul de la prédiction) n'est pas comptée
+    return timings[1:], len(content), len(response.content)
+
+
+async def benchmark_grpc(target, content, file_name, count):
+    """
+    Requêtes successives sur un canal HTTP/2 persistant
+    """
+    client = InferenceGrpcClient(target)
+    timings = []
+    try:
+        for _ in range(count + 1):
+            start_time = time.perf_counter()
+            await client.predict(content, file_name)
+            timings.append((time.perf_counter() - start_time) * 1000)
+        # Taille de la réponse binaire, mesurée une fois hors chronométrage
+        client._connect()
+        response_size = len(await client._predict(encode_request(file_name, content)))
+    finally:
+        await client.close()
+    return timings[1:], len(encode_request(file_name, content)), response_size
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Comparaison du surcoût JSON et gRPC vers l'inférence")
+    parser.add_argument("image", help="Image envoyée à chaque requête")
+    parser.add_argument("--requests", type=int, default=200, help="Nombre de requêtes mesurées par protocole")
+    parser.add_argument("--http-url", default="http://inference:5500/predict_bytes")
+    parser.add_argument("--grpc-target", default="inference:50051")
+    args = parser.parse_args()
+
+    with open(args.image, "rb") as file:
+        content = file.read()
+    file_name = hashlib.sha256(content).hexdigest() + ".jpg"
+
+    summarize("json", *benchmark_http(args.http_url, content, file_name, args.requests))
+    summarize("grpc", *asyncio.run(benchmark_grpc(args.grpc_target, content, file_name, args.requests)))
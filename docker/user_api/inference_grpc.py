@@ -0,0 +1,156 @@
+"""
+Client de l'interface binaire (gRPC sur HTTP/2) du container d'inférence.
+Le canal HTTP/2 est ouvert une seule fois et partagé par toutes les requêtes.
+Format des messages (identique à docker/inference/grpc_server.py) :
+- requête : longueur du nom (uint16), nom de l'image, contenu de l'image
+- réponse : longueur de l'en-tête (uint32), en-tête JSON (classes, étage, nom), scores en float32
+Les appels passent par le même disjoncteur que le client HTTP (http_client.py) : un service injoignable
+donne la même UpstreamUnavailableError quel que soit le protocole.
+"""
+
+import json
+import struct
+import grpc
+from http_client import CircuitBreaker, UpstreamUnavailableError
+
+SERVICE = "aviscan.Inference"
+# Codes comptés comme des pannes par le disjoncteur, comme les erreurs de transport et les codes 502/504 en HTTP.
+# RESOURCE_EXHAUSTED (refus par surcharge) et INVALID_ARGUMENT (image illisible) sont des réponses du service
+FAILURE_STATUS_CODES = (grpc.StatusCode.UNAVAILABLE, grpc.StatusCode.DEADLINE_EXCEEDED)
+
+
+class InferenceUnavailableError(Exception):
+    """
+    Levée lorsque l'inférence refuse la requête faute de capacité
+    """
+
+    def __init__(self, message, retry_after="1"):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class InvalidImageError(Exception):
+    """
+    Levée lorsque l'inférence refuse le contenu envoyé (image illisible)
+    """
+
+
+class InferenceTimeoutError(Exception):
+    """
+    Levée lorsque l'inférence n'a pas répondu avant l'échéance de l'appel
+    """
+
+
+def encode_request(file_name, content):
+    name = file_name.encode()
+    return struct.pack("<H", len(name)) + name + content
+
+
+def decode_response(message):
+    (header_length,) = struct.unpack_from("<I", message)
+    result = json.loads(message[4:4 + header_length])
+    scores = message[4 + header_length:]
+    result["scores"] = list(struct.unpack(f"<{len(scores) // 4}f", scores))
+    return result
+
+
+class InferenceGrpcClient:
+    """
+    Client asynchrone : le canal est créé à la première utilisation, dans la boucle d'événements de FastAPI.
+    breaker est le disjoncteur du service, partagé avec le client HTTP
+    """
+
+    def __init__(self, target, breaker=None):
+        self.target = target
+        self.breaker = breaker or CircuitBreaker("inference")
+        self._channel = None
+        self._predict = None
+        self._predict_stream = None
+
+    def _connect(self):
+        if self._channel is None:
+            self._channel = grpc.aio.insecure_channel(self.target, options=[
+                ("grpc.keepalive_time_ms", 30000),
+                ("grpc.keepalive_permit_without_calls", 1),
+                ("grpc.max_send_message_length", 32 * 1024 * 1024),
+            ])
+            self._predict = self._channel.unary_unary(f"/{SERVICE}/Predict")
+            self._predict_stream = self._channel.stream_stream(f"/{SERVICE}/PredictStream")
+
+    async def predict(self, content, file_name, timeout=None):
+        """
+        Prédit une image et renvoie le même dictionnaire que la route /predict de l'inférence
+        """
+        self._connect()
+        trial = self.breaker.check()
+        try:
+            call = self._predict(encode_request(file_name, content), timeout=timeout)
+            try:
+                message = await call
+            except grpc.aio.AioRpcError as e:
+                self._record(e.code())
+                raise await self._translate(e, call)
+            self.breaker.record_success()
+            return decode_response(message)
+        finally:
+            # Essai annulé : sans cela, le disjoncteur resterait semi-ouvert et refuserait toutes les requêtes
+            if trial:
+                self.breaker.release_trial()
+
+    async def predict_stream(self, images, timeout=None):
+        """
+        Prédit une liste de (nom, contenu) sur un seul flux et renvoie les résultats dans l'ordre.
+        timeout est l'échéance de tout le flux
+        """
+        self._connect()
+
+        async def requests():
+            for file_name, content in images:
+                yield encode_request(file_name, content)
+
+        trial = self.breaker.check()
+        try:
+            call = self._predict_stream(requests(), timeout=timeout)
+            try:
+                async for message in call:
+                    if trial:
+                        # Le service a répondu : le disjoncteur est refermé sans attendre la fin du flux
+                        self.breaker.record_success()
+                        trial = False
+                    yield decode_response(message)
+            except grpc.aio.AioRpcError as e:
+                self._record(e.code())
+                raise await self._translate(e, call)
+            self.breaker.record_success()
+        finally:
+            if trial:
+                self.breaker.release_trial()
+
+    def _record(self, code):
+        if code in FAILURE_STATUS_CODES:
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+
+    async def _translate(self, e, call):
+        """
+        Convertit un service injoignable, un refus faute de capacité, une échéance dépassée
+        ou une image refusée en exception dédiée
+        """
+        if e.code() == grpc.StatusCode.UNAVAILABLE:
+            return UpstreamUnavailableError(
+                f"Communication avec le service {self.breaker.name} impossible: {e.details()}"
+            )
+        if e.code() == grpc.StatusCode.RESOURCE_EXHAUSTED:
+            metadata = dict(await call.initial_metadata() or ())
+            return InferenceUnavailableError(e.details(), metadata.get("retry-after", "1"))
+        if e.code() == grpc.StatusCode.DEADLINE_EXCEEDED:
+            return InferenceTimeoutError(e.details())
+        if e.code() == grpc.StatusCode.INVALID_ARGUMENT:
+            return InvalidImageError(e.details())
+        return e
+
+    async def close(self):
+        if self._channel is not None:
+            await self._channel.close()
+            self._channel = None
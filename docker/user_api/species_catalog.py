@@ -0,0 +1,97 @@
+"""
+Catalogue des espèces (noms anglais de birds_list.csv), construit une seule fois en mémoire et reconstruit
+lorsque le fichier CSV change. Les noms sont triés sans tenir compte de la casse, ce qui permet une recherche
+par préfixe par dichotomie ; la recherche par sous-chaîne parcourt la liste déjà mise en minuscules.
+Chaque version du catalogue a une empreinte, utilisée pour construire les ETag des réponses.
+"""
+
+import os
+import csv
+import time
+import bisect
+import hashlib
+import logging
+import threading
+import orjson
+
+SEARCH_MODES = ("prefix", "contains")
+
+
+def etag_matches(etag, if_none_match):
+    """
+    Indique si l'ETag fait partie de l'en-tête If-None-Match envoyé par le client (la réponse est alors 304).
+    Un ETag affaibli par un proxy (W/"...") et la valeur * correspondent aussi
+    """
+    if not if_none_match:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in tags or etag in [tag[2:] if tag.startswith("W/") else tag for tag in tags]
+
+
+class SpeciesCatalog:
+    def __init__(self, csv_path, check_interval=5.0):
+        self.csv_path = csv_path
+        self.check_interval = float(check_interval)
+        self._lock = threading.Lock()
+        self._signature = None
+        self._checked_at = 0.0
+        # Noms triés et leurs versions en minuscules, remplacés ensemble lors d'une reconstruction
+        self._index = ([], [])
+        self.digest = None
+        self.full_body = None
+
+    def _file_signature(self):
+        stat = os.stat(self.csv_path)
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+    def refresh(self):
+        """
+        Reconstruit le catalogue si le fichier CSV a changé (vérification au plus toutes les check_interval secondes)
+        """
+        if self.digest is not None and time.monotonic() - self._checked_at < self.check_interval:
+            return
+        with self._lock:
+            self._checked_at = time.monotonic()
+            signature = self._file_signature()
+            if signature == self._signature:
+                return
+            with open(self.csv_path, "r", encoding="utf-8", newline="") as file:
+                names = list({row["English"] for row in csv.DictReader(file) if row.get("English")})
+            names.sort(key=lambda name: (name.casefold(), name))
+            self._index = (names, [name.casefold() for name in names])
+            self.digest = hashlib.sha256("\n".join(names).encode()).hexdigest()[:16]
+            # La liste complète est sérialisée une seule fois par version du catalogue
+            self.full_body = orjson.dumps({"species": names, "total": len(names), "offset": 0, "limit": None})
+            self._signature = signature
+            logging.info(f"Catalogue des espèces construit ({len(names)} espèces)")
+
+    def search(self, query="", mode="prefix"):
+        """
+        Renvoie les noms correspondant à la recherche (insensible à la casse), dans l'ordre du catalogue
+        """
+        names, keys = self._index
+        query = query.strip().casefold()
+        if not query:
+            return names
+        if mode == "prefix":
+            start = bisect.bisect_left(keys, query)
+            end = bisect.bisect_left(keys, query + "\uffff", lo=start)
+            return names[start:end]
+        return [name for name, key in zip(names, keys) if query in key]
+
+    def etag(self, *params):
+        """
+        ETag d'une réponse : dépend de la version du catalogue et des paramètres de la requête
+        """
+        key = "|".join([self.digest or ""] + [str(param) for param in params])
+        return f'"{hashlib.sha256(key.encode()).hexdigest()[:24]}"'
+
+    def page(self, query="", mode="prefix", offset=0, limit=None):
+        """
+        Renvoie le corps JSON (bytes) d'une page de résultats
+        """
+        if not query and not offset and limit is None:
+            return self.full_body
+        matches = self.search(query, mode)
+        end = None if limit is None else offset + limit
+        return orjson.dumps({"species": matches[offset:end], "total": len(matches), "offset": offset, "limit": limit})
@@ -0,0 +1,78 @@
+"""
+Lecture des miniatures des classes générées par le container de preprocessing (ThumbnailStore.py) :
+volume_data/thumbnails/index.json donne, pour chaque classe, [position, taille, date de modification
+du dossier de la classe, image source] dans le fichier de miniatures indiqué par l'index.
+L'index est relu lorsqu'il change (vérification au plus toutes les check_interval secondes)
+et les miniatures sont lues directement à leur position, sans parcourir le dossier de la classe.
+"""
+
+import os
+import time
+import hashlib
+import logging
+import threading
+import orjson
+
+MEDIA_TYPES = {"webp": "image/webp", "jpeg": "image/jpeg"}
+
+
+class ThumbnailStore:
+    def __init__(self, folder, check_interval=5.0):
+        self.folder = folder
+        self.index_path = os.path.join(folder, "index.json")
+        self.check_interval = float(check_interval)
+        self._lock = threading.Lock()
+        self._checked_at = 0.0
+        # Index, fichier de miniatures ouvert et signature de l'index, remplacés ensemble lors d'un rechargement.
+        # L'ancien fichier est fermé par le ramasse-miettes, une fois qu'aucune lecture ne l'utilise plus
+        self._state = ({}, None, None)
+
+    @property
+    def media_type(self):
+        index = self._state[0]
+        return MEDIA_TYPES.get(index.get("format"), "application/octet-stream")
+
+    def refresh(self):
+        """
+        Recharge l'index s'il a changé
+        """
+        if time.monotonic() - self._checked_at < self.check_interval:
+            return
+        with self._lock:
+            self._checked_at = time.monotonic()
+            if not os.path.exists(self.index_path):
+                return
+            stat = os.stat(self.index_path)
+            signature = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+            if signature == self._state[2]:
+                return
+            with open(self.index_path, "rb") as file:
+                index = orjson.loads(file.read())
+            try:
+                pack = open(os.path.join(self.folder, index["pack"]), "rb")
+            except FileNotFoundError:
+                # L'index a été remplacé entre-temps, il sera relu à la prochaine vérification
+                self._checked_at = 0.0
+                return
+            self._state = (index, pack, signature)
+            logging.info(f"Index des miniatures chargé ({len(index['classes'])} classes)")
+
+    def get(self, classe):
+        """
+        Renvoie la miniature de la classe (bytes) ou None si elle n'existe pas
+        """
+        index, pack, _ = self._state
+        entry = index.get("classes", {}).get(classe) if pack is not None else None
+        if not entry or not entry[1]:
+            return None
+        # pread lit à une position donnée sans déplacer le curseur partagé entre les threads
+        return os.pread(pack.fileno(), entry[1], entry[0])
+
+    def etag(self, classes):
+        """
+        ETag d'une réponse : change dès que la miniature d'une des classes demandées est régénérée
+        """
+        index, _, _ = self._state
+        entries = index.get("classes", {})
+        key = "|".join([index.get("pack", "")] + [f"{classe}:{entries.get(classe)}" for classe in classes])
+        return f'"{hashlib.sha256(key.encode()).hexdigest()[:24]}"'
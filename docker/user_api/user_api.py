@@ -6,10 +6,12 @@ from fastapi import (
     File,
     UploadFile,
     Header,
-    Form
+    Form,
+    BackgroundTasks,
+    Query,
 )
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
-from typing import Optional
+from typing import Optional, List
 from pydantic import BaseModel
 from datetime import datetime, timedelta
 import jwt
@@ -19,11 +21,18 @@ from dotenv import load_dotenv
 import logging
 
 # from app.models.predictClass import predictClass
-from fastapi.responses import FileResponse, PlainTextResponse
-import requests
+from fastapi.responses import FileResponse, PlainTextResponse, StreamingResponse, Response
+import httpx
+import base64
 import hashlib
 import time
-import pandas as pd
+import orjson
+from inference_grpc import InferenceGrpcClient, InferenceUnavailableError, InferenceTimeoutError, InvalidImageError
+from http_client import UpstreamClient, UpstreamUnavailableError
+from user_store import UserStore
+from token_cache import TokenCache, token_digest
+from species_catalog import SpeciesCatalog, SEARCH_MODES, etag_matches
+from thumbnail_store import ThumbnailStore
 
 # Charger les variables d'environnement
 load_dotenv()
@@ -67,16 +76,59 @@ API_KEY = os.getenv("API_KEY")
 SECRET_KEY = os.getenv("JWT_SECRET_KEY")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
+# Temps maximal accordé au conteneur d'inférence pour répondre à une prédiction (en secondes)
+INFERENCE_TIMEOUT = float(os.getenv("USER_API_INFERENCE_TIMEOUT", "10"))
+# Protocole utilisé pour les prédictions : "http" (JSON) ou "grpc" (binaire, HTTP/2)
+INFERENCE_PROTOCOL = os.getenv("USER_API_INFERENCE_PROTOCOL", "http")
+# Temps accordé par image envoyée sur un flux gRPC de /predict_batch, en plus de USER_API_INFERENCE_TIMEOUT
+INFERENCE_STREAM_TIMEOUT_PER_IMAGE = float(os.getenv("USER_API_INFERENCE_STREAM_TIMEOUT_PER_IMAGE", "0.5"))
+# Client HTTP partagé vers l'inférence : connexions gardées ouvertes, nouvelles tentatives et disjoncteur
+inference_client = UpstreamClient(
+    "inference",
+    "http://inference:5500",
+    timeout=INFERENCE_TIMEOUT,
+    retries=int(os.getenv("USER_API_INFERENCE_RETRIES", "2")),
+    max_connections=int(os.getenv("USER_API_INFERENCE_MAX_CONNECTIONS", "100")),
+    failure_threshold=int(os.getenv("USER_API_CIRCUIT_FAILURE_THRESHOLD", "5")),
+    reset_timeout=float(os.getenv("USER_API_CIRCUIT_RESET_TIMEOUT", "30")),
+)
+# Client gRPC vers l'inférence, avec le même disjoncteur que le client HTTP
+inference_grpc_client = InferenceGrpcClient(
+    os.getenv("USER_API_INFERENCE_GRPC_TARGET", "inference:50051"), breaker=inference_client.breaker
+)
+
+
+# On ferme le canal gRPC et les connexions HTTP vers l'inférence à l'arrêt du container
+@app.on_event("shutdown")
+async def shutdown():
+    await inference_grpc_client.close()
+    await inference_client.close()
+
+
+def unavailable(e):
+    """
+    Convertit l'indisponibilité de l'inférence en réponse 503 avec le délai conseillé avant de réessayer
+    """
+    logging.error(str(e))
+    return HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+
 
 # On attends que le container d'API ajoute les utilisateurs
 while not os.path.exists(users_path):
     time.sleep(1)
 
 
-# On charge les utilisateurs autorisés depuis le fichier JSON
-def load_authorized_users():
-    with open(users_path, "r") as f:
-        return json.load(f)
+# Les utilisateurs autorisés sont gardés en mémoire, le fichier JSON n'est relu que s'il a changé
+# (vérification au plus toutes les USERS_CHECK_INTERVAL secondes)
+user_store = UserStore(users_path, check_interval=float(os.getenv("USERS_CHECK_INTERVAL", "1")))
+# Les tokens déjà vérifiés ne sont pas redécodés tant qu'ils ne sont pas expirés
+token_cache = TokenCache(max_size=int(os.getenv("TOKEN_CACHE_SIZE", "1024")))
+# La liste des espèces est construite une seule fois, puis reconstruite si le fichier CSV change
+species_catalog = SpeciesCatalog(os.path.join(dataset_raw_path, "birds_list.csv"))
+# Miniatures des classes, générées par le container de preprocessing
+thumbnail_store = ThumbnailStore(os.path.join(volume_path, "thumbnails"))
+# Durée pendant laquelle le client peut réutiliser les miniatures sans redemander (en secondes)
+THUMBNAILS_MAX_AGE = int(os.getenv("USER_API_THUMBNAILS_MAX_AGE", "86400"))
 
 
 # ----------------------------------------------------------------------------------------- #
@@ -113,21 +165,37 @@ def verify_token(token: str = Depends(OAuth2PasswordBearer(tokenUrl="/token"))):
     """
     Permet de vérifier le token JWT
     """
+    # Le token n'est jamais écrit dans les logs, seul le début de son empreinte permet de le suivre
+    digest = token_digest(token)
+    users_version = user_store.current_version()
+    # Si la liste des utilisateurs a changé depuis la vérification du token, on vérifie seulement
+    # que l'utilisateur est toujours autorisé
+    cached = token_cache.lookup(digest, users_version, lambda username: username in user_store)
+    if cached is not None:
+        username, authorized = cached
+        if authorized:
+            return username
+        logging.warning(f"Token révoqué pour l'utilisateur: {username}")
+        raise HTTPException(
+            status_code=401, detail="Impossible de valider les identifiants..."
+        )
     try:
         # On tente de décoder le token
-        logging.info(f"Tentative de décodage du token: {token}")
+        logging.info(f"Tentative de décodage du token: {digest[:12]}")
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         # On récupère le nom d'utilisateur dans le payload du token
         username: str = payload.get("sub")
         # On vérifie que l'utilisateur est bien autorisé
-        user = load_authorized_users().get(username)
+        user = user_store.get(username)
         # On renvoie une erreur si l'utilisateur n'est pas valide
         if user is None:
             logging.warning("Le token ne contient pas de 'sub' valide")
             raise HTTPException(
                 status_code=401, detail="Impossible de valider les identifiants..."
             )
-        # Sinon, on retourne le nom d'utilisateur et il n'y a pas d'erreur
+        # Sinon, on garde le token vérifié jusqu'à son expiration et on retourne le nom d'utilisateur
+        # (un token sans expiration n'est pas gardé)
+        token_cache.put(digest, username, payload.get("exp", 0), users_version)
         logging.info(f"Token validé pour l'utilisateur: {username}")
         return username
     except jwt.PyJWTError as e:
@@ -149,20 +217,10 @@ def verify_api_key(api_key: str = Header(..., alias="api-key")):
             status_code=403, detail="Tentative d'accès avec une clé API invalide"
         )
     # Sinon, on retourne la clé
-    logging.info("Clé API validée !")
+    logging.debug("Clé API validée !")
     return api_key
 
 
-def update_authorized_users(users):
-    """
-    Permet de mettre à jour le fichier JSON des utilisateurs autorisés
-    """
-    # On ouvre le fichier contenant les utilisateurs
-    with open(users_path, "w") as f:
-        # On actualise le fichier
-        json.dump(users, f, indent=4)
-
-
 # ----------------------------------------------------------------------------------------- #
 
 
@@ -170,7 +228,7 @@ def update_authorized_users(users):
 @app.post("/token", response_model=Token)
 async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends()):
     # On récupère l'utilisateur dans la liste des utilisateurs
-    user = load_authorized_users().get(form_data.username)
+    user = user_store.get(form_data.username)
     # Si l'utilisateur n'existe pas ou que son mot de passe est faux, on renvoie une erreur
     if user is None or form_data.password != user[1]:
         logging.warning(
@@ -232,9 +290,27 @@ async def get_status(
         )
 
 
+def save_temp_image(file_name, content):
+    """
+    Enregistre une image envoyée sur le volume pour un éventuel /add_image.
+    L'écriture passe par un fichier temporaire pour qu'une image incomplète ne soit jamais déplacée.
+    """
+    file_path = os.path.join(temp_path, file_name)
+    if os.path.exists(file_path):
+        return
+    try:
+        partial_path = f"{file_path}.{os.getpid()}.tmp"
+        with open(partial_path, "wb") as image_file:
+            image_file.write(content)
+        os.replace(partial_path, file_path)
+    except Exception as e:
+        logging.error(f"Erreur lors de l'enregistrement de l'image {file_name}: {str(e)}")
+
+
 # Route pour faire une prédiction
 @app.post("/predict")
 async def predict(
+    background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
     api_key: str = Depends(verify_api_key),
     current_user: str = Depends(verify_token),
@@ -245,16 +321,56 @@ async def predict(
         content = await file.read()
         # On lui donne un nom unique basé sur son hash
         file_name = hashlib.sha256(content).hexdigest() + ".jpg"
-        # On enregistre le fichier sur le volume
-        file_path = os.path.join(temp_path, file_name)
-        with open(file_path, "wb") as image_file:
-            image_file.write(content)
-        # On envoie la requête au conteneur d'inférence avec le nom de l'image qu'il doit récupérer
-        response = requests.get(
-            "http://inference:5500/predict", params={"file_name": file_name}
+        if INFERENCE_PROTOCOL == "grpc":
+            # L'échéance est transmise par gRPC avec le délai de l'appel
+            try:
+                prediction = await inference_grpc_client.predict(content, file_name, timeout=INFERENCE_TIMEOUT)
+            except InferenceUnavailableError as e:
+                raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": e.retry_after})
+            except InferenceTimeoutError:
+                raise HTTPException(status_code=504, detail="Le service d'inférence n'a pas répondu à temps")
+            except InvalidImageError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+            background_tasks.add_task(save_temp_image, file_name, content)
+            return prediction
+        # On envoie directement le contenu de l'image au conteneur d'inférence, sans passer par le volume.
+        # L'échéance permet à l'inférence de refuser tout de suite une requête qu'elle ne pourra pas traiter à temps
+        response = await inference_client.request(
+            "POST",
+            "/predict_bytes",
+            params={"file_name": file_name},
+            content=content,
+            headers={
+                "Content-Type": "application/octet-stream",
+                "X-Request-Deadline": str(time.time() + INFERENCE_TIMEOUT),
+            },
         )
+        # L'image n'est enregistrée sur le volume (pour /add_image) qu'après l'envoi de la réponse
+        background_tasks.add_task(save_temp_image, file_name, content)
+        # En cas de surcharge, on transmet le refus et le délai conseillé avant de réessayer
+        if response.status_code == 503:
+            raise HTTPException(
+                status_code=503,
+                detail=response.json().get("detail", "Service d'inférence surchargé"),
+                headers={"Retry-After": response.headers.get("Retry-After", "1")},
+            )
+        # Les autres erreurs (image illisible : 400) sont transmises avec leur code
+        if response.status_code != 200:
+            raise HTTPException(
+                status_code=response.status_code,
+                detail=response.json().get("detail", "Erreur du service d'inférence"),
+            )
         return response.json()
 
+    except HTTPException:
+        raise
+    except UpstreamUnavailableError as e:
+        raise unavailable(e)
+    except httpx.TimeoutException:
+        logging.error("Délai dépassé lors de la prédiction")
+        raise HTTPException(
+            status_code=504, detail="Le service d'inférence n'a pas répondu à temps"
+        )
     except Exception as e:
         logging.error(f"Erreur lors de la prédiction: {str(e)}")
         raise HTTPException(
@@ -262,11 +378,149 @@ async def predict(
         )
 
 
-# Route pour obtenir la liste des espèces
+# Route pour faire une prédiction et récupérer, pour chaque espèce prédite,
+# les noms des images d'entraînement les plus proches visuellement de l'image envoyée
+@app.post("/predict_similar")
+async def predict_similar(
+    file: UploadFile = File(...),
+    k: int = 3,
+    api_key: str = Depends(verify_api_key),
+    current_user: str = Depends(verify_token),
+):
+    logging.info(f"Requête /predict_similar reçue de l'utilisateur: {current_user}")
+    try:
+        content = await file.read()
+        response = await inference_client.request(
+            "POST",
+            "/similar",
+            params={"k": k},
+            content=content,
+            headers={"Content-Type": "application/octet-stream"},
+        )
+        if response.status_code != 200:
+            raise HTTPException(
+                status_code=response.status_code,
+                detail=response.json().get("detail", "Erreur du service d'inférence"),
+                headers={"Retry-After": response.headers["Retry-After"]} if "Retry-After" in response.headers else None,
+            )
+        return response.json()
+
+    except HTTPException:
+        raise
+    except UpstreamUnavailableError as e:
+        raise unavailable(e)
+    except Exception as e:
+        logging.error(f"Erreur lors de la recherche d'images similaires: {str(e)}")
+        raise HTTPException(
+            status_code=500, detail=f"Erreur lors de la recherche d'images similaires: {str(e)}"
+        )
+
+
+# Route pour faire une prédiction sur plusieurs images en un seul appel.
+# Les images peuvent être envoyées directement ou désignées par leur nom (hash) si elles
+# sont déjà présentes sur le volume. Les résultats sont renvoyés au fil de l'eau au format NDJSON.
+@app.post("/predict_batch")
+async def predict_batch(
+    files: List[UploadFile] = File(None),
+    file_names: List[str] = Form(None),
+    api_key: str = Depends(verify_api_key),
+    current_user: str = Depends(verify_token),
+):
+    logging.info(f"Requête /predict_batch reçue de l'utilisateur: {current_user}")
+    try:
+        names = list(file_names or [])
+        uploads = []
+        for file in files or []:
+            # On lit chaque fichier envoyé et on lui donne un nom unique basé sur son hash
+            content = await file.read()
+            file_name = hashlib.sha256(content).hexdigest() + ".jpg"
+            uploads.append((file_name, content))
+        if not names and not uploads:
+            raise HTTPException(status_code=400, detail="Aucune image à prédire.")
+
+        if INFERENCE_PROTOCOL == "grpc" and not names:
+            # Les images envoyées sont transmises sur un seul flux gRPC, sans passer par le volume.
+            # L'échéance du flux dépend du nombre d'images
+            predictions = inference_grpc_client.predict_stream(
+                uploads, timeout=INFERENCE_TIMEOUT + len(uploads) * INFERENCE_STREAM_TIMEOUT_PER_IMAGE
+            )
+            # La première réponse est attendue avant d'envoyer l'en-tête : un refus ou un délai dépassé
+            # donne alors le bon code HTTP
+            try:
+                first_prediction = await predictions.__anext__()
+            except InferenceUnavailableError as e:
+                raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": e.retry_after})
+            except InferenceTimeoutError:
+                raise HTTPException(status_code=504, detail="Le service d'inférence n'a pas répondu à temps")
+
+            async def stream_grpc_predictions():
+                yield json.dumps(first_prediction) + "\n"
+                try:
+                    async for prediction in predictions:
+                        yield json.dumps(prediction) + "\n"
+                except (InferenceUnavailableError, InferenceTimeoutError, UpstreamUnavailableError) as e:
+                    # L'en-tête est déjà envoyé : l'erreur est signalée par une dernière ligne
+                    logging.error(f"Flux de prédictions interrompu : {e}")
+                    yield json.dumps({"error": f"Flux de prédictions interrompu : {e}"}) + "\n"
+                for file_name, content in uploads:
+                    save_temp_image(file_name, content)
+
+            return StreamingResponse(stream_grpc_predictions(), media_type="application/x-ndjson")
+
+        for file_name, content in uploads:
+            # On enregistre le fichier sur le volume
+            save_temp_image(file_name, content)
+            names.append(file_name)
+        # On transmet la liste au conteneur d'inférence et on relaie sa réponse sans la stocker
+        # Le délai s'applique entre deux lignes reçues, pas à la durée totale du batch
+        response = await inference_client.stream("POST", "/predict_batch", json=names)
+        if response.status_code != 200:
+            await response.aread()
+            await response.aclose()
+            raise HTTPException(
+                status_code=response.status_code,
+                detail=response.json().get("detail", "Erreur du service d'inférence"),
+            )
+
+        async def stream_predictions():
+            try:
+                async for line in response.aiter_lines():
+                    if line:
+                        yield line + "\n"
+            finally:
+                await response.aclose()
+
+        return StreamingResponse(stream_predictions(), media_type="application/x-ndjson")
+
+    except HTTPException:
+        raise
+    except UpstreamUnavailableError as e:
+        raise unavailable(e)
+    except Exception as e:
+        logging.error(f"Erreur lors de la prédiction par batch: {str(e)}")
+        raise HTTPException(
+            status_code=500, detail=f"Erreur lors de la prédiction par batch: {str(e)}"
+        )
+
+
+# Route pour obtenir la liste des espèces, ou les espèces correspondant à une recherche.
+# Sans paramètre, la liste complète est renvoyée. Avec q, seuls les noms anglais commençant par q
+# (mode=prefix) ou contenant q (mode=contains) sont renvoyés, par pages de limit noms à partir de offset.
+# La réponse porte un ETag : un client qui le renvoie dans If-None-Match reçoit 304 si rien n'a changé.
 @app.get("/get_species")
 async def get_species(
-    api_key: str = Depends(verify_api_key), username: str = Depends(verify_token)
+    q: str = "",
+    mode: str = "prefix",
+    offset: int = 0,
+    limit: Optional[int] = None,
+    if_none_match: Optional[str] = Header(None, alias="If-None-Match"),
+    api_key: str = Depends(verify_api_key),
+    username: str = Depends(verify_token),
 ):
+    if mode not in SEARCH_MODES:
+        raise HTTPException(status_code=400, detail=f"Mode de recherche inconnu, modes possibles : {SEARCH_MODES}")
+    if offset < 0 or (limit is not None and limit < 1):
+        raise HTTPException(status_code=400, detail="offset doit être positif et limit supérieur à 0")
     try:
         # On vérifie que le dataset n'est pas en téléchargement
         # (état 2 du container de preprocessing)
@@ -274,10 +528,15 @@ async def get_species(
         with open(preprocessing_state_path, "r") as file:
             preprocessing_state = file.read()
         if preprocessing_state != "2":
-            # On récupère la liste des espèces avec uniquement le nom anglais
-            df = pd.read_csv(os.path.join(dataset_raw_path, "birds_list.csv"))
-            species_list = sorted(df["English"].tolist())
-            return {"species": species_list}
+            # Le catalogue n'est reconstruit que si la liste des espèces a changé
+            species_catalog.refresh()
+            etag = species_catalog.etag(q.strip().casefold(), mode, offset, limit)
+            headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+            if etag_matches(etag, if_none_match):
+                return Response(status_code=304, headers=headers)
+            return Response(
+                species_catalog.page(q, mode, offset, limit), media_type="application/json", headers=headers
+            )
         else:
             return "La liste n'est pas encore présente, merci de patienter..."
     except Exception as e:
@@ -323,6 +582,44 @@ async def get_class_image(
         )
 
 
+# Route pour récupérer en une seule réponse les miniatures de plusieurs espèces
+# (par exemple les classes prédites), dans l'ordre demandé.
+# Les miniatures sont encodées en base64, null si une espèce n'a pas encore de miniature.
+@app.get("/get_class_thumbnails")
+async def get_class_thumbnails(
+    classes: List[str] = Query(...),
+    if_none_match: Optional[str] = Header(None, alias="If-None-Match"),
+    api_key: str = Depends(verify_api_key),
+    username: str = Depends(verify_token),
+):
+    if len(classes) > 20:
+        raise HTTPException(status_code=400, detail="20 espèces au maximum par requête")
+    try:
+        # L'index n'est relu que si le container de preprocessing l'a mis à jour
+        thumbnail_store.refresh()
+        etag = thumbnail_store.etag(classes)
+        headers = {"ETag": etag, "Cache-Control": f"private, max-age={THUMBNAILS_MAX_AGE}"}
+        if etag_matches(etag, if_none_match):
+            return Response(status_code=304, headers=headers)
+        thumbnails = []
+        for classe in classes:
+            thumbnail = thumbnail_store.get(classe)
+            thumbnails.append({
+                "classe": classe,
+                "image": base64.b64encode(thumbnail).decode() if thumbnail is not None else None,
+            })
+        return Response(
+            orjson.dumps({"media_type": thumbnail_store.media_type, "thumbnails": thumbnails}),
+            media_type="application/json",
+            headers=headers,
+        )
+    except Exception as e:
+        logging.error(f"Erreur lors de la récupération des miniatures: {str(e)}")
+        raise HTTPException(
+            status_code=500, detail=f"Erreur lors de la récupération des miniatures: {str(e)}"
+        )
+
+
 # Route pour ajouter une image
 @app.post("/add_image")
 async def add_image(
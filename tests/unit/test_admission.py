@@ -0,0 +1,78 @@
+import os
+import sys
+import time
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "..", "docker", "inference"))
+
+from admission import AdmissionController, AdmissionRejectedError, deadline_from_header  # noqa: E402
+
+
+class TestAdmissionController(unittest.TestCase):
+    def test_queue_full_is_rejected(self):
+        controller = AdmissionController(max_pending=2)
+        controller.admit()
+        controller.admit()
+        with self.assertRaises(AdmissionRejectedError) as context:
+            controller.admit()
+        self.assertEqual(context.exception.reason, "queue_full")
+        self.assertGreaterEqual(context.exception.retry_after, 1)
+        self.assertEqual(controller.stats()["rejected"]["queue_full"], 1)
+        self.assertEqual(controller.stats()["pending"], 2)
+
+    def test_release_frees_a_slot(self):
+        controller = AdmissionController(max_pending=1)
+        controller.admit()
+        controller.release()
+        controller.admit()
+        self.assertEqual(controller.stats()["admitted"], 2)
+        self.assertEqual(controller.stats()["pending"], 1)
+
+    def test_deadline_shorter_than_latency_is_rejected(self):
+        controller = AdmissionController(max_pending=10, smoothing=1.0)
+        controller.admit()
+        controller.release(duration=0.5)
+        # Une requête est en cours : l'échéance est comparée à la latence estimée
+        controller.admit()
+        with self.assertRaises(AdmissionRejectedError) as context:
+            controller.admit(deadline=time.monotonic() + 0.1)
+        self.assertEqual(context.exception.reason, "deadline")
+        self.assertEqual(controller.stats()["rejected"]["deadline"], 1)
+        # Une échéance assez lointaine reste acceptée
+        controller.admit(deadline=time.monotonic() + 5.0)
+        self.assertEqual(controller.stats()["pending"], 2)
+
+    def test_recovers_after_slow_burst(self):
+        controller = AdmissionController(max_pending=10, smoothing=0.2)
+        # Rafale de requêtes lentes : la latence estimée dépasse l'échéance de 10s envoyée par l'API
+        for _ in range(8):
+            controller.admit()
+            controller.release(duration=14.0)
+        self.assertGreater(controller.stats()["estimated_latency"], 10.0)
+        # Service au repos : la requête est admise malgré l'estimation, et sa durée fait redescendre l'estimation
+        for _ in range(20):
+            controller.admit(deadline=time.monotonic() + 10.0)
+            controller.release(duration=0.1)
+        self.assertLess(controller.stats()["estimated_latency"], 1.0)
+        self.assertEqual(controller.stats()["rejected"]["deadline"], 0)
+        # Avec une requête en cours, l'estimation redevenue basse laisse passer l'échéance de 10s
+        controller.admit()
+        controller.admit(deadline=time.monotonic() + 10.0)
+        self.assertEqual(controller.stats()["pending"], 2)
+
+    def test_latency_is_smoothed(self):
+        controller = AdmissionController(smoothing=0.5)
+        for duration in (1.0, 1.0):
+            controller.admit()
+            controller.release(duration=duration)
+        self.assertAlmostEqual(controller.stats()["estimated_latency"], 0.75)
+
+    def test_deadline_from_header(self):
+        self.assertIsNone(deadline_from_header(None))
+        self.assertIsNone(deadline_from_header("pas un nombre"))
+        deadline = deadline_from_header(str(time.time() + 2.0))
+        self.assertAlmostEqual(deadline - time.monotonic(), 2.0, delta=0.1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,67 @@
+import os
+import sys
+import time
+import threading
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "..", "docker", "inference"))
+
+from admission import DeadlineExceededError  # noqa: E402
+from batcher import MicroBatcher, BatcherFullError  # noqa: E402
+
+
+class TestMicroBatcher(unittest.TestCase):
+    def test_concurrent_items_share_a_batch(self):
+        batches = []
+
+        def predict(items):
+            batches.append(list(items))
+            return [item * 2 for item in items]
+
+        batcher = MicroBatcher(predict, max_batch_size=4, max_wait_ms=200)
+        futures = [batcher.submit(i) for i in range(4)]
+        self.assertEqual([future.result(timeout=2) for future in futures], [0, 2, 4, 6])
+        self.assertEqual(batches, [[0, 1, 2, 3]])
+        self.assertEqual(batcher.stats()["occupancy"], {4: 1})
+
+    def test_batch_error_is_sent_to_every_caller(self):
+        def predict(items):
+            raise RuntimeError("échec du modèle")
+
+        batcher = MicroBatcher(predict, max_batch_size=2, max_wait_ms=50)
+        futures = [batcher.submit(i) for i in range(2)]
+        for future in futures:
+            with self.assertRaises(RuntimeError):
+                future.result(timeout=2)
+
+    def test_expired_items_are_not_predicted(self):
+        predicted = []
+        batcher = MicroBatcher(lambda items: predicted.extend(items) or items, max_batch_size=2, max_wait_ms=50)
+        future = batcher.submit("en retard", deadline=time.monotonic() - 1)
+        with self.assertRaises(DeadlineExceededError):
+            future.result(timeout=2)
+        self.assertEqual(predicted, [])
+        self.assertEqual(batcher.stats()["expired"], 1)
+
+    def test_full_queue_is_rejected(self):
+        release = threading.Event()
+
+        def predict(items):
+            release.wait(2)
+            return items
+
+        batcher = MicroBatcher(predict, max_batch_size=1, max_wait_ms=0, max_queue_size=1)
+        first = batcher.submit(1)
+        # On attend que le premier batch soit en cours pour que la file soit vide
+        while batcher.stats()["queue_depth"]:
+            time.sleep(0.001)
+        batcher.submit(2)
+        with self.assertRaises(BatcherFullError):
+            batcher.submit(3)
+        release.set()
+        self.assertEqual(first.result(timeout=2), 1)
+        self.assertEqual(batcher.stats()["rejected"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,76 @@
+import os
+import sys
+import json
+import shutil
+import tempfile
+import unittest
+import subprocess
+import importlib.util
+
+inference_folder = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "docker", "inference")
+script_path = os.path.join(inference_folder, "bulk_classify.py")
+dependencies = ("tensorflow", "pyarrow", "PIL")
+
+
+@unittest.skipUnless(
+    all(importlib.util.find_spec(name) for name in dependencies), "tensorflow, pyarrow et Pillow sont nécessaires"
+)
+class TestBulkClassify(unittest.TestCase):
+    def setUp(self):
+        from PIL import Image
+        import tensorflow as tf
+
+        self.folder = tempfile.mkdtemp()
+        model_path = os.path.join(self.folder, "volume_data", "mlruns", "157975935045122495", "run", "artifacts")
+        model_path = os.path.join(model_path, "model")
+        os.makedirs(model_path)
+        # Comme EfficientNetB0 créé sans input_shape, le modèle n'a pas de taille d'entrée fixe
+        inputs = tf.keras.Input(shape=(None, None, 3))
+        outputs = tf.keras.layers.Dense(3, activation="softmax")(tf.keras.layers.GlobalAveragePooling2D()(inputs))
+        tf.keras.Model(inputs, outputs).save(os.path.join(model_path, "saved_model.h5"))
+        with open(os.path.join(model_path, "classes.json"), "w") as file:
+            json.dump({"0": "Moineau", "1": "Mésange", "2": "Rouge-gorge"}, file)
+
+        self.input_folder = os.path.join(self.folder, "images")
+        os.makedirs(os.path.join(self.input_folder, "jardin"))
+        for name, color, size in (("1.jpg", "red", (300, 200)), ("jardin/2.png", "blue", (64, 96))):
+            Image.new("RGB", size, color).save(os.path.join(self.input_folder, name))
+        with open(os.path.join(self.input_folder, "3.jpg"), "wb") as file:
+            file.write(b"pas une image")
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def run_cli(self, output_folder):
+        return subprocess.run(
+            [sys.executable, script_path, self.input_folder, output_folder, "--run-id", "run", "--top-k", "2"],
+            cwd=self.folder,
+            capture_output=True,
+            text=True,
+            timeout=300,
+        )
+
+    def test_classifies_folder_and_resumes(self):
+        import pyarrow.parquet as pq
+
+        output_folder = os.path.join(self.folder, "resultats")
+        result = self.run_cli(output_folder)
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertIn("3 images classées", result.stdout)
+
+        rows = {row["path"]: row for row in pq.read_table(output_folder).to_pylist()}
+        self.assertEqual(set(rows), {"1.jpg", os.path.join("jardin", "2.png"), "3.jpg"})
+        self.assertIsNone(rows["1.jpg"]["error"])
+        self.assertIn(rows["1.jpg"]["class_1"], ("Moineau", "Mésange", "Rouge-gorge"))
+        self.assertIsNotNone(rows["1.jpg"]["score_2"])
+        self.assertIsNotNone(rows["3.jpg"]["error"])
+        self.assertIsNone(rows["3.jpg"]["class_1"])
+
+        # Les images déjà classées ne sont pas reprises
+        result = self.run_cli(output_folder)
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertIn("0 images classées", result.stdout)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,70 @@
+import os
+import sys
+import shutil
+import tempfile
+import threading
+import unittest
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "..", "docker", "inference"))
+
+from embedding_index import EmbeddingIndex  # noqa: E402
+
+
+def fake_embeddings(paths):
+    # Un vecteur différent par image, dérivé du nom du fichier
+    return np.stack([np.eye(4)[int(os.path.basename(path)[0]) % 4] for path in paths])
+
+
+class TestEmbeddingIndex(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.images = [
+            ("a/0.jpg", "/train/a/0.jpg", 0),
+            ("a/1.jpg", "/train/a/1.jpg", 0),
+            ("b/2.jpg", "/train/b/2.jpg", 1),
+        ]
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def test_update_is_incremental_and_persisted(self):
+        index = EmbeddingIndex(self.folder, dim=4)
+        self.assertEqual(index.update(self.images, fake_embeddings), 3)
+        self.assertEqual(index.update(self.images, fake_embeddings), 0)
+        reloaded = EmbeddingIndex(self.folder, dim=4)
+        self.assertEqual(len(reloaded), 3)
+
+    def test_search_by_class_ignores_removed_images(self):
+        index = EmbeddingIndex(self.folder, dim=4)
+        index.update(self.images, fake_embeddings)
+        results = index.search(np.eye(4)[1], [0, 1], k=2)
+        self.assertEqual(results[0][0][0], "a/1.jpg")
+        self.assertEqual([path for path, _ in results[1]], ["b/2.jpg"])
+        index.update(self.images[1:], fake_embeddings)
+        results = index.search(np.eye(4)[1], [0], k=2)
+        self.assertEqual([path for path, _ in results[0]], ["a/1.jpg"])
+
+    def test_concurrent_update_is_skipped(self):
+        index = EmbeddingIndex(self.folder, dim=4)
+        started = threading.Event()
+        release = threading.Event()
+
+        def slow_embeddings(paths):
+            started.set()
+            release.wait(2)
+            return fake_embeddings(paths)
+
+        thread = threading.Thread(target=index.update, args=(self.images, slow_embeddings))
+        thread.start()
+        started.wait(2)
+        self.assertTrue(index.updating)
+        self.assertIsNone(index.update(self.images, fake_embeddings))
+        release.set()
+        thread.join()
+        self.assertFalse(index.updating)
+        self.assertEqual(len(index), 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,63 @@
+import os
+import sys
+import asyncio
+import threading
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "..", "docker", "inference"))
+
+from executor import BoundedExecutor, ExecutorFullError  # noqa: E402
+
+
+class TestBoundedExecutor(unittest.TestCase):
+    def setUp(self):
+        self.executor = BoundedExecutor(max_workers=1, max_pending=2, name="test")
+
+    def tearDown(self):
+        self.executor._pool.shutdown(wait=True)
+
+    def test_rejects_when_full(self):
+        gate = threading.Event()
+        first = self.executor.submit(gate.wait)
+        second = self.executor.submit(lambda: 2)
+        with self.assertRaises(ExecutorFullError):
+            self.executor.submit(lambda: 3)
+        gate.set()
+        first.result(timeout=5)
+        self.assertEqual(second.result(timeout=5), 2)
+        self.assertEqual(self.executor.stats()["rejected"], 1)
+
+    def test_cancel_while_queued_releases_slot(self):
+        gate = threading.Event()
+
+        async def scenario():
+            blocker = asyncio.ensure_future(self.executor.run(gate.wait))
+            queued = asyncio.ensure_future(self.executor.run(lambda: "jamais"))
+            await asyncio.sleep(0.05)
+            # La tâche en attente est annulée avant d'avoir démarré
+            queued.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await queued
+            gate.set()
+            await blocker
+            # Les deux places sont de nouveau disponibles
+            return await asyncio.gather(self.executor.run(lambda: 1), self.executor.run(lambda: 2))
+
+        self.assertEqual(asyncio.run(scenario()), [1, 2])
+        stats = self.executor.stats()
+        self.assertEqual(stats["queue_depth"], 0)
+        self.assertEqual(stats["running"], 0)
+        self.assertEqual(stats["cancelled"], 1)
+
+    def test_exception_releases_slot(self):
+        def fail():
+            raise ValueError("erreur")
+
+        for _ in range(4):
+            with self.assertRaises(ValueError):
+                self.executor.submit(fail).result(timeout=5)
+        self.assertEqual(self.executor.submit(lambda: "ok").result(timeout=5), "ok")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,119 @@
+import os
+import sys
+import socket
+import asyncio
+import unittest
+import importlib.util
+
+docker_folder = os.path.join(os.path.dirname(__file__), "..", "..", "docker")
+sys.path.insert(0, os.path.join(docker_folder, "inference"))
+sys.path.insert(0, os.path.join(docker_folder, "user_api"))
+sys.path.insert(0, os.path.join(docker_folder, "common"))
+
+
+@unittest.skipUnless(
+    all(importlib.util.find_spec(name) for name in ("grpc", "numpy", "httpx")),
+    "grpcio, numpy et httpx sont nécessaires",
+)
+class TestGrpcStream(unittest.TestCase):
+    def run_with_server(self, predict_fn, scenario, max_in_flight=4):
+        from grpc_server import create_server
+        from inference_grpc import InferenceGrpcClient
+
+        async def main():
+            server = create_server(predict_fn, 0, lambda remaining: None, max_in_flight=max_in_flight)
+            port = server.add_insecure_port("127.0.0.1:0")
+            await server.start()
+            client = InferenceGrpcClient(f"127.0.0.1:{port}")
+            try:
+                return await scenario(client)
+            finally:
+                await client.close()
+                await server.stop(grace=None)
+
+        return asyncio.run(main())
+
+    def test_stream_limits_images_in_flight(self):
+        state = {"running": 0, "max_running": 0}
+
+        async def predict_fn(content, file_name, deadline):
+            state["running"] += 1
+            state["max_running"] = max(state["max_running"], state["running"])
+            await asyncio.sleep(0.005)
+            state["running"] -= 1
+            return {"filename": file_name, "scores": [1.0]}
+
+        async def scenario(client):
+            images = [(f"{i}.jpg", b"image") for i in range(40)]
+            return [result["filename"] async for result in client.predict_stream(images, timeout=10)]
+
+        names = self.run_with_server(predict_fn, scenario)
+        self.assertEqual(names, [f"{i}.jpg" for i in range(40)])
+        self.assertLessEqual(state["max_running"], 4)
+
+    def test_deadline_exceeded_is_translated(self):
+        from inference_grpc import InferenceTimeoutError
+
+        async def predict_fn(content, file_name, deadline):
+            await asyncio.sleep(1)
+            return {"filename": file_name, "scores": []}
+
+        async def scenario(client):
+            with self.assertRaises(InferenceTimeoutError):
+                await client.predict(b"image", "lente.jpg", timeout=0.1)
+            with self.assertRaises(InferenceTimeoutError):
+                async for _ in client.predict_stream([("lente.jpg", b"image")], timeout=0.1):
+                    pass
+
+        self.run_with_server(predict_fn, scenario)
+
+    def test_unavailable_service_opens_the_shared_circuit(self):
+        from http_client import CircuitBreaker, UpstreamUnavailableError
+        from inference_grpc import InferenceGrpcClient
+
+        # Port sur lequel aucun serveur n'écoute
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            port = sock.getsockname()[1]
+
+        async def main():
+            breaker = CircuitBreaker("inference", failure_threshold=2, reset_timeout=30)
+            client = InferenceGrpcClient(f"127.0.0.1:{port}", breaker=breaker)
+            try:
+                with self.assertRaises(UpstreamUnavailableError):
+                    await client.predict(b"image", "image.jpg", timeout=5)
+                with self.assertRaises(UpstreamUnavailableError):
+                    async for _ in client.predict_stream([("image.jpg", b"image")], timeout=5):
+                        pass
+                self.assertEqual(breaker.state, "open")
+                # Le disjoncteur ouvert refuse sans contacter le service, comme pour le client HTTP
+                with self.assertRaises(UpstreamUnavailableError):
+                    await client.predict(b"image", "image.jpg", timeout=5)
+                self.assertEqual(breaker.rejected, 1)
+            finally:
+                await client.close()
+
+        asyncio.run(main())
+
+    def test_overload_does_not_open_the_circuit(self):
+        from inference_grpc import InferenceUnavailableError
+
+        class Overloaded(Exception):
+            # Même attributs que l'HTTPException levée par l'inférence en cas de surcharge
+            status_code = 503
+            headers = {"Retry-After": "2"}
+
+        async def predict_fn(content, file_name, deadline):
+            raise Overloaded("Service surchargé")
+
+        async def scenario(client):
+            for _ in range(6):
+                with self.assertRaises(InferenceUnavailableError):
+                    await client.predict(b"image", "image.jpg", timeout=5)
+            self.assertEqual(client.breaker.state, "closed")
+
+        self.run_with_server(predict_fn, scenario)
+
+
+if __name__ == "__main__":
+    unittest.main()
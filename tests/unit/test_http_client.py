@@ -0,0 +1,94 @@
+import os
+import sys
+import asyncio
+import unittest
+import importlib.util
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "..", "docker", "common"))
+
+if importlib.util.find_spec("httpx"):
+    import httpx
+    from http_client import UpstreamClient, UpstreamUnavailableError
+
+
+@unittest.skipUnless(importlib.util.find_spec("httpx"), "httpx est nécessaire")
+class TestUpstreamClient(unittest.TestCase):
+    def make_client(self, handler, failure_threshold=2, reset_timeout=0):
+        client = UpstreamClient(
+            "test", "http://service", retries=0, failure_threshold=failure_threshold, reset_timeout=reset_timeout
+        )
+
+        client._client = httpx.AsyncClient(base_url="http://service", transport=httpx.MockTransport(handler))
+        return client
+
+    def test_client_errors_do_not_open_the_circuit(self):
+        async def handler(request):
+            return httpx.Response(int(request.url.params["status"]))
+
+        async def scenario():
+            client = self.make_client(handler, reset_timeout=30)
+            # Les erreurs de la requête et les refus par surcharge ne sont pas des pannes
+            for status in (400, 500, 503, 400, 500, 503):
+                await client.request("GET", "/", params={"status": status})
+            self.assertEqual(client.breaker.state, "closed")
+            for _ in range(2):
+                await client.request("GET", "/", params={"status": 504})
+            self.assertEqual(client.breaker.state, "open")
+
+        asyncio.run(scenario())
+
+    def test_transport_errors_open_the_circuit(self):
+        async def handler(request):
+            raise httpx.ConnectError("connexion refusée", request=request)
+
+        async def scenario():
+            client = self.make_client(handler, reset_timeout=30)
+            for _ in range(2):
+                with self.assertRaises(UpstreamUnavailableError):
+                    await client.request("GET", "/")
+            self.assertEqual(client.breaker.state, "open")
+            # Le disjoncteur ouvert refuse sans contacter le service
+            with self.assertRaises(UpstreamUnavailableError):
+                await client.request("GET", "/")
+            self.assertEqual(client.stats()["rejected_by_circuit"], 1)
+
+        asyncio.run(scenario())
+
+    def test_cancelled_trial_releases_the_half_open_circuit(self):
+        calls = {"count": 0}
+
+        async def handler(request):
+            calls["count"] += 1
+            if calls["count"] <= 2:
+                raise httpx.ConnectError("connexion refusée", request=request)
+            if calls["count"] == 3:
+                await asyncio.sleep(10)
+            if calls["count"] == 4:
+                raise RuntimeError("erreur inattendue")
+            return httpx.Response(200)
+
+        async def scenario():
+            client = self.make_client(handler)
+            for _ in range(2):
+                with self.assertRaises(UpstreamUnavailableError):
+                    await client.request("GET", "/")
+            # Essai annulé pendant l'attente de la réponse
+            trial = asyncio.ensure_future(client.request("GET", "/"))
+            await asyncio.sleep(0.01)
+            self.assertEqual(client.breaker.state, "half_open")
+            trial.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await trial
+            # Essai interrompu par une erreur qui n'est pas une erreur de transport
+            with self.assertRaises(RuntimeError):
+                await client.request("GET", "/")
+            # Le disjoncteur accepte encore un essai, qui le referme
+            response = await client.request("GET", "/")
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(client.breaker.state, "closed")
+
+        asyncio.run(scenario())
+
+
+if __name__ == "__main__":
+    unittest.main()
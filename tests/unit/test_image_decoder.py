@@ -0,0 +1,36 @@
+import io
+import os
+import sys
+import unittest
+import importlib.util
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "..", "docker", "inference"))
+
+if importlib.util.find_spec("PIL") and importlib.util.find_spec("numpy"):
+    from PIL import Image
+    from image_decoder import ImageDecoder, ImageDecodeError
+
+
+@unittest.skipUnless(importlib.util.find_spec("PIL") and importlib.util.find_spec("numpy"), "Pillow est nécessaire")
+class TestImageDecoder(unittest.TestCase):
+    def encode(self, size, image_format="JPEG"):
+        buffer = io.BytesIO()
+        Image.new("RGB", size, "red").save(buffer, format=image_format)
+        return buffer.getvalue()
+
+    def test_decode_resizes_to_target_size(self):
+        decoder = ImageDecoder(target_size=(224, 224))
+        for content in (self.encode((640, 480)), self.encode((100, 50), "PNG")):
+            image = decoder.decode(content)
+            self.assertEqual(image.shape, (224, 224, 3))
+            self.assertEqual(image.dtype.name, "float32")
+
+    def test_unreadable_content_raises_decode_error(self):
+        decoder = ImageDecoder()
+        for content in (b"pas une image", self.encode((640, 480))[:200]):
+            with self.assertRaises(ImageDecodeError):
+                decoder.decode(content)
+
+
+if __name__ == "__main__":
+    unittest.main()
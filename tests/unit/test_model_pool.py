@@ -0,0 +1,49 @@
+import os
+import sys
+import unittest
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "..", "docker", "inference"))
+
+from model_pool import ModelPool  # noqa: E402
+
+
+def fake_classifier(run_id):
+    return SimpleNamespace(run_id=run_id, num_params=1000)
+
+
+class TestModelPool(unittest.TestCase):
+    def make_pool(self):
+        # Production B, précédent A et shadow S épinglés, comme dans swap_classifier
+        pool = ModelPool(fake_classifier, max_models=3)
+        for run_id in ("A", "B", "S"):
+            pool.get(run_id)
+        pool.pin("B", "A", "S")
+        return pool
+
+    def test_get_loads_once_and_evicts_least_recently_used(self):
+        pool = ModelPool(fake_classifier, max_models=2)
+        pool.get("A")
+        pool.get("B")
+        pool.get("A")
+        pool.get("C")
+        self.assertEqual(pool.stats()["resident"], ["A", "C"])
+        self.assertEqual(pool.stats()["loads"], 3)
+
+    def test_swap_with_shadow_keeps_new_production_model(self):
+        pool = self.make_pool()
+        # Promotion de D : B devient le modèle précédent, le shadow S reste actif
+        pool.pin("D", "B", "S")
+        pool.add(fake_classifier("D"))
+        self.assertEqual(sorted(pool.stats()["resident"]), ["B", "D", "S"])
+
+    def test_added_model_is_not_evicted_before_being_pinned(self):
+        pool = self.make_pool()
+        pool.add(fake_classifier("D"))
+        self.assertIn("D", pool.stats()["resident"])
+        pool.pin("D", "B", "S")
+        self.assertEqual(sorted(pool.stats()["resident"]), ["B", "D", "S"])
+
+
+if __name__ == "__main__":
+    unittest.main()
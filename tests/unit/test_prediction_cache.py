@@ -0,0 +1,60 @@
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "..", "docker", "inference"))
+
+from prediction_cache import PredictionCache  # noqa: E402
+
+
+class TestPredictionCache(unittest.TestCase):
+    def test_hit_and_miss(self):
+        cache = PredictionCache(max_entries=4, ttl=0)
+        cache.put("hash", "run1", ["a", "b"], [0.9, 0.1])
+        self.assertEqual(cache.get("hash", "run1"), (["a", "b"], [0.9, 0.1]))
+        # Une prédiction d'un autre modèle n'est pas réutilisée
+        self.assertIsNone(cache.get("hash", "run2"))
+        self.assertEqual((cache.stats()["hits"], cache.stats()["misses"]), (1, 1))
+
+    def test_lru_eviction(self):
+        cache = PredictionCache(max_entries=2, ttl=0)
+        cache.put("h1", "run", ["a"], [1.0])
+        cache.put("h2", "run", ["b"], [1.0])
+        # h1 devient la plus récemment utilisée, h2 est donc évincée
+        cache.get("h1", "run")
+        cache.put("h3", "run", ["c"], [1.0])
+        self.assertIsNotNone(cache.get("h1", "run"))
+        self.assertIsNone(cache.get("h2", "run"))
+        self.assertIsNotNone(cache.get("h3", "run"))
+        self.assertEqual(cache.stats()["evictions"], 1)
+
+    def test_ttl_expiration(self):
+        cache = PredictionCache(max_entries=4, ttl=10)
+        with mock.patch("prediction_cache.time.time", return_value=1000.0):
+            cache.put("hash", "run", ["a"], [1.0])
+        with mock.patch("prediction_cache.time.time", return_value=1005.0):
+            self.assertIsNotNone(cache.get("hash", "run"))
+        with mock.patch("prediction_cache.time.time", return_value=1011.0):
+            self.assertIsNone(cache.get("hash", "run"))
+        self.assertEqual(cache.stats()["entries"], 0)
+
+    def test_persistence(self):
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, "cache.json")
+            cache = PredictionCache(max_entries=4, ttl=3600, persist_path=path)
+            cache.put("hash", "run", ["a"], [0.5])
+            cache.save()
+            reloaded = PredictionCache(max_entries=4, ttl=3600, persist_path=path)
+            self.assertEqual(reloaded.get("hash", "run"), (["a"], [0.5]))
+
+    def test_invalidate(self):
+        cache = PredictionCache(max_entries=4, ttl=0)
+        cache.put("hash", "run", ["a"], [1.0])
+        cache.invalidate()
+        self.assertIsNone(cache.get("hash", "run"))
+
+
+if __name__ == "__main__":
+    unittest.main()
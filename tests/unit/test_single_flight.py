@@ -0,0 +1,47 @@
+import os
+import sys
+import asyncio
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "..", "docker", "inference"))
+
+from single_flight import SingleFlight  # noqa: E402
+
+
+class TestSingleFlight(unittest.TestCase):
+    def test_concurrent_calls_share_result(self):
+        single_flight = SingleFlight()
+        calls = []
+
+        async def compute():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return "résultat"
+
+        async def scenario():
+            return await asyncio.gather(*(single_flight.do("clé", compute) for _ in range(5)))
+
+        self.assertEqual(asyncio.run(scenario()), ["résultat"] * 5)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(single_flight.stats()["deduplicated"], 4)
+        self.assertEqual(single_flight.stats()["in_flight"], 0)
+
+    def test_cancelled_caller_does_not_cancel_others(self):
+        single_flight = SingleFlight()
+
+        async def compute():
+            await asyncio.sleep(0.05)
+            return 42
+
+        async def scenario():
+            first = asyncio.ensure_future(single_flight.do("clé", compute))
+            second = asyncio.ensure_future(single_flight.do("clé", compute))
+            await asyncio.sleep(0.01)
+            first.cancel()
+            return await second
+
+        self.assertEqual(asyncio.run(scenario()), 42)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,72 @@
+import os
+import sys
+import json
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "..", "docker", "user_api"))
+
+from species_catalog import SpeciesCatalog, etag_matches  # noqa: E402
+
+
+class TestSpeciesCatalog(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.csv_path = os.path.join(self.folder, "birds_list.csv")
+        self.write_csv(["Barn Owl", "american robin", "Bald Eagle", "Robin", "Barn Owl"])
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def write_csv(self, names):
+        # Le fichier est remplacé comme le fait le container de preprocessing
+        temp_path = f"{self.csv_path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as file:
+            file.write("English,Scientific\n" + "".join(f"{name},x\n" for name in names))
+        os.replace(temp_path, self.csv_path)
+
+    def test_search_is_case_insensitive(self):
+        catalog = SpeciesCatalog(self.csv_path)
+        catalog.refresh()
+        self.assertEqual(catalog.search(), ["american robin", "Bald Eagle", "Barn Owl", "Robin"])
+        self.assertEqual(catalog.search("ba"), ["Bald Eagle", "Barn Owl"])
+        self.assertEqual(catalog.search("ROBIN", "contains"), ["american robin", "Robin"])
+        self.assertEqual(catalog.search("zz"), [])
+
+    def test_pages(self):
+        catalog = SpeciesCatalog(self.csv_path)
+        catalog.refresh()
+        self.assertEqual(json.loads(catalog.page())["total"], 4)
+        page = json.loads(catalog.page("", "prefix", offset=1, limit=2))
+        self.assertEqual(page["species"], ["Bald Eagle", "Barn Owl"])
+        self.assertEqual(page["total"], 4)
+
+    def test_etag_depends_on_parameters_and_catalog_version(self):
+        catalog = SpeciesCatalog(self.csv_path, check_interval=0)
+        catalog.refresh()
+        etag = catalog.etag("ba", "prefix", 0, None)
+        self.assertEqual(etag, catalog.etag("ba", "prefix", 0, None))
+        self.assertNotEqual(etag, catalog.etag("ba", "contains", 0, None))
+        self.assertNotEqual(etag, catalog.etag("ba", "prefix", 0, 10))
+        # Le même contenu réécrit garde le même ETag, une nouvelle espèce le change
+        self.write_csv(["Barn Owl", "american robin", "Bald Eagle", "Robin"])
+        catalog.refresh()
+        self.assertEqual(etag, catalog.etag("ba", "prefix", 0, None))
+        self.write_csv(["Barn Owl", "american robin", "Bald Eagle", "Robin", "Barn Swallow"])
+        catalog.refresh()
+        self.assertNotEqual(etag, catalog.etag("ba", "prefix", 0, None))
+        self.assertIn("Barn Swallow", catalog.search("barn"))
+
+    def test_etag_matches(self):
+        etag = '"abc"'
+        self.assertFalse(etag_matches(etag, None))
+        self.assertFalse(etag_matches(etag, '"autre"'))
+        self.assertTrue(etag_matches(etag, '"abc"'))
+        self.assertTrue(etag_matches(etag, '"autre", "abc"'))
+        self.assertTrue(etag_matches(etag, 'W/"abc"'))
+        self.assertTrue(etag_matches(etag, "*"))
+
+
+if __name__ == "__main__":
+    unittest.main()
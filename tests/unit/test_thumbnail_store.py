@@ -0,0 +1,75 @@
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+import importlib.util
+
+docker_folder = os.path.join(os.path.dirname(__file__), "..", "..", "docker")
+sys.path.insert(0, os.path.join(docker_folder, "user_api"))
+sys.path.insert(0, os.path.join(docker_folder, "preprocessing"))
+
+from thumbnail_store import ThumbnailStore as ThumbnailReader  # noqa: E402
+
+if importlib.util.find_spec("PIL"):
+    from PIL import Image
+    from ThumbnailStore import ThumbnailStore  # noqa: E402
+
+
+@unittest.skipUnless(importlib.util.find_spec("PIL"), "Pillow est nécessaire")
+class TestThumbnailStore(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.train_path = os.path.join(self.folder, "train")
+        self.store_path = os.path.join(self.folder, "thumbnails")
+        for classe, color in (("MOINEAU", "brown"), ("MESANGE", "yellow")):
+            self.add_image(classe, "1.jpg", color)
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def add_image(self, classe, name, color):
+        os.makedirs(os.path.join(self.train_path, classe), exist_ok=True)
+        Image.new("RGB", (400, 300), color).save(os.path.join(self.train_path, classe, name))
+
+    def reader(self):
+        reader = ThumbnailReader(self.store_path, check_interval=0)
+        reader.refresh()
+        return reader
+
+    def test_thumbnails_are_written_and_read(self):
+        self.assertEqual(ThumbnailStore(self.train_path, self.store_path, size=64).update(), 2)
+        reader = self.reader()
+        self.assertEqual(reader.media_type, "image/webp")
+        thumbnail = reader.get("MOINEAU")
+        self.assertTrue(thumbnail.startswith(b"RIFF"))
+        self.assertIsNone(reader.get("INCONNU"))
+
+    def test_update_is_incremental(self):
+        store = ThumbnailStore(self.train_path, self.store_path, size=64)
+        store.update()
+        self.assertEqual(ThumbnailStore(self.train_path, self.store_path, size=64).update(), 0)
+        etag = self.reader().etag(["MOINEAU", "MESANGE"])
+        # Seule la classe supprimée est retirée, l'ETag des classes demandées change
+        shutil.rmtree(os.path.join(self.train_path, "MESANGE"))
+        self.assertEqual(ThumbnailStore(self.train_path, self.store_path, size=64).update(), 0)
+        reader = self.reader()
+        self.assertIsNone(reader.get("MESANGE"))
+        self.assertIsNotNone(reader.get("MOINEAU"))
+        self.assertNotEqual(etag, reader.etag(["MOINEAU", "MESANGE"]))
+
+    def test_pack_is_compacted_into_a_new_generation(self):
+        ThumbnailStore(self.train_path, self.store_path, size=64).update()
+        old_pack = self.reader()._state[0]["pack"]
+        # La moitié du fichier n'est plus utilisée : il est réécrit et l'ancien est supprimé
+        shutil.rmtree(os.path.join(self.train_path, "MESANGE"))
+        self.add_image("MOINEAU", "2.jpg", "blue")
+        ThumbnailStore(self.train_path, self.store_path, size=64).update()
+        reader = self.reader()
+        self.assertNotEqual(old_pack, reader._state[0]["pack"])
+        self.assertEqual(sorted(os.listdir(self.store_path)), sorted(["index.json", reader._state[0]["pack"]]))
+        self.assertTrue(reader.get("MOINEAU").startswith(b"RIFF"))
+
+
+if __name__ == "__main__":
+    unittest.main()
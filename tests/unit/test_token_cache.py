@@ -0,0 +1,65 @@
+import os
+import sys
+import json
+import time
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "..", "docker", "common"))
+
+from token_cache import TokenCache, token_digest  # noqa: E402
+from user_store import UserStore  # noqa: E402
+
+
+class TestTokenCache(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.path = os.path.join(self.folder, "authorized_users.json")
+        with open(self.path, "w") as f:
+            json.dump({"alice": [False, "hash"], "bob": [True, "hash"]}, f)
+        self.store = UserStore(self.path, check_interval=0)
+        self.cache = TokenCache()
+        self.digest = token_digest("token-alice")
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def lookup(self):
+        return self.cache.lookup(self.digest, self.store.current_version(), lambda username: username in self.store)
+
+    def test_unknown_and_expired_tokens_are_not_cached(self):
+        self.assertIsNone(self.lookup())
+        self.cache.put(self.digest, "alice", time.time() - 1, self.store.current_version())
+        self.assertIsNone(self.lookup())
+        self.assertEqual(self.cache.stats()["size"], 0)
+
+    def test_token_stays_valid_when_users_file_is_unchanged(self):
+        self.cache.put(self.digest, "alice", time.time() + 60, self.store.current_version())
+        self.assertEqual(self.lookup(), ("alice", True))
+        self.assertEqual(self.cache.stats()["hits"], 1)
+
+    def test_user_is_revalidated_when_users_file_changes(self):
+        self.cache.put(self.digest, "alice", time.time() + 60, self.store.current_version())
+        # Un autre utilisateur est ajouté par l'autre container : le token d'alice reste valide
+        UserStore(self.path).add("carol", False, "hash")
+        self.assertEqual(self.lookup(), ("alice", True))
+        self.assertEqual(self.cache.get(self.digest), ("alice", self.store.current_version()))
+
+    def test_token_is_revoked_when_user_is_removed(self):
+        self.cache.put(self.digest, "alice", time.time() + 60, self.store.current_version())
+        UserStore(self.path).update(lambda users: users.pop("alice"))
+        self.assertEqual(self.lookup(), ("alice", False))
+        # Le token révoqué est retiré du cache : il devra de nouveau être décodé et vérifié
+        self.assertIsNone(self.lookup())
+
+    def test_oldest_entry_is_evicted(self):
+        cache = TokenCache(max_size=2)
+        for name in ("a", "b", "c"):
+            cache.put(token_digest(name), name, time.time() + 60, 1)
+        self.assertIsNone(cache.get(token_digest("a")))
+        self.assertEqual(cache.get(token_digest("c")), ("c", 1))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,63 @@
+import os
+import sys
+import json
+import shutil
+import tempfile
+import unittest
+import threading
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "..", "docker", "common"))
+
+from user_store import UserStore  # noqa: E402
+
+
+class TestUserStore(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.path = os.path.join(self.folder, "authorized_users.json")
+        with open(self.path, "w") as f:
+            json.dump({"admin": [True, "hash"]}, f)
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def test_reloads_when_file_changes(self):
+        store = UserStore(self.path, check_interval=0)
+        version = store.current_version()
+        self.assertIn("admin", store)
+        # Modification faite par l'autre container
+        other = UserStore(self.path, check_interval=0)
+        other.add("alice", False, "hash")
+        self.assertEqual(store.get("alice"), [False, "hash"])
+        self.assertGreater(store.current_version(), version)
+
+    def test_write_leaves_no_temporary_file(self):
+        store = UserStore(self.path)
+        store.write({"bob": [False, "hash"]})
+        self.assertEqual(sorted(os.listdir(self.folder)), ["authorized_users.json", "authorized_users.json.lock"])
+        with open(self.path) as f:
+            self.assertEqual(json.load(f), {"bob": [False, "hash"]})
+
+    def test_concurrent_updates_are_not_lost(self):
+        # Chaque UserStore représente un processus qui ajoute ses propres utilisateurs
+        def add_users(number):
+            store = UserStore(self.path, check_interval=0)
+            for j in range(10):
+                store.add(f"user{number}-{j}", False, "hash")
+
+        threads = [threading.Thread(target=add_users, args=(number,)) for number in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(UserStore(self.path).all()), 1 + 4 * 10)
+
+    def test_add_existing_user_does_not_write(self):
+        store = UserStore(self.path)
+        version = store.version
+        self.assertFalse(store.add("admin", True, "autre"))
+        self.assertEqual(store.version, version)
+
+
+if __name__ == "__main__":
+    unittest.main()
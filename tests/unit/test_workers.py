@@ -0,0 +1,34 @@
+import os
+import sys
+import time
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "..", "docker", "inference"))
+
+from workers import RetryBackoff  # noqa: E402
+
+
+class TestRetryBackoff(unittest.TestCase):
+    def test_delay_doubles_for_the_same_target(self):
+        backoff = RetryBackoff(base_delay=10, max_delay=30)
+        self.assertTrue(backoff.ready("run1"))
+        # Seul le premier échec est signalé
+        self.assertTrue(backoff.failed("run1"))
+        self.assertFalse(backoff.ready("run1"))
+        self.assertAlmostEqual(backoff.retry_at - time.monotonic(), 20, delta=1)
+        self.assertFalse(backoff.failed("run1"))
+        self.assertAlmostEqual(backoff.retry_at - time.monotonic(), 30, delta=1)
+
+    def test_new_target_or_success_resets_the_delay(self):
+        backoff = RetryBackoff(base_delay=10)
+        backoff.failed("run1")
+        self.assertTrue(backoff.ready("run2"))
+        self.assertTrue(backoff.failed("run2"))
+        backoff.succeeded()
+        self.assertTrue(backoff.ready("run2"))
+        self.assertTrue(backoff.failed("run2"))
+        self.assertEqual(backoff.failures, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()